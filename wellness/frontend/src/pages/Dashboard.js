@@ -3,6 +3,29 @@ import { LineChart, Line, BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, L
 import { getDashboardStats, getDashboardCharts } from '../services/api';
 import './Dashboard.css';
 
+// Expand the columnar chart payload into one row per date; every chart
+// reads its own keys from the same rows
+const chartRows = (columns) => {
+  const rows = columns.dates.map((date, i) => ({
+    date,
+    score: columns.wellness_score[i],
+    morning: columns.stress_morning[i],
+    afternoon: columns.stress_afternoon[i],
+    night: columns.stress_night[i],
+    hours: columns.sleep_hours[i],
+    quality: columns.sleep_quality[i],
+    minutes: columns.exercise_minutes[i],
+    intake: columns.water_intake[i],
+  }));
+  return {
+    wellness_scores: rows,
+    stress_levels: rows,
+    sleep_data: rows,
+    exercise_data: rows,
+    water_data: rows,
+  };
+};
+
 const Dashboard = () => {
   const [stats, setStats] = useState(null);
   const [chartData, setChartData] = useState(null);
@@ -22,7 +45,7 @@ const Dashboard = () => {
       ]);
       
       setStats(statsResponse.data.data);
-      setChartData(chartsResponse.data.data);
+      setChartData(chartRows(chartsResponse.data.data));
     } catch (err) {
       setError(err.response?.data?.error || 'Failed to load dashboard data');
     } finally {
@@ -20,7 +20,8 @@ export const createEntry = (entryData) => api.post('/entries', entryData);
 
 // Dashboard
 export const getDashboardStats = () => api.get('/dashboard/stats');
-export const getDashboardCharts = () => api.get('/dashboard/charts');
+export const getDashboardCharts = (maxPoints = 500) =>
+  api.get('/dashboard/charts', { params: { format: 'columnar', max_points: maxPoints } });
 
 // Reports
 export const getWeeklyReport = () => api.get('/reports/weekly');
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Check and time the column-wise feature extraction and heuristic scores
+
+Parity: randomized entries (missing keys, None, NaN, pd.NA, NaT, numeric
+strings, junk, booleans, symptom dicts) are scored by extract_feature_matrix
+and heuristic_scores and by the row-at-a-time implementations they replaced
+(copied below as the reference); every feature and score must be equal.
+The reference reads NaN, pd.NA and NaT as None: the old safe_float() let
+a float NaN through, which made the whole score NaN.
+
+Speed: prepares XGBoost training data (features and heuristic labels) for
+a synthetic history the old way, with df.iterrows() and per-row calls, and
+the column-wise way.
+
+Usage:
+    python scripts/benchmark_features.py [--entries 5000] [--trials 50]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add src directories to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src', 'ml'))
+
+import numpy as np
+import pandas as pd
+
+from ml_models import WellnessPredictor, entry_frame
+
+SYMPTOMS = ('cramps', 'bloating', 'headache', 'fatigue', 'mood_swings', 'acne', 'back_pain', 'nausea')
+
+# ==================== Reference (row at a time) ====================
+
+def missing(value):
+    return value is None or (np.ndim(value) == 0 and bool(pd.isna(value)))
+
+def safe_float(value, default=0):
+    try:
+        return float(value) if not missing(value) else default
+    except (ValueError, TypeError):
+        return default
+
+def symptom_count(entry):
+    symptoms = entry.get('symptoms', {})
+    return sum(1 for v in symptoms.values() if v) if isinstance(symptoms, dict) else 0
+
+def reference_features(entry):
+    on_period = entry.get('on_period', False)
+    features = [
+        safe_float(entry.get('average_stress', 5)),
+        safe_float(entry.get('exercise_minutes', 0)),
+        safe_float(entry.get('water_intake', 0)) / 1000.0,
+        safe_float(entry.get('sleep_hours', 0)),
+        safe_float(entry.get('sleep_quality', 5)),
+        symptom_count(entry),
+        1 if not missing(on_period) and on_period else 0,
+    ]
+    return np.array(features).reshape(1, -1)
+
+def reference_heuristic(entry):
+    score = 50
+
+    sleep_hours = safe_float(entry.get('sleep_hours', 0))
+    sleep_quality = safe_float(entry.get('sleep_quality', 5))
+    if 7 <= sleep_hours <= 9:
+        sleep_score = 15
+    elif 6 <= sleep_hours < 7 or 9 < sleep_hours <= 10:
+        sleep_score = 10
+    else:
+        sleep_score = 5
+    sleep_score += (safe_float(sleep_quality) / 10) * 5
+    score += sleep_score
+
+    avg_stress = safe_float(entry.get('average_stress', 5))
+    score -= ((avg_stress - 1) / 9) * 20
+
+    exercise_mins = safe_float(entry.get('exercise_minutes', 0))
+    score += 15 if exercise_mins >= 30 else 10 if exercise_mins >= 20 else 5 if exercise_mins >= 10 else 0
+
+    water_intake = safe_float(entry.get('water_intake', 0))
+    score += 10 if water_intake >= 2000 else 7 if water_intake >= 1500 else 4 if water_intake >= 1000 else 0
+
+    score -= min(symptom_count(entry) * 2, 15)
+
+    score += safe_float(entry.get('sentiment_score', 0)) * 10
+
+    score = max(0, min(100, score))
+    return round(score, 1)
+
+# ==================== Synthetic entries ====================
+
+def messy_value(rng, low, high):
+    roll = rng.random()
+    if roll < 0.05:
+        return None
+    if roll < 0.08:
+        return rng.choice([float('nan'), np.nan, pd.NA, pd.NaT])
+    if roll < 0.10:
+        return str(rng.randint(int(low), int(high)))
+    if roll < 0.12:
+        return 'n/a'
+    if roll < 0.14:
+        return rng.choice([True, False])
+    if roll < 0.30:
+        return rng.randint(int(low), int(high))
+    # Land on the heuristic's thresholds now and then
+    if roll < 0.40:
+        return rng.choice([6, 7, 9, 10, 10, 20, 30, 1000, 1500, 2000])
+    return round(rng.uniform(low, high), rng.choice([0, 1, 2]))
+
+def messy_entry(rng):
+    """An entry as a client might send it: any key may be missing or malformed"""
+    ranges = {'average_stress': (1, 10), 'exercise_minutes': (0, 90), 'water_intake': (0, 3500),
+              'sleep_hours': (3, 12), 'sleep_quality': (1, 10), 'sentiment_score': (-1, 1)}
+    entry = {key: messy_value(rng, low, high) for key, (low, high) in ranges.items() if rng.random() < 0.9}
+    if rng.random() < 0.85:
+        entry['symptoms'] = {name: rng.random() < 0.3 for name in rng.sample(SYMPTOMS, rng.randint(0, len(SYMPTOMS)))}
+    elif rng.random() < 0.5:
+        entry['symptoms'] = rng.choice([None, float('nan')])
+    if rng.random() < 0.9:
+        entry['on_period'] = rng.choice([True, False, 0, 1, None, 'yes', '', float('nan'), pd.NA])
+    return entry
+
+def history_entry(rng, day):
+    """A stored entry, as get_all_entries returns it"""
+    return {
+        'date': f"2024-{1 + day // 28 % 12:02d}-{1 + day % 28:02d}",
+        'average_stress': round(rng.uniform(1, 10), 1),
+        'exercise_minutes': rng.choice([0, 10, 20, 30, 45, 60]),
+        'water_intake': rng.randint(500, 3000),
+        'sleep_hours': round(rng.uniform(4, 10), 1),
+        'sleep_quality': rng.randint(1, 10),
+        'on_period': rng.random() < 0.2,
+        'symptoms': {name: rng.random() < 0.3 for name in SYMPTOMS},
+        'sentiment_score': round(rng.uniform(-0.5, 0.8), 3),
+        'wellness_score': round(rng.uniform(30, 90), 1),
+    }
+
+# ==================== Checks ====================
+
+def check_parity(predictor, rng, trials):
+    rows = 0
+    for _ in range(trials):
+        entries = [messy_entry(rng) for _ in range(rng.randint(1, 400))]
+        frame = entry_frame(entries)
+
+        features = predictor.extract_feature_matrix(frame)
+        expected_features = np.vstack([reference_features(entry) for entry in entries])
+        if not np.array_equal(features, expected_features):
+            bad = np.flatnonzero((features != expected_features).any(axis=1))
+            raise SystemExit(f"Feature mismatch, e.g. {entries[bad[0]]}: "
+                             f"{features[bad[0]]} != {expected_features[bad[0]]}")
+
+        scores = predictor.heuristic_scores(frame)
+        expected_scores = [reference_heuristic(entry) for entry in entries]
+        for entry, score, expected in zip(entries, scores, expected_scores):
+            if score != expected:
+                raise SystemExit(f"Score mismatch for {entry}: {score} != {expected}")
+
+        # The per-row functions are wrappers over the column-wise ones
+        entry = entries[0]
+        if (not np.array_equal(predictor.extract_features(entry), reference_features(entry))
+                or predictor._calculate_heuristic_score(entry) != reference_heuristic(entry)):
+            raise SystemExit(f"Per-row mismatch for {entry}")
+        rows += len(entries)
+    return rows
+
+def prepare_iterrows(historical_data):
+    df = pd.DataFrame(historical_data)
+    X, y = [], []
+    for _, entry in df.iterrows():
+        X.append(reference_features(entry.to_dict())[0])
+        y.append(reference_heuristic(entry.to_dict()))
+    return np.array(X), np.array(y)
+
+def prepare_columnar(predictor, historical_data):
+    df = entry_frame(historical_data)
+    return predictor.extract_feature_matrix(df), predictor.heuristic_scores(df)
+
+def best_of(repeats, func, *args):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=5000, help="History size for the training-data benchmark")
+    parser.add_argument('--trials', type=int, default=50, help="Randomized frames in the parity check")
+    parser.add_argument('--repeats', type=int, default=3, help="Timed runs per path (best is reported)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    predictor = WellnessPredictor()
+
+    rows = check_parity(predictor, rng, args.trials)
+    print(f"Parity: {args.trials} randomized frames, {rows} rows, features and heuristic scores identical")
+
+    history = [history_entry(rng, day) for day in range(args.entries)]
+    old_seconds, (old_X, old_y) = best_of(args.repeats, prepare_iterrows, history)
+    new_seconds, (new_X, new_y) = best_of(args.repeats, prepare_columnar, predictor, history)
+    if not (np.array_equal(old_X, new_X) and np.array_equal(old_y, new_y)):
+        raise SystemExit("Training data differs between the two paths")
+
+    print(f"Training data for {args.entries} entries:")
+    print(f"    iterrows  {old_seconds * 1000:9.1f} ms")
+    print(f"    columnar  {new_seconds * 1000:9.1f} ms   ({old_seconds / new_seconds:.0f}x faster)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Compare per-entry predict_wellness with the vectorized predict_batch
+
+Scores the same synthetic entries both ways, first with the heuristic
+score (no XGBoost model) and then with an XGBoost model trained on the
+entries, and checks both paths return the same predictions. Models are
+published to the in-memory registry only; nothing is written to
+ml_models_saved/.
+
+Usage:
+    python scripts/benchmark_predict.py [--entries 10000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add src directories to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src', 'ml'))
+
+import numpy as np
+import xgboost as xgb
+
+from ml_models import WellnessPredictor
+
+NOTES = ['', 'Feeling great and energetic today', 'Tired and stressed after work',
+         'Some pain, otherwise a good day', 'Anxious but motivated', None]
+
+PREDICTION_KEYS = ['wellness_score', 'sentiment_score', 'predicted_energy', 'health_status']
+
+def synthetic_entry(rng):
+    return {
+        'average_stress': round(rng.uniform(1, 10), 1),
+        'exercise_minutes': rng.choice([0, 10, 20, 30, 45, 60]),
+        'water_intake': rng.randint(500, 3000),
+        'sleep_hours': round(rng.uniform(4, 10), 1),
+        'sleep_quality': rng.randint(1, 10),
+        'on_period': rng.random() < 0.2,
+        'symptoms': {name: rng.random() < 0.3 for name in ('cramps', 'bloating', 'headache', 'fatigue')},
+        'additional_notes': rng.choice(NOTES),
+    }
+
+def bench(predictor, entries, user_id):
+    start = time.perf_counter()
+    rows = [predictor.predict_wellness(dict(entry), user_id=user_id) for entry in entries]
+    per_row = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = predictor.predict_batch(entries, user_id=user_id)
+    batched = time.perf_counter() - start
+
+    batch_rows = batch.to_dict('records')
+    mismatches = sum(
+        1 for row, batch_row in zip(rows, batch_rows)
+        if any(row[key] != batch_row[key] for key in PREDICTION_KEYS)
+    )
+    return per_row, batched, mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=10000, help="Entries scored by each path")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    entries = [synthetic_entry(rng) for _ in range(args.entries)]
+    predictor = WellnessPredictor()
+
+    # Warm up pandas/XGBoost so neither path pays one-time costs
+    predictor.predict_batch(entries[:10])
+
+    # A user with no model of their own is scored by the population bundle
+    # (the heuristic unless a population XGBoost model is saved)
+    results = {'population': bench(predictor, entries, 'bench_population')}
+
+    model = xgb.XGBRegressor(n_estimators=100, max_depth=5, learning_rate=0.1,
+                             objective='reg:squarederror', random_state=42)
+    features = np.vstack([predictor.extract_features(entry)[0] for entry in entries])
+    model.fit(features, predictor.predict_batch(entries)['wellness_score'].to_numpy())
+    predictor.registry.publish('bench_xgboost', xgb_model=model)
+    results['xgboost'] = bench(predictor, entries, 'bench_xgboost')
+
+    print(f"{args.entries} entries")
+    for name, (per_row, batched, mismatches) in results.items():
+        print(f"    {name:<10} per-row {args.entries / per_row:10.0f}/s   batch {args.entries / batched:10.0f}/s   "
+              f"speedup {per_row / batched:6.1f}x   mismatches {mismatches}")
+
+if __name__ == '__main__':
+    main()
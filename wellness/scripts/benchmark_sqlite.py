@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Compare SQLite write and read throughput for the 'default' and 'tuned' profiles
+
+Each profile gets a fresh temporary database. The benchmark measures:
+  - writes: one upsert + commit per entry (the POST /api/entries pattern)
+  - reads: recent-window queries (the dashboard pattern)
+  - mixed: reader threads querying while one writer commits
+
+Usage:
+    python scripts/benchmark_sqlite.py [--entries 2000] [--readers 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+# Add src directories to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src', 'backend'))
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import Base, WellnessEntry, configure_sqlite_engine, engine_options
+
+PROFILES = ['default', 'tuned']
+
+def make_engine(path, profile):
+    url = f'sqlite:///{path}'
+    options = engine_options(url)
+    if profile == 'default':
+        options.pop('connect_args', None)
+    bench_engine = create_engine(url, **options)
+    configure_sqlite_engine(bench_engine, profile)
+    Base.metadata.create_all(bind=bench_engine)
+    return bench_engine
+
+def entry_row(day, user_id='bench_user'):
+    return {
+        'user_id': user_id,
+        'date': date(2020, 1, 1) + timedelta(days=day),
+        'sleep_hours': 7.0 + (day % 3) / 2,
+        'average_stress': 1.0 + day % 9,
+        'exercise_minutes': day % 60,
+        'water_intake': 1000 + day % 1500,
+        'wellness_score': 40.0 + day % 50,
+    }
+
+def upsert_one(conn, row):
+    stmt = sqlite_insert(WellnessEntry).values(row)
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id', 'date'],
+        set_={'sleep_hours': stmt.excluded.sleep_hours}
+    ))
+
+def recent_window(conn, limit=30):
+    table = WellnessEntry.__table__
+    return conn.execute(
+        select(table.c.date, table.c.sleep_hours, table.c.wellness_score)
+        .where(table.c.user_id == 'bench_user')
+        .order_by(table.c.date.desc()).limit(limit)
+    ).all()
+
+def bench_writes(bench_engine, entries):
+    start = time.perf_counter()
+    for day in range(entries):
+        with bench_engine.begin() as conn:
+            upsert_one(conn, entry_row(day))
+    return entries / (time.perf_counter() - start)
+
+def bench_reads(bench_engine, queries):
+    start = time.perf_counter()
+    with bench_engine.connect() as conn:
+        for _ in range(queries):
+            recent_window(conn)
+    return queries / (time.perf_counter() - start)
+
+def bench_mixed(bench_engine, entries, readers):
+    """Reads/sec achieved by reader threads while a writer commits entries"""
+    stop = threading.Event()
+    read_counts = [0] * readers
+    errors = []
+
+    def reader(slot):
+        try:
+            with bench_engine.connect() as conn:
+                while not stop.is_set():
+                    recent_window(conn)
+                    conn.commit()  # end the read transaction so WAL can advance
+                    read_counts[slot] += 1
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reader, args=(slot,)) for slot in range(readers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        for day in range(entries, entries * 2):
+            with bench_engine.begin() as conn:
+                upsert_one(conn, entry_row(day))
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+
+    if errors:
+        print(f"    reader errors: {len(errors)} (first: {errors[0]})")
+    return entries / elapsed, sum(read_counts) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=2000, help="Entries written per phase")
+    parser.add_argument('--queries', type=int, default=5000, help="Read queries in the read phase")
+    parser.add_argument('--readers', type=int, default=4, help="Reader threads in the mixed phase")
+    args = parser.parse_args()
+
+    results = {}
+    for profile in PROFILES:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bench_engine = make_engine(os.path.join(tmp_dir, 'bench.db'), profile)
+            with bench_engine.connect() as conn:
+                journal_mode = conn.execute(text("PRAGMA journal_mode")).scalar()
+            print(f"Profile '{profile}' (journal_mode={journal_mode})")
+
+            writes = bench_writes(bench_engine, args.entries)
+            reads = bench_reads(bench_engine, args.queries)
+            mixed_writes, mixed_reads = bench_mixed(bench_engine, args.entries, args.readers)
+            bench_engine.dispose()
+
+        results[profile] = (writes, reads, mixed_writes, mixed_reads)
+        print(f"    writes {writes:10.0f}/s   reads {reads:10.0f}/s   "
+              f"mixed: writes {mixed_writes:8.0f}/s, reads {mixed_reads:8.0f}/s")
+
+    baseline, tuned = results['default'], results['tuned']
+    labels = ['writes', 'reads', 'mixed writes', 'mixed reads']
+    print("\nSpeedup (tuned / default): " + ", ".join(
+        f"{label} {after / before:.1f}x" for label, before, after in zip(labels, baseline, tuned)
+    ))
+
+if __name__ == '__main__':
+    main()
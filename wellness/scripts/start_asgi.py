@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Start the ASGI backend API server (async storage, one process for many
+concurrent requests). Needs the optional async packages in requirements.txt.
+"""
+import os
+import sys
+
+# Add src directories to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, 'src', 'backend'))
+sys.path.insert(0, os.path.join(project_root, 'src', 'ml'))
+
+import uvicorn
+from asgi_server import app
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 5000))
+    print(f"Starting ASGI API server on http://localhost:{port}")
+    print(f"API documentation: http://localhost:{port}/api/health")
+    uvicorn.run(app, host='0.0.0.0', port=port)
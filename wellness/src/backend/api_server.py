@@ -3,61 +3,177 @@ Flask API Server for Women's Wellness Tracker
 Replaces Streamlit backend with REST API for React frontend
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
+from werkzeug.http import parse_etags
 from datetime import datetime
+import hashlib
 import json
 import os
-
-from database import init_db
-from db_storage import get_all_entries, save_wellness_entry, get_recent_entries, get_user_profile, update_user_profile
+import numpy as np
+
+from database import init_db, begin_request_session, end_request_session
+from schema_migration import pending_migrations
+from rollups import rebuild_rollups, rollups_need_rebuild, monthly_aggregates, rollup_totals
+from symptoms import count_symptoms, load_symptom_bits
+from db_storage import (get_all_entries, save_wellness_entry, save_wellness_entries_batch, get_recent_entries,
+                        get_entry, get_entries_page, count_entries, load_entry_frame, entry_stats, entry_cache_stats,
+                        get_data_version, get_user_profile, update_user_profile,
+                        BATCH_CHUNK_SIZE)
+from downsample import lttb_indices, date_axis, cached_payload, MIN_POINTS
 from ml_models import WellnessPredictor
+from model_trainer import BackgroundTrainer, XGB_MIN_ENTRIES, LSTM_MIN_ENTRIES
 from reports import generate_weekly_report, generate_monthly_report
 from recommendations import get_personalized_recommendations
-from cycle_prediction import predict_next_cycle, predict_symptom_likelihood
-from comparative_analytics import calculate_monthly_aggregates, compare_months
+from cycle_prediction import predict_next_cycle, symptom_likelihoods
+from comparative_analytics import compare_months
 from data_export import export_to_csv, export_to_json, create_summary_report
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
 
+# Entries averaged by /api/dashboard/stats unless `window` is given
+STATS_WINDOW = 7
+
+# Most entries /api/ml/predict/batch scores in one request
+PREDICT_BATCH_LIMIT = 50000
+
+# Columns each family of endpoints reads, so frames only fetch what they use
+CHART_COLUMNS = ['wellness_score', 'stress_morning', 'stress_afternoon', 'stress_night',
+                 'sleep_hours', 'sleep_quality', 'exercise_minutes', 'water_intake']
+REPORT_COLUMNS = ['wellness_score', 'average_stress', 'sleep_hours', 'sleep_quality', 'exercise_minutes',
+                  'water_intake', 'on_period', 'symptoms', 'sentiment_score', 'predicted_energy']
+CYCLE_COLUMNS = ['on_period', 'period_day', 'symptoms']
+ANALYTICS_COLUMNS = ['average_stress', 'sleep_hours', 'sleep_quality', 'exercise_minutes',
+                     'water_intake', 'wellness_score', 'on_period']
+
 # Initialize database and ML predictor
 init_db()
+
+# Migrations move rows (see schema_migration.py), so they only run when an
+# operator starts schema_migration.py; the API just warns
+pending = pending_migrations()
+if pending:
+    print(f"Warning: pending schema migrations {pending}; run 'python schema_migration.py'")
+elif rollups_need_rebuild():
+    # Data written before rollups existed (schema_migration.py rebuilds them too)
+    print(f"Rebuilt {rebuild_rollups()} rollup periods.")
+
 ml_predictor = WellnessPredictor()
 
-# Load ML models if available
-try:
-    entries = get_all_entries()
-    if len(entries) >= 10:
-        ml_predictor.train_xgboost_model(entries)
-    if len(entries) >= 7:
-        ml_predictor.train_lstm_model(entries)
-except:
-    pass
+# Models are (re)trained off the request path; refresh them from the
+# stored history once at startup
+ml_trainer = BackgroundTrainer(ml_predictor, get_all_entries)
+ml_trainer.request(delay=0)
+
+@app.before_request
+def open_request_session():
+    """Share one database session across every storage call in this request"""
+    begin_request_session()
+
+@app.teardown_request
+def close_request_session(exception=None):
+    end_request_session(exception)
+
+# ==================== Conditional GET ====================
+
+# GET endpoints whose responses depend on more than the user's data
+UNVERSIONED_ENDPOINTS = {'health_check', 'ml_status'}
+
+# GET endpoints whose responses also depend on the trained ML models. Model
+# versions restart in every process, so their ETags include a process token.
+MODEL_ENDPOINTS = {'get_monthly_report'}
+_PROCESS_TOKEN = os.urandom(8).hex()
+
+def response_etag(endpoint, path_params, query_items, version):
+    """Strong ETag for a GET response
+    
+    Derived from the endpoint, its arguments and the user's data version,
+    plus today's date (cycle predictions count days from it) and, for
+    MODEL_ENDPOINTS, the version of the user's ML model bundle.
+    """
+    model_state = None
+    if endpoint in MODEL_ENDPOINTS:
+        bundle = ml_predictor.registry.get()
+        model_state = (_PROCESS_TOKEN, bundle.scope, bundle.version)
+    key = json.dumps([
+        endpoint, sorted(dict(path_params).items()), sorted(query_items), version,
+        datetime.now().date().isoformat(), model_state
+    ], default=str)
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header value lists etag (or is *)"""
+    return bool(if_none_match) and parse_etags(if_none_match).contains(etag)
+
+@app.before_request
+def check_not_modified():
+    """Answer If-None-Match with 304 after one version lookup, before any data is loaded"""
+    if request.method != 'GET' or request.endpoint is None or request.endpoint in UNVERSIONED_ENDPOINTS:
+        return None
+    
+    g.etag = response_etag(request.endpoint, request.view_args or {}, request.args.items(multi=True),
+                           get_data_version())
+    if etag_matches(request.headers.get('If-None-Match'), g.etag):
+        response = app.response_class(status=304)
+        response.set_etag(g.etag)
+        response.cache_control.no_cache = True
+        return response
+    return None
+
+@app.after_request
+def add_etag(response):
+    """Tag successful GET responses; no-cache makes browsers revalidate with If-None-Match"""
+    etag = g.get('etag')
+    if etag and response.status_code == 200:
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+    return response
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    return jsonify({"status": "healthy", "message": "API is running"})
+    """Health check endpoint (includes entry cache counters for monitoring)"""
+    return jsonify({"status": "healthy", "message": "API is running", "entry_cache": entry_cache_stats()})
 
 # ==================== Entries Endpoints ====================
 
+def with_frontend_fields(entries):
+    """Entries with the frontend's stress field names added for chart compatibility"""
+    mapped_entries = []
+    for entry in entries:
+        mapped_entry = entry.copy()
+        if 'stress_morning' in mapped_entry and 'morning_stress' not in mapped_entry:
+            mapped_entry['morning_stress'] = mapped_entry.get('stress_morning', 0)
+            mapped_entry['afternoon_stress'] = mapped_entry.get('stress_afternoon', 0)
+            mapped_entry['night_stress'] = mapped_entry.get('stress_night', 0)
+        mapped_entries.append(mapped_entry)
+    return mapped_entries
+
+def entries_page_params(args):
+    """(after, limit) from the query string, or None when neither is given
+    
+    Without either param GET /api/entries returns the full history as it
+    always has; with one, it returns a keyset-paginated page.
+    """
+    if 'after' not in args and 'limit' not in args:
+        return None
+    return args.get('after'), min(max(int(args.get('limit', 100)), 1), 1000)
+
 @app.route('/api/entries', methods=['GET'])
 def get_entries():
-    """Get all wellness entries"""
+    """Get wellness entries: all of them, or one page when paging params are given
+    
+    Query params: `after` (date cursor from the previous page's next_cursor)
+    and `limit` (page size, default 100, max 1000).
+    """
     try:
-        entries = get_all_entries()
-        # Map database field names to frontend field names for compatibility
-        mapped_entries = []
-        for entry in entries:
-            mapped_entry = entry.copy()
-            # Add frontend field names for charts compatibility
-            if 'stress_morning' in mapped_entry and 'morning_stress' not in mapped_entry:
-                mapped_entry['morning_stress'] = mapped_entry.get('stress_morning', 0)
-                mapped_entry['afternoon_stress'] = mapped_entry.get('stress_afternoon', 0)
-                mapped_entry['night_stress'] = mapped_entry.get('stress_night', 0)
-            mapped_entries.append(mapped_entry)
-        return jsonify({"success": True, "data": mapped_entries})
+        page = entries_page_params(request.args)
+        if page is None:
+            return jsonify({"success": True, "data": with_frontend_fields(get_all_entries())})
+        
+        after_date, limit = page
+        entries, next_cursor = get_entries_page(after_date=after_date, limit=limit)
+        return jsonify({"success": True, "data": with_frontend_fields(entries), "next_cursor": next_cursor})
     except Exception as e:
         import traceback
         print(f"Error in get_entries: {e}")
@@ -74,6 +190,149 @@ def get_recent():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+def normalize_entry_data(entry_data):
+    """Coerce a submitted entry into database field names and types"""
+    # Convert all numeric fields to proper types (React sends everything as strings)
+    # Include both form field names and database field names
+    numeric_fields = [
+        'morning_stress', 'afternoon_stress', 'night_stress',  # Form field names
+        'stress_morning', 'stress_afternoon', 'stress_night',  # Database field names
+        'exercise_minutes', 'water_intake', 'sleep_hours', 'sleep_quality'
+    ]
+    
+    for field in numeric_fields:
+        if field in entry_data:
+            try:
+                entry_data[field] = float(entry_data[field]) if '.' in str(entry_data[field]) else int(entry_data[field])
+            except (ValueError, TypeError):
+                entry_data[field] = 0
+    
+    # Map form field names to database field names
+    field_mapping = {
+        'morning_stress': 'stress_morning',
+        'afternoon_stress': 'stress_afternoon',
+        'night_stress': 'stress_night'
+    }
+    
+    for form_field, db_field in field_mapping.items():
+        if form_field in entry_data:
+            entry_data[db_field] = entry_data.pop(form_field)
+    
+    # Convert boolean fields
+    if 'on_period' in entry_data:
+        entry_data['on_period'] = bool(entry_data['on_period'])
+    
+    # Calculate average stress (using database field names now)
+    if 'stress_morning' in entry_data and 'stress_afternoon' in entry_data and 'stress_night' in entry_data:
+        entry_data['average_stress'] = (
+            float(entry_data.get('stress_morning', 0)) + 
+            float(entry_data.get('stress_afternoon', 0)) + 
+            float(entry_data.get('stress_night', 0))
+        ) / 3.0
+    
+    # Add date if not present
+    if 'date' not in entry_data:
+        entry_data['date'] = datetime.now().strftime("%Y-%m-%d")
+    # Note: timestamp will be converted to datetime object in db_storage.save_wellness_entry()
+    # We keep it as ISO string here for JSON serialization, it gets converted when saving
+    if 'timestamp' not in entry_data:
+        entry_data['timestamp'] = datetime.now().isoformat()
+    
+    return entry_data
+
+def score_entry_data(entry_data, bundle=None):
+    """Attach ML wellness, sentiment and energy predictions to a normalized entry
+    
+    bundle pins the model bundle used (see ml_predictor.registry); by
+    default the current one is used.
+    """
+    # Get ML predictions (create a copy with both field name formats for compatibility)
+    ml_data = entry_data.copy()
+    # ML models might use either format, so include both
+    if 'stress_morning' in ml_data and 'morning_stress' not in ml_data:
+        ml_data['morning_stress'] = ml_data['stress_morning']
+        ml_data['afternoon_stress'] = ml_data.get('stress_afternoon', ml_data.get('afternoon_stress', 0))
+        ml_data['night_stress'] = ml_data.get('stress_night', ml_data.get('night_stress', 0))
+    
+    try:
+        ml_insights = ml_predictor.predict_wellness(ml_data, bundle)
+        entry_data['wellness_score'] = ml_insights['wellness_score']
+        entry_data['sentiment_score'] = ml_insights['sentiment_score']
+        entry_data['predicted_energy'] = ml_insights['predicted_energy']
+    except Exception as e:
+        print(f"ML prediction error: {e}")
+        entry_data['wellness_score'] = 0
+        entry_data['sentiment_score'] = 0
+        entry_data['predicted_energy'] = 0
+    
+    return entry_data
+
+def score_entries_batch(entries, bundle=None):
+    """Attach ML predictions to many normalized entries with one predict_batch call"""
+    if not entries:
+        return entries
+    
+    try:
+        predictions = ml_predictor.predict_batch(entries, bundle)
+    except Exception as e:
+        print(f"ML batch prediction error: {e}, scoring entries one by one")
+        return [score_entry_data(entry_data, bundle) for entry_data in entries]
+    
+    for entry_data, wellness, sentiment, energy in zip(entries, predictions['wellness_score'].tolist(),
+                                                       predictions['sentiment_score'].tolist(),
+                                                       predictions['predicted_energy'].tolist()):
+        entry_data['wellness_score'] = wellness
+        entry_data['sentiment_score'] = sentiment
+        entry_data['predicted_energy'] = energy
+    return entries
+
+def iter_ndjson_lines(stream, require_date=False):
+    """Parse an NDJSON byte stream, yielding each object or a ValueError for a bad line
+    
+    With require_date, an object without a date is a bad line too.
+    """
+    for line_number, raw_line in enumerate(stream, start=1):
+        line = raw_line.strip()
+        if not line:
+            continue
+        
+        try:
+            entry_data = json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"Line {line_number}: invalid JSON ({e})")
+            continue
+        
+        if not isinstance(entry_data, dict):
+            yield ValueError(f"Line {line_number}: entry must be a JSON object")
+            continue
+        
+        if require_date and 'date' not in entry_data:
+            yield ValueError(f"Line {line_number}: entry must include a date")
+            continue
+        
+        yield entry_data
+
+def iter_ndjson_entries(stream, bundle=None):
+    """Lazily parse, normalize and score entries from an NDJSON byte stream
+    
+    Lines that fail to parse or have no date (a bulk import never defaults
+    to today) are yielded as ValueError instances so the storage layer can
+    report them as rejected without stopping the import.
+    Entries are scored BATCH_CHUNK_SIZE at a time, all with the same model
+    bundle, and yielded in line order.
+    """
+    def scored(items):
+        score_entries_batch([item for item in items if not isinstance(item, ValueError)], bundle)
+        return items
+    
+    pending = []
+    for item in iter_ndjson_lines(stream, require_date=True):
+        pending.append(item if isinstance(item, ValueError) else normalize_entry_data(item))
+        if len(pending) >= BATCH_CHUNK_SIZE:
+            yield from scored(pending)
+            pending = []
+    yield from scored(pending)
+
 @app.route('/api/entries', methods=['POST'])
 def create_entry():
     """Create a new wellness entry"""
@@ -83,90 +342,18 @@ def create_entry():
         entry_data = request.json
         print(f"Received entry data: {entry_data.keys() if entry_data else 'None'}")
         
-        # Convert all numeric fields to proper types (React sends everything as strings)
-        # Include both form field names and database field names
-        numeric_fields = [
-            'morning_stress', 'afternoon_stress', 'night_stress',  # Form field names
-            'stress_morning', 'stress_afternoon', 'stress_night',  # Database field names
-            'exercise_minutes', 'water_intake', 'sleep_hours', 'sleep_quality'
-        ]
-        
-        for field in numeric_fields:
-            if field in entry_data:
-                try:
-                    entry_data[field] = float(entry_data[field]) if '.' in str(entry_data[field]) else int(entry_data[field])
-                except (ValueError, TypeError):
-                    entry_data[field] = 0
-        
-        # Map form field names to database field names
-        field_mapping = {
-            'morning_stress': 'stress_morning',
-            'afternoon_stress': 'stress_afternoon',
-            'night_stress': 'stress_night'
-        }
-        
-        for form_field, db_field in field_mapping.items():
-            if form_field in entry_data:
-                entry_data[db_field] = entry_data.pop(form_field)
-        
-        # Convert boolean fields
-        if 'on_period' in entry_data:
-            entry_data['on_period'] = bool(entry_data['on_period'])
-        
-        # Calculate average stress (using database field names now)
-        if 'stress_morning' in entry_data and 'stress_afternoon' in entry_data and 'stress_night' in entry_data:
-            entry_data['average_stress'] = (
-                float(entry_data.get('stress_morning', 0)) + 
-                float(entry_data.get('stress_afternoon', 0)) + 
-                float(entry_data.get('stress_night', 0))
-            ) / 3.0
-        
-        # Add date if not present
-        if 'date' not in entry_data:
-            entry_data['date'] = datetime.now().strftime("%Y-%m-%d")
-        # Note: timestamp will be converted to datetime object in db_storage.save_wellness_entry()
-        # We keep it as ISO string here for JSON serialization, it gets converted when saving
-        if 'timestamp' not in entry_data:
-            entry_data['timestamp'] = datetime.now().isoformat()
-        
-        # Get ML predictions (create a copy with both field name formats for compatibility)
-        ml_data = entry_data.copy()
-        # ML models might use either format, so include both
-        if 'stress_morning' in ml_data and 'morning_stress' not in ml_data:
-            ml_data['morning_stress'] = ml_data['stress_morning']
-            ml_data['afternoon_stress'] = ml_data.get('stress_afternoon', ml_data.get('afternoon_stress', 0))
-            ml_data['night_stress'] = ml_data.get('stress_night', ml_data.get('night_stress', 0))
-        
-        try:
-            ml_insights = ml_predictor.predict_wellness(ml_data)
-            entry_data['wellness_score'] = ml_insights['wellness_score']
-            entry_data['sentiment_score'] = ml_insights['sentiment_score']
-            entry_data['predicted_energy'] = ml_insights['predicted_energy']
-        except Exception as e:
-            print(f"ML prediction error: {e}")
-            entry_data['wellness_score'] = 0
-            entry_data['sentiment_score'] = 0
-            entry_data['predicted_energy'] = 0
-        
-        # Clean up: Remove any form field names that shouldn't be in entry_data
-        # (they should have been converted to db field names already)
-        form_fields_to_remove = ['morning_stress', 'afternoon_stress', 'night_stress']
-        for field in form_fields_to_remove:
-            entry_data.pop(field, None)  # Remove if present, ignore if not
+        bundle = ml_predictor.registry.get()
+        entry_data = score_entry_data(normalize_entry_data(entry_data), bundle)
         
         # Save entry
         saved_entry = save_wellness_entry(entry_data)
         
-        # Train ML models if enough data
-        all_entries = get_all_entries()
-        if len(all_entries) >= 10 and not ml_predictor.is_xgb_trained:
-            ml_predictor.train_xgboost_model(all_entries)
-        if len(all_entries) >= 7 and not ml_predictor.is_lstm_trained:
-            ml_predictor.train_lstm_model(all_entries)
+        # Retrain in the background; a burst of saves is coalesced into one run
+        ml_trainer.request()
         
-        return jsonify({"success": True, "data": entry_data, "ml_trained": {
-            "xgboost": ml_predictor.is_xgb_trained,
-            "lstm": ml_predictor.is_lstm_trained
+        return jsonify({"success": True, "data": entry_data, "model_version": bundle.version, "ml_trained": {
+            "xgboost": bundle.has_xgb,
+            "lstm": bundle.has_lstm
         }})
     except Exception as e:
         import traceback
@@ -175,12 +362,36 @@ def create_entry():
         print(error_trace)
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/entries/bulk', methods=['POST'])
+def bulk_create_entries():
+    """Bulk import wellness entries streamed as NDJSON (one entry per line)"""
+    try:
+        # Read the body incrementally; entries are written chunk by chunk as
+        # they arrive so large uploads never sit fully in memory
+        bundle = ml_predictor.registry.get()
+        results = save_wellness_entries_batch(iter_ndjson_entries(request.stream, bundle))
+        
+        summary = {"inserted": 0, "updated": 0, "rejected": 0}
+        for result in results:
+            summary[result['status']] += 1
+        if summary['inserted'] or summary['updated']:
+            ml_trainer.request()
+        
+        return jsonify({"success": True, "data": {**summary, "model_version": bundle.version, "results": results}})
+    except Exception as e:
+        import traceback
+        print(f"Error in bulk_create_entries: {e}")
+        print(traceback.format_exc())
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/api/entries/<date>', methods=['GET'])
 def get_entry_by_date(date):
     """Get entry by date"""
     try:
-        entries = get_all_entries()
-        entry = next((e for e in entries if e['date'] == date), None)
+        try:
+            entry = get_entry(date)
+        except ValueError:
+            return jsonify({"success": False, "error": "Invalid date, expected YYYY-MM-DD"}), 400
         if entry:
             return jsonify({"success": True, "data": entry})
         else:
@@ -190,97 +401,118 @@ def get_entry_by_date(date):
 
 # ==================== Dashboard Endpoints ====================
 
+def stats_window(value):
+    """Parse the `window` query param: entries averaged by the dashboard stats (1-1000, default 7)"""
+    return min(max(int(value or STATS_WINDOW), 1), 1000)
+
+def dashboard_stats_data(stats):
+    """Dashboard stats response body from an entry_stats() result"""
+    averages = stats['averages']
+    return {
+        "avg_wellness": averages['wellness_score'] or 0,
+        "avg_sleep": averages['sleep_hours'] or 0,
+        "avg_exercise": averages['exercise_minutes'] or 0,
+        "avg_stress": averages['average_stress'] or 0,
+        "total_entries": stats['total_entries']
+    }
+
 @app.route('/api/dashboard/stats', methods=['GET'])
 def get_dashboard_stats():
-    """Get dashboard statistics"""
+    """Get dashboard statistics
+    
+    Averages cover the last `window` entries (query param, default 7) and
+    are computed by one aggregate query, so polling stays cheap however
+    long the history is.
+    """
     try:
-        entries = get_all_entries()
-        if not entries:
-            return jsonify({"success": True, "data": {
-                "avg_wellness": 0,
-                "avg_sleep": 0,
-                "avg_exercise": 0,
-                "avg_stress": 0,
-                "total_entries": 0
-            }})
-        
-        import pandas as pd
-        df = pd.DataFrame(entries)
-        recent = df.tail(7)
-        
-        # Helper function to safely get mean
-        def safe_mean(series, default=0):
-            try:
-                return float(series.mean()) if len(series) > 0 else default
-            except:
-                return default
-        
-        return jsonify({"success": True, "data": {
-            "avg_wellness": safe_mean(recent['wellness_score']) if 'wellness_score' in recent.columns else 0,
-            "avg_sleep": safe_mean(recent['sleep_hours'], 0),
-            "avg_exercise": safe_mean(recent['exercise_minutes'], 0),
-            "avg_stress": safe_mean(recent['average_stress'], 0),
-            "total_entries": len(entries)
-        }})
+        stats = entry_stats(stats_window(request.args.get('window')))
+        return jsonify({"success": True, "data": dashboard_stats_data(stats)})
     except Exception as e:
         import traceback
         print(f"Error in get_dashboard_stats: {e}")
         print(traceback.format_exc())
         return jsonify({"success": False, "error": str(e)}), 500
 
+# Chart columns reported as whole numbers (truncated, like int())
+CHART_INT_COLUMNS = {'exercise_minutes', 'water_intake'}
+
+def chart_columns(df, max_points=None):
+    """Columnar chart data: a `dates` array plus one parallel array per chart column
+    
+    Missing values are reported as 0. Each column is converted in one
+    vectorized pass. With max_points, longer histories are downsampled
+    to that many dates with LTTB (see downsample.py).
+    """
+    dates = df['date'].to_numpy()
+    arrays = {}
+    for name in CHART_COLUMNS:
+        values = df[name].fillna(0).to_numpy(dtype='float64')
+        if name in CHART_INT_COLUMNS:
+            values = values.astype('int64')
+        arrays[name] = values
+    
+    if max_points is not None and len(dates) > max_points:
+        keep = lttb_indices(date_axis(dates), np.column_stack(list(arrays.values())), max_points)
+        dates = dates[keep]
+        arrays = {name: values[keep] for name, values in arrays.items()}
+    
+    data = {"dates": dates.tolist()}
+    data.update((name, values.tolist()) for name, values in arrays.items())
+    return data
+
+def max_points_param(value):
+    """Parse the optional `max_points` query param (None keeps every point)"""
+    return None if value is None else max(int(value), MIN_POINTS)
+
+def chart_series(columns):
+    """Legacy per-chart row lists built from chart_columns() arrays"""
+    dates = [f"{day} 00:00:00" for day in columns['dates']]
+    return {
+        "wellness_scores": [{"date": day, "score": score} for day, score in zip(dates, columns['wellness_score'])],
+        "stress_levels": [
+            {"date": day, "morning": morning, "afternoon": afternoon, "night": night}
+            for day, morning, afternoon, night in zip(
+                dates, columns['stress_morning'], columns['stress_afternoon'], columns['stress_night']
+            )
+        ],
+        "sleep_data": [
+            {"date": day, "hours": hours, "quality": quality}
+            for day, hours, quality in zip(dates, columns['sleep_hours'], columns['sleep_quality'])
+        ],
+        "exercise_data": [{"date": day, "minutes": minutes} for day, minutes in zip(dates, columns['exercise_minutes'])],
+        "water_data": [{"date": day, "intake": intake} for day, intake in zip(dates, columns['water_intake'])]
+    }
+
 @app.route('/api/dashboard/charts', methods=['GET'])
 def get_dashboard_charts():
-    """Get dashboard chart data"""
+    """Get dashboard chart data
+    
+    Optional `start`/`end` query params (YYYY-MM-DD) limit the date range.
+    `format=columnar` returns chart_columns() arrays instead of the
+    per-chart row lists. `max_points` downsamples long ranges; those
+    responses are cached until the next write.
+    """
     try:
-        entries = get_all_entries()
-        if not entries:
-            return jsonify({"success": True, "data": {
-                "wellness_scores": [],
-                "stress_levels": [],
-                "sleep_data": [],
-                "exercise_data": [],
-                "water_data": []
-            }})
-        
-        import pandas as pd
-        df = pd.DataFrame(entries)
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.sort_values('date')
-        
-        # Helper function to safely get numeric values
-        def safe_float(value, default=0):
-            try:
-                return float(value) if value is not None else default
-            except (ValueError, TypeError):
-                return default
+        response_format = request.args.get('format', 'rows')
+        if response_format not in ('rows', 'columnar'):
+            return jsonify({"success": False, "error": "format must be 'rows' or 'columnar'"}), 400
         
-        def safe_int(value, default=0):
-            try:
-                return int(value) if value is not None else default
-            except (ValueError, TypeError):
-                return default
-        
-        chart_data = {
-            "wellness_scores": [{"date": str(row['date']), "score": safe_float(row.get('wellness_score', 0))} 
-                                for _, row in df.iterrows()] if 'wellness_score' in df.columns else [],
-            "stress_levels": [{
-                "date": str(row['date']),
-                "morning": safe_float(row.get('stress_morning', row.get('morning_stress', 0))),
-                "afternoon": safe_float(row.get('stress_afternoon', row.get('afternoon_stress', 0))),
-                "night": safe_float(row.get('stress_night', row.get('night_stress', 0)))
-            } for _, row in df.iterrows()],
-            "sleep_data": [{
-                "date": str(row['date']),
-                "hours": safe_float(row.get('sleep_hours', 0)),
-                "quality": safe_float(row.get('sleep_quality', 0))
-            } for _, row in df.iterrows()],
-            "exercise_data": [{"date": str(row['date']), "minutes": safe_int(row.get('exercise_minutes', 0))} 
-                             for _, row in df.iterrows()],
-            "water_data": [{"date": str(row['date']), "intake": safe_int(row.get('water_intake', 0))} 
-                           for _, row in df.iterrows()]
-        }
+        start_date, end_date = request.args.get('start'), request.args.get('end')
+        max_points = max_points_param(request.args.get('max_points'))
+        
+        def build():
+            df = load_entry_frame(CHART_COLUMNS, start_date=start_date, end_date=end_date)
+            return chart_columns(df, max_points)
+        
+        if max_points is None:
+            columns = build()
+        else:
+            key = ('charts', 'default_user', get_data_version(), start_date, end_date, max_points)
+            columns = cached_payload(key, build)
         
-        return jsonify({"success": True, "data": chart_data})
+        if response_format == 'columnar':
+            return jsonify({"success": True, "data": columns})
+        return jsonify({"success": True, "data": chart_series(columns)})
     except Exception as e:
         import traceback
         print(f"Error in get_dashboard_charts: {e}")
@@ -293,13 +525,10 @@ def get_dashboard_charts():
 def get_weekly_report():
     """Generate weekly report"""
     try:
-        entries = get_all_entries()
-        if len(entries) < 3:
+        df = load_entry_frame(REPORT_COLUMNS, limit=7)
+        if len(df) < 3:
             return jsonify({"success": False, "error": "Need at least 3 entries"}), 400
         
-        import pandas as pd
-        df = pd.DataFrame(entries)
-        
         # Generate report HTML (simplified version)
         report_html = generate_weekly_report(df)
         
@@ -322,13 +551,10 @@ def get_weekly_report():
 def get_monthly_report():
     """Generate monthly report"""
     try:
-        entries = get_all_entries()
-        if len(entries) < 7:
+        df = load_entry_frame(REPORT_COLUMNS, limit=30)
+        if len(df) < 7:
             return jsonify({"success": False, "error": "Need at least 7 entries"}), 400
         
-        import pandas as pd
-        df = pd.DataFrame(entries)
-        
         report_html = generate_monthly_report(df, ml_predictor)
         
         # Structured data
@@ -352,13 +578,10 @@ def get_monthly_report():
 def get_recommendations():
     """Get personalized recommendations"""
     try:
-        entries = get_all_entries()
-        if not entries:
+        df = load_entry_frame(REPORT_COLUMNS)
+        if df.empty:
             return jsonify({"success": False, "error": "No data available"}), 400
         
-        import pandas as pd
-        df = pd.DataFrame(entries)
-        
         recommendations_html = get_personalized_recommendations(df)
         
         return jsonify({"success": True, "html": recommendations_html})
@@ -371,8 +594,7 @@ def get_recommendations():
 def get_cycle_prediction():
     """Get cycle prediction"""
     try:
-        entries = get_all_entries()
-        data = {"entries": entries}
+        data = {"entries": load_entry_frame(CYCLE_COLUMNS)}
         
         prediction = predict_next_cycle(data)
         
@@ -395,10 +617,9 @@ def get_cycle_prediction():
 def get_symptom_predictions():
     """Get symptom predictions"""
     try:
-        entries = get_all_entries()
-        data = {"entries": entries}
-        
-        predictions = predict_symptom_likelihood(data)
+        # Bit tests on symptom_mask count period-day symptoms in SQL
+        symptom_counts, period_days = count_symptoms(period_only=True)
+        predictions = symptom_likelihoods(symptom_counts, period_days)
         
         return jsonify({"success": True, "data": predictions})
     except Exception as e:
@@ -408,32 +629,48 @@ def get_symptom_predictions():
 
 @app.route('/api/analytics/trends', methods=['GET'])
 def get_trends():
-    """Get trend analysis data"""
+    """Get trend analysis data
+    
+    `max_points` downsamples the monthly aggregates with LTTB; those
+    responses are cached until the next write.
+    """
     try:
-        entries = get_all_entries()
-        if len(entries) < 3:
-            return jsonify({"success": False, "error": "Need at least 3 entries"}), 400
-        
-        import pandas as pd
-        df = pd.DataFrame(entries)
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # Calculate correlations
-        correlation_metrics = ['average_stress', 'sleep_hours', 'sleep_quality', 
-                              'exercise_minutes', 'water_intake', 'wellness_score']
-        
-        corr_data = {}
-        if all(col in df.columns for col in correlation_metrics):
-            corr_matrix = df[correlation_metrics].corr()
-            corr_data = corr_matrix.to_dict()
+        max_points = max_points_param(request.args.get('max_points'))
+        
+        def build():
+            df = load_entry_frame(ANALYTICS_COLUMNS)
+            if len(df) < 3:
+                return None
+            
+            # Calculate correlations
+            correlation_metrics = ['average_stress', 'sleep_hours', 'sleep_quality', 
+                                  'exercise_minutes', 'water_intake', 'wellness_score']
+            
+            corr_data = {}
+            if all(col in df.columns for col in correlation_metrics):
+                corr_matrix = df[correlation_metrics].corr()
+                corr_data = corr_matrix.to_dict()
+            
+            # Monthly aggregates
+            monthly_data = monthly_aggregates() if len(df) >= 14 else None
+            if monthly_data is not None and max_points is not None and len(monthly_data) > max_points:
+                keep = lttb_indices(np.arange(len(monthly_data)),
+                                    monthly_data.select_dtypes('number').to_numpy(), max_points)
+                monthly_data = monthly_data.iloc[keep]
+            
+            return {
+                "correlations": corr_data,
+                "monthly_aggregates": monthly_data.to_dict('records') if monthly_data is not None else None
+            }
         
-        # Monthly aggregates
-        monthly_data = calculate_monthly_aggregates(df) if len(df) >= 14 else None
+        if max_points is None:
+            data = build()
+        else:
+            data = cached_payload(('trends', 'default_user', get_data_version(), max_points), build)
         
-        return jsonify({"success": True, "data": {
-            "correlations": corr_data,
-            "monthly_aggregates": monthly_data.to_dict('records') if monthly_data is not None else None
-        }})
+        if data is None:
+            return jsonify({"success": False, "error": "Need at least 3 entries"}), 400
+        return jsonify({"success": True, "data": data})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -441,16 +678,12 @@ def get_trends():
 def get_comparative_analytics():
     """Get comparative analytics"""
     try:
-        entries = get_all_entries()
-        if len(entries) < 14:
+        if count_entries() < 14:
             return jsonify({"success": False, "error": "Need at least 14 entries"}), 400
         
-        import pandas as pd
-        df = pd.DataFrame(entries)
-        df['date'] = pd.to_datetime(df['date'])
-        
-        monthly_stats = calculate_monthly_aggregates(df)
-        comparisons = compare_months(df)
+        # Month rollups replace a pass over every entry
+        monthly_stats = monthly_aggregates()
+        comparisons = compare_months(monthly_data=monthly_stats)
         
         return jsonify({"success": True, "data": {
             "monthly_stats": monthly_stats.to_dict('records'),
@@ -465,8 +698,7 @@ def get_comparative_analytics():
 def export_csv():
     """Export data as CSV"""
     try:
-        entries = get_all_entries()
-        data = {"entries": entries}
+        data = {"entries": load_entry_frame()}
         
         csv_data = export_to_csv(data)
         
@@ -500,10 +732,9 @@ def export_json():
 def export_summary():
     """Generate summary report"""
     try:
-        entries = get_all_entries()
-        data = {"entries": entries}
+        data = {"entries": load_entry_frame(REPORT_COLUMNS + ['symptom_mask'])}
         
-        summary = create_summary_report(data)
+        summary = create_summary_report(data, totals=rollup_totals(), symptom_bits=load_symptom_bits())
         
         return summary, 200, {
             'Content-Type': 'text/plain',
@@ -524,17 +755,54 @@ def predict_wellness():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/ml/predict/batch', methods=['POST'])
+def predict_wellness_batch():
+    """Predict wellness for many entries: a JSON array, or NDJSON (one entry per line)"""
+    try:
+        if request.is_json:
+            entries = request.get_json()
+            if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+                return jsonify({"success": False, "error": "Expected a JSON array of entry objects"}), 400
+        else:
+            entries = []
+            for item in iter_ndjson_lines(request.stream):
+                if isinstance(item, ValueError):
+                    return jsonify({"success": False, "error": str(item)}), 400
+                entries.append(item)
+                if len(entries) > PREDICT_BATCH_LIMIT:
+                    break
+        
+        if len(entries) > PREDICT_BATCH_LIMIT:
+            return jsonify({"success": False,
+                            "error": f"At most {PREDICT_BATCH_LIMIT} entries per request"}), 413
+        
+        bundle = ml_predictor.registry.get()
+        predictions = ml_predictor.predict_batch(entries, bundle)
+        return jsonify({"success": True, "data": {
+            "count": len(predictions),
+            "model_version": bundle.version,
+            "model_scope": bundle.scope,
+            "predictions": predictions.to_dict('records')
+        }})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/api/ml/status', methods=['GET'])
 def ml_status():
     """Get ML model training status"""
     try:
-        entries = get_all_entries()
+        total_entries = count_entries()
+        bundle = ml_predictor.registry.get()
         return jsonify({"success": True, "data": {
-            "xgboost_trained": ml_predictor.is_xgb_trained,
-            "lstm_trained": ml_predictor.is_lstm_trained,
-            "total_entries": len(entries),
-            "xgboost_ready": len(entries) >= 10,
-            "lstm_ready": len(entries) >= 7
+            "xgboost_trained": bundle.has_xgb,
+            "lstm_trained": bundle.has_lstm,
+            "total_entries": total_entries,
+            "xgboost_ready": total_entries >= XGB_MIN_ENTRIES,
+            "lstm_ready": total_entries >= LSTM_MIN_ENTRIES,
+            "model_version": bundle.version,
+            "model_scope": bundle.scope,
+            "model_cache": ml_predictor.registry.stats(),
+            "training": ml_trainer.status()
         }})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
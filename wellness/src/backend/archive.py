@@ -0,0 +1,418 @@
+"""
+Cold-tier archive of old wellness entries in per-user Parquet files
+
+archive_old_entries() moves entries older than ARCHIVE_HORIZON_DAYS out of
+wellness_entries into zstd-compressed Parquet files, one directory per user:
+
+    ARCHIVE_DIR/<user_id>/manifest.json
+    ARCHIVE_DIR/<user_id>/part-<timestamp>-<id>.parquet   (one row group per month)
+
+The manifest records the first/last date and row count of every file and
+row group, so readers open only the row groups a date range needs. Entries
+saved later for an archived date stay in wellness_entries and take
+precedence over their archived copy; deleting an archived date records a
+tombstone in the manifest. Every manifest update holds a lock file in the
+user's directory, so archive runs and the API (which writes tombstones)
+can update it from different processes. db_storage unions archived rows
+into its reads, and rollups and symptom counts include them.
+
+Requires pyarrow (see requirements.txt).
+
+Usage (from src/backend):
+    python archive.py                          # archive every user
+    python archive.py --user default_user --horizon-days 180
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date as date_type, datetime, timedelta
+from urllib.parse import quote, unquote
+from sqlalchemy import BigInteger, Boolean, Date, DateTime, Float, Integer, JSON, delete, select
+from database import project_root, get_db, close_db, init_db, user_engines, WellnessEntry
+
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(project_root, 'archive'))
+ARCHIVE_HORIZON_DAYS = int(os.getenv('ARCHIVE_HORIZON_DAYS', 365))
+
+# Every entry column except the row id and user_id (implied by the directory)
+ARCHIVE_COLUMNS = tuple(
+    column.key for column in WellnessEntry.__table__.columns if column.key not in ('id', 'user_id')
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to an O_EXCL lock file
+    fcntl = None
+
+# A lock file left behind by a crashed process (no fcntl) is broken after this
+MANIFEST_LOCK_STALE_SECONDS = 300
+
+_manifest_lock = threading.Lock()
+_manifests = {}  # user_id -> (manifest mtime_ns, manifest)
+
+def _parquet():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("The entry archive requires pyarrow (pip install pyarrow)") from e
+    return pyarrow, pyarrow.parquet
+
+def _arrow_type(pa, column):
+    if isinstance(column.type, (BigInteger, Integer)):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Date):
+        return pa.date32()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp('us')
+    # Strings, text and JSON (stored as JSON text)
+    return pa.string()
+
+def _arrow_schema(pa):
+    table = WellnessEntry.__table__
+    return pa.schema([(name, _arrow_type(pa, table.c[name])) for name in ARCHIVE_COLUMNS])
+
+_JSON_COLUMNS = frozenset(
+    column.key for column in WellnessEntry.__table__.columns if isinstance(column.type, JSON)
+)
+
+# ==================== Manifest ====================
+
+def user_archive_dir(user_id):
+    return os.path.join(ARCHIVE_DIR, quote(user_id, safe=''))
+
+def _manifest_path(user_id):
+    return os.path.join(user_archive_dir(user_id), 'manifest.json')
+
+@contextmanager
+def _manifest_locked(user_id):
+    """Hold the user's manifest lock, across threads and processes
+
+    Every read-modify-write of a manifest must run inside this.
+    """
+    directory = user_archive_dir(user_id)
+    os.makedirs(directory, exist_ok=True)
+    lock_path = os.path.join(directory, '.manifest.lock')
+
+    with _manifest_lock:
+        if fcntl is not None:
+            with open(lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            return
+
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.stat(lock_path).st_mtime > MANIFEST_LOCK_STALE_SECONDS:
+                        os.remove(lock_path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            os.remove(lock_path)
+
+def _read_manifest(user_id):
+    """The manifest as on disk right now (bypassing the cache), or None"""
+    try:
+        with open(_manifest_path(user_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def load_manifest(user_id):
+    """Return the user's archive manifest, or None when nothing is archived
+
+    Cached per process and re-read whenever the file changes, so archive
+    runs from another process are picked up.
+    """
+    try:
+        mtime = os.stat(_manifest_path(user_id)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    cached = _manifests.get(user_id)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(_manifest_path(user_id)) as f:
+        manifest = json.load(f)
+    _manifests[user_id] = (mtime, manifest)
+    return manifest
+
+def _write_manifest(user_id, manifest):
+    path = _manifest_path(user_id)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    _manifests.pop(user_id, None)
+
+def archived_through(user_id):
+    """Return the date before which the user's entries may be archived, or None"""
+    manifest = load_manifest(user_id)
+    return date_type.fromisoformat(manifest['archived_through']) if manifest else None
+
+def reaches_archive(user_id, start_date=None):
+    """True when a range starting at start_date (None = open) may include archived rows"""
+    through = archived_through(user_id)
+    return through is not None and (start_date is None or start_date < through)
+
+def hot_dates_select(user_id, through):
+    """Select the dates of live rows that shadow archived rows (usually none)"""
+    entries = WellnessEntry.__table__
+    return select(entries.c.date).where(entries.c.user_id == user_id, entries.c.date < through)
+
+def shadowed_dates(db, user_id):
+    """Return the dates of a user's live rows that shadow archived rows"""
+    return set(db.scalars(hot_dates_select(user_id, archived_through(user_id))))
+
+def add_tombstone(user_id, date):
+    """Hide an archived entry; returns False when date is not archived (or already hidden)"""
+    with _manifest_locked(user_id):
+        _manifests.pop(user_id, None)  # read_archived must see the current manifest
+        if not read_archived(user_id, ['date'], date, date):
+            return False
+        manifest = _read_manifest(user_id)
+        manifest['deleted'] = sorted(set(manifest.get('deleted', [])) | {date.isoformat()})
+        _write_manifest(user_id, manifest)
+        return True
+
+def remove_tombstone(user_id, date):
+    """Undo add_tombstone (when the delete it belonged to was rolled back)"""
+    with _manifest_locked(user_id):
+        manifest = _read_manifest(user_id)
+        if manifest is None or date.isoformat() not in manifest.get('deleted', []):
+            return
+        manifest['deleted'] = sorted(set(manifest['deleted']) - {date.isoformat()})
+        _write_manifest(user_id, manifest)
+
+# ==================== Reading ====================
+
+def _decode(name, value):
+    if name in _JSON_COLUMNS and value is not None:
+        return json.loads(value)
+    return value
+
+def read_archived(user_id, columns, start_date=None, end_date=None, limit=None, newest_first=False,
+                  skip_dates=frozenset()):
+    """Read archived rows as tuples of columns, oldest first
+
+    start_date/end_date are inclusive date bounds; only row groups that
+    overlap them are read. skip_dates (live rows that shadow archived ones)
+    and tombstoned dates are left out. With limit, only the oldest (or with
+    newest_first, the newest) limit rows are returned.
+    """
+    manifest = load_manifest(user_id)
+    if manifest is None:
+        return []
+
+    start = start_date.isoformat() if start_date else None
+    end = end_date.isoformat() if end_date else None
+    hidden = {day.isoformat() for day in skip_dates} | set(manifest.get('deleted', []))
+
+    # Row groups overlapping the range, as (first_date, last_date, file position, file, group)
+    groups = [
+        (group['first_date'], group['last_date'], position, part['file'], index)
+        for position, part in enumerate(manifest['files'])
+        for index, group in enumerate(part['row_groups'])
+        if (start is None or group['last_date'] >= start) and (end is None or group['first_date'] <= end)
+    ]
+    groups.sort(reverse=newest_first)
+
+    _, pq = _parquet()
+    read_columns = list(dict.fromkeys(['date'] + list(columns)))
+    rows = {}  # date -> (file position, row); later files win for dates archived twice
+    files = {}
+    for first, last, position, file_name, index in groups:
+        if limit is not None and len(rows) >= limit:
+            # Skip groups entirely outside the rows already selected
+            boundary = sorted(rows, reverse=newest_first)[limit - 1].isoformat()
+            if (last < boundary) if newest_first else (first > boundary):
+                continue
+        if file_name not in files:
+            files[file_name] = pq.ParquetFile(os.path.join(user_archive_dir(user_id), file_name))
+        for record in files[file_name].read_row_group(index, columns=read_columns).to_pylist():
+            day = record['date']
+            if day.isoformat() in hidden or (start_date and day < start_date) or (end_date and day > end_date):
+                continue
+            if day not in rows or rows[day][0] <= position:
+                rows[day] = (position, tuple(_decode(name, record[name]) for name in columns))
+
+    days = sorted(rows, reverse=newest_first)
+    if limit is not None:
+        days = days[:limit]
+    return [rows[day][1] for day in sorted(days)]
+
+_date_sets = {}  # user_id -> (manifest, visible archived dates)
+
+def archived_dates(user_id):
+    """Return the set of visible archived dates for a user (cached per manifest)"""
+    manifest = load_manifest(user_id)
+    if manifest is None:
+        return frozenset()
+    cached = _date_sets.get(user_id)
+    if cached is None or cached[0] is not manifest:
+        cached = (manifest, frozenset(row[0] for row in read_archived(user_id, ['date'])))
+        _date_sets[user_id] = cached
+    return cached[1]
+
+def archived_users():
+    """Return the user IDs that have an archive"""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    return sorted(
+        unquote(name) for name in os.listdir(ARCHIVE_DIR)
+        if os.path.exists(os.path.join(ARCHIVE_DIR, name, 'manifest.json'))
+    )
+
+# ==================== Archiving ====================
+
+def archive_cutoff(horizon_days=None, today=None):
+    """First day of the month horizon_days before today; older entries are archived
+
+    Whole months keep each month in one row group across archive runs.
+    """
+    horizon_days = ARCHIVE_HORIZON_DAYS if horizon_days is None else horizon_days
+    return ((today or date_type.today()) - timedelta(days=horizon_days)).replace(day=1)
+
+def _write_part(user_id, rows, file_name):
+    """Write rows (dicts, sorted by date) as one row group per month"""
+    pa, pq = _parquet()
+    schema = _arrow_schema(pa)
+
+    months = {}
+    for row in rows:
+        months.setdefault(row['date'].replace(day=1), []).append(row)
+
+    path = os.path.join(user_archive_dir(user_id), file_name)
+    temp_path = f'{path}.tmp'
+    row_groups = []
+    with pq.ParquetWriter(temp_path, schema, compression='zstd') as writer:
+        for month_rows in months.values():
+            columns = {
+                name: [json.dumps(row[name]) if name in _JSON_COLUMNS and row[name] is not None else row[name]
+                       for row in month_rows]
+                for name in ARCHIVE_COLUMNS
+            }
+            writer.write_table(pa.table(columns, schema=schema), row_group_size=len(month_rows))
+            row_groups.append({'first_date': month_rows[0]['date'].isoformat(),
+                               'last_date': month_rows[-1]['date'].isoformat(),
+                               'rows': len(month_rows)})
+    os.replace(temp_path, path)
+
+    return {'file': file_name, 'first_date': rows[0]['date'].isoformat(),
+            'last_date': rows[-1]['date'].isoformat(), 'rows': len(rows), 'row_groups': row_groups}
+
+def archive_user_entries(user_id, before):
+    """Move a user's entries dated before `before` into a new archive file
+
+    The rows are deleted and written out in one transaction: if the archive
+    write fails nothing is deleted, and if the commit fails the archived
+    copies are shadowed by the still-live rows. Returns the number archived.
+    """
+    entries = WellnessEntry.__table__
+    columns = [entries.c[name] for name in ARCHIVE_COLUMNS]
+    condition = (entries.c.user_id == user_id) & (entries.c.date < before)
+    db = get_db(user_id)
+
+    try:
+        if db.get_bind().dialect.delete_returning:
+            rows = db.execute(delete(entries).where(condition).returning(*columns)).mappings().all()
+        else:
+            rows = db.execute(select(*columns).where(condition).with_for_update()).mappings().all()
+            db.execute(delete(entries).where(condition))
+        if not rows:
+            db.rollback()
+            return 0
+        rows = sorted((dict(row) for row in rows), key=lambda row: row['date'])
+
+        # A unique name, so concurrent runs never write the same file
+        os.makedirs(user_archive_dir(user_id), exist_ok=True)
+        file_name = f"part-{datetime.utcnow():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}.parquet"
+        part = _write_part(user_id, rows, file_name)
+
+        try:
+            with _manifest_locked(user_id):
+                manifest = _read_manifest(user_id) or {'user_id': user_id, 'files': [], 'deleted': []}
+                archived = {row['date'].isoformat() for row in rows}
+                through = max(before, date_type.fromisoformat(manifest.get('archived_through', before.isoformat())))
+                _write_manifest(user_id, {
+                    'user_id': user_id,
+                    'archived_through': through.isoformat(),
+                    'files': manifest['files'] + [part],
+                    # Newly archived rows replace any tombstone for their date
+                    'deleted': sorted(set(manifest.get('deleted', [])) - archived),
+                })
+        except Exception:
+            # Not in the manifest, so nothing reads it
+            os.remove(os.path.join(user_archive_dir(user_id), file_name))
+            raise
+
+        db.commit()
+        return len(rows)
+
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        close_db(db)
+
+def archive_old_entries(horizon_days=None, user_id=None):
+    """Archive entries older than the horizon for one user or every user
+
+    Returns {user_id: rows archived} for users that had rows to move.
+    """
+    # Imported here: db_storage reads through this module
+    from db_storage import invalidate_entry_cache
+
+    before = archive_cutoff(horizon_days)
+    entries = WellnessEntry.__table__
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = set()
+        for bind in user_engines():
+            with bind.connect() as conn:
+                user_ids.update(conn.scalars(
+                    select(entries.c.user_id).where(entries.c.date < before).distinct()
+                ))
+
+    archived = {}
+    for uid in sorted(user_ids):
+        count = archive_user_entries(uid, before)
+        if count:
+            invalidate_entry_cache(uid)
+            archived[uid] = count
+    return archived
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old wellness entries into Parquet archives")
+    parser.add_argument('--user', help="Only archive this user's entries")
+    parser.add_argument('--horizon-days', type=int, default=ARCHIVE_HORIZON_DAYS,
+                        help="Keep entries newer than this many days live (default: %(default)s)")
+    args = parser.parse_args()
+
+    init_db()
+    archived = archive_old_entries(args.horizon_days, args.user)
+    for uid, count in archived.items():
+        print(f"  {uid}: {count} entries archived")
+    print(f"Archived entries before {archive_cutoff(args.horizon_days)} for {len(archived)} users.")
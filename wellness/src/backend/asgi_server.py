@@ -0,0 +1,184 @@
+"""
+ASGI entry point for the Women's Wellness Tracker API
+
+The entry, dashboard stats and profile endpoints the React app calls on every
+page load run natively on async_storage, so one process serves many
+concurrent dashboards without a thread per request. Every other route falls
+through to the Flask app (api_server), which Starlette runs in its thread
+pool, so the API surface is identical to the Flask server.
+
+Requires starlette, a2wsgi, uvicorn and an async driver (see requirements.txt).
+Run with scripts/start_asgi.py, or:
+    uvicorn asgi_server:app --port 5000   (with src/backend and src/ml on PYTHONPATH)
+"""
+
+import functools
+import json
+import traceback
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+# Importing the Flask app also initializes the database and ML models
+from api_server import (app as flask_app, ml_predictor, ml_trainer, normalize_entry_data, score_entry_data,
+                        with_frontend_fields, entries_page_params, stats_window, dashboard_stats_data,
+                        response_etag, etag_matches)
+import async_storage
+from db_storage import entry_cache_stats
+
+class APIJSONResponse(JSONResponse):
+    """JSON encoded the way Flask's jsonify does (sorted keys, NaN allowed)"""
+    def render(self, content):
+        return json.dumps(content, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def error_response(name, e, status_code=500):
+    print(f"Error in {name}: {e}")
+    print(traceback.format_exc())
+    return APIJSONResponse({"success": False, "error": str(e)}, status_code=status_code)
+
+def conditional(handler):
+    """Give a GET handler the Flask app's ETag / If-None-Match handling"""
+    @functools.wraps(handler)
+    async def wrapper(request):
+        etag = response_etag(handler.__name__, request.path_params, request.query_params.multi_items(),
+                             await async_storage.get_data_version())
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+        if etag_matches(request.headers.get('if-none-match'), etag):
+            return Response(status_code=304, headers=headers)
+
+        response = await handler(request)
+        if response.status_code == 200:
+            response.headers.update(headers)
+        return response
+    return wrapper
+
+# ==================== Entries Endpoints ====================
+
+async def health_check(request):
+    """Health check endpoint"""
+    return APIJSONResponse({"status": "healthy", "message": "API is running",
+                            "entry_cache": entry_cache_stats()})
+
+@conditional
+async def get_entries(request):
+    """Get wellness entries: all of them, or one page when paging params are given"""
+    try:
+        page = entries_page_params(request.query_params)
+        if page is None:
+            entries = await async_storage.get_all_entries()
+            return APIJSONResponse({"success": True, "data": with_frontend_fields(entries)})
+
+        after_date, limit = page
+        entries, next_cursor = await async_storage.get_entries_page(after_date=after_date, limit=limit)
+        return APIJSONResponse({"success": True, "data": with_frontend_fields(entries), "next_cursor": next_cursor})
+    except Exception as e:
+        return error_response('get_entries', e)
+
+@conditional
+async def get_recent(request):
+    """Get recent entries"""
+    try:
+        limit = int(request.query_params.get('limit', 30))
+        entries = await async_storage.get_recent_entries(limit=limit)
+        return APIJSONResponse({"success": True, "data": entries})
+    except Exception as e:
+        return APIJSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+async def create_entry(request):
+    """Create a new wellness entry"""
+    try:
+        try:
+            entry_data = await request.json()
+        except ValueError:
+            entry_data = None
+        if not entry_data:
+            return APIJSONResponse({"success": False, "error": "No data received"}, status_code=400)
+
+        # Model inference is CPU work; keep it off the event loop
+        bundle = ml_predictor.registry.get()
+        entry_data = await run_in_threadpool(lambda: score_entry_data(normalize_entry_data(entry_data), bundle))
+        await async_storage.save_wellness_entry(entry_data)
+
+        # Retrain in the Flask app's background trainer
+        ml_trainer.request()
+
+        return APIJSONResponse({"success": True, "data": entry_data, "model_version": bundle.version, "ml_trained": {
+            "xgboost": bundle.has_xgb,
+            "lstm": bundle.has_lstm
+        }})
+    except Exception as e:
+        return error_response('create_entry', e)
+
+@conditional
+async def get_entry_by_date(request):
+    """Get entry by date"""
+    try:
+        try:
+            entry = await async_storage.get_entry(request.path_params['date'])
+        except ValueError:
+            return APIJSONResponse({"success": False, "error": "Invalid date, expected YYYY-MM-DD"}, status_code=400)
+        if entry:
+            return APIJSONResponse({"success": True, "data": entry})
+        return APIJSONResponse({"success": False, "error": "Entry not found"}, status_code=404)
+    except Exception as e:
+        return APIJSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+# ==================== Dashboard Endpoints ====================
+
+@conditional
+async def get_dashboard_stats(request):
+    """Get dashboard statistics"""
+    try:
+        stats = await async_storage.entry_stats(stats_window(request.query_params.get('window')))
+        return APIJSONResponse({"success": True, "data": dashboard_stats_data(stats)})
+    except Exception as e:
+        return error_response('get_dashboard_stats', e)
+
+# ==================== User Profile Endpoints ====================
+
+@conditional
+async def get_profile(request):
+    """Get user profile"""
+    try:
+        profile = await async_storage.get_user_profile()
+        return APIJSONResponse({"success": True, "data": profile})
+    except Exception as e:
+        return APIJSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+async def update_profile(request):
+    """Update user profile"""
+    try:
+        profile_data = await request.json()
+        await async_storage.update_user_profile(profile_data)
+        return APIJSONResponse({"success": True, "message": "Profile updated"})
+    except Exception as e:
+        return APIJSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await async_storage.dispose_async_engine()
+
+routes = [
+    Route('/api/health', health_check, methods=['GET']),
+    Route('/api/entries', get_entries, methods=['GET']),
+    Route('/api/entries', create_entry, methods=['POST']),
+    Route('/api/entries/recent', get_recent, methods=['GET']),
+    Route('/api/entries/{date}', get_entry_by_date, methods=['GET']),
+    Route('/api/dashboard/stats', get_dashboard_stats, methods=['GET']),
+    Route('/api/profile', get_profile, methods=['GET']),
+    Route('/api/profile', update_profile, methods=['PUT']),
+    # Everything else (reports, analytics, exports, ML, bulk import) is served by Flask
+    Mount('/', app=WSGIMiddleware(flask_app)),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
@@ -0,0 +1,341 @@
+"""
+Async storage layer on SQLAlchemy asyncio, for the ASGI server
+
+Mirrors the read/write functions of db_storage with the same arguments,
+return values and side effects (upsert semantics, rollups, symptom masks,
+archived entries and entry cache invalidation), but awaits the database
+through aiosqlite or asyncpg instead of blocking a thread. db_storage stays
+the synchronous API for the Flask server and scripts.
+
+Requires the optional async drivers (see requirements.txt):
+    pip install aiosqlite      # SQLite
+    pip install asyncpg        # PostgreSQL
+
+The async URL is derived from DATABASE_URL, or set ASYNC_DATABASE_URL.
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import desc, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from database import (DATABASE_URL, STORAGE_BACKEND, WellnessEntry, UserProfile, configure_sqlite_engine,
+                      engine_options)
+from db_storage import (to_date, prepare_entry_row, build_entry_upsert, upsert_entry_fallback, entry_to_dict,
+                        frame_columns, entry_frame_select, rows_to_frame, slice_entry_frame,
+                        cached_entry_frame, store_entry_frame, CACHED_FRAME_COLUMNS,
+                        read_archived_entries, merge_entries, with_archived_frame,
+                        entry_stats_select, stats_result, frame_stats, STATS_COLUMNS,
+                        bump_data_version, data_version_select,
+                        invalidate_entry_cache, ENTRY_CACHE_MAX_BYTES)
+from archive import add_tombstone, remove_tombstone, archived_dates, archived_through, hot_dates_select, reaches_archive
+from rollups import refresh_rollups
+from symptoms import apply_symptom_masks
+
+# Async driver for each database backend
+ASYNC_DRIVERS = {
+    'sqlite': 'aiosqlite',
+    'postgresql': 'asyncpg',
+}
+
+def async_database_url(database_url=DATABASE_URL):
+    """Return ASYNC_DATABASE_URL, or database_url switched to its async driver"""
+    if os.getenv('ASYNC_DATABASE_URL'):
+        return os.getenv('ASYNC_DATABASE_URL')
+
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}' databases")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+_async_engine = None
+_async_session_factory = None
+
+def get_async_engine():
+    """Create the async engine on first use, so importing needs no driver"""
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        if STORAGE_BACKEND == 'sharded':
+            raise RuntimeError("Async storage does not support WELLNESS_STORAGE=sharded; use the Flask server")
+        url = async_database_url()
+        _async_engine = create_async_engine(url, **engine_options(url))
+        if _async_engine.dialect.name == 'sqlite':
+            configure_sqlite_engine(_async_engine.sync_engine)
+        _async_session_factory = async_sessionmaker(_async_engine, expire_on_commit=False)
+    return _async_engine
+
+def async_session():
+    """Open a new AsyncSession (use as `async with async_session() as db`)"""
+    get_async_engine()
+    return _async_session_factory()
+
+async def dispose_async_engine():
+    """Close pooled connections (call on application shutdown)"""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_session_factory = None
+
+# ==================== Writes ====================
+
+async def save_wellness_entry(entry_data, user_id='default_user'):
+    """Save a wellness entry to the database (async db_storage.save_wellness_entry)"""
+    if 'date' not in entry_data:
+        raise ValueError("Entry data must include a date")
+
+    row = prepare_entry_row(entry_data, user_id)
+    if 'symptoms' in row:
+        # Registering a new symptom is a short blocking write; keep it off the loop
+        await asyncio.to_thread(apply_symptom_masks, [row])
+
+    async with async_session() as db:
+        try:
+            stmt = build_entry_upsert(get_async_engine().dialect.name, [row])
+            if stmt is not None:
+                saved = (await db.scalars(
+                    stmt.returning(WellnessEntry),
+                    execution_options={'populate_existing': True}
+                )).one()
+            else:
+                saved = await db.run_sync(upsert_entry_fallback, row)
+
+            await db.run_sync(refresh_rollups, user_id, [row['date']])
+            await db.run_sync(bump_data_version, user_id)
+
+            db.expunge(saved)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            raise e
+
+    invalidate_entry_cache(user_id)
+    return saved
+
+async def delete_entry(date, user_id='default_user'):
+    """Delete a wellness entry by date and refresh its rollups"""
+    archived = False
+    async with async_session() as db:
+        try:
+            day = to_date(date)
+            entry = await db.scalar(select(WellnessEntry).where(
+                WellnessEntry.date == day,
+                WellnessEntry.user_id == user_id
+            ))
+
+            if entry is not None:
+                await db.delete(entry)
+                await db.flush()
+            archived = reaches_archive(user_id, day) and await asyncio.to_thread(add_tombstone, user_id, day)
+
+            if entry is None and not archived:
+                return False
+
+            await db.run_sync(refresh_rollups, user_id, [day])
+            await db.run_sync(bump_data_version, user_id)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            # The delete did not happen, so the archived copy must stay visible
+            if archived:
+                await asyncio.to_thread(remove_tombstone, user_id, day)
+            raise e
+
+    invalidate_entry_cache(user_id)
+    return True
+
+# ==================== Reads ====================
+
+async def _shadowed_dates(db, user_id):
+    return set(await db.scalars(hot_dates_select(user_id, archived_through(user_id))))
+
+async def _archived_entries(db, user_id, start_date=None, end_date=None, limit=None, newest_first=False):
+    """Async db_storage.archived_entries; the Parquet read runs in a worker thread"""
+    if not reaches_archive(user_id, start_date):
+        return []
+    skip_dates = await _shadowed_dates(db, user_id)
+    return await asyncio.to_thread(read_archived_entries, user_id, skip_dates, start_date, end_date,
+                                   limit, newest_first)
+
+async def get_all_entries(user_id='default_user'):
+    """Get all wellness entries for a user"""
+    async with async_session() as db:
+        entries = (await db.scalars(
+            select(WellnessEntry).where(WellnessEntry.user_id == user_id).order_by(WellnessEntry.date)
+        )).all()
+        entries = merge_entries(entries, await _archived_entries(db, user_id))
+        return [entry_to_dict(entry) for entry in entries]
+
+async def get_recent_entries(user_id='default_user', limit=30):
+    """Get recent wellness entries"""
+    async with async_session() as db:
+        entries = (await db.scalars(
+            select(WellnessEntry).where(WellnessEntry.user_id == user_id)
+            .order_by(desc(WellnessEntry.date)).limit(limit)
+        )).all()
+
+        # Archived rows can only displace live ones older than the oldest kept
+        start_date = entries[-1].date if len(entries) == limit else None
+        archived = await _archived_entries(db, user_id, start_date, limit=limit, newest_first=True)
+        entries = merge_entries(entries[::-1], archived, limit, newest_first=True)
+        return [entry_to_dict(entry) for entry in entries]
+
+async def get_entry(date, user_id='default_user'):
+    """Get a single wellness entry by date, or None if there is none"""
+    day = to_date(date)
+    async with async_session() as db:
+        entry = await db.scalar(select(WellnessEntry).where(
+            WellnessEntry.user_id == user_id,
+            WellnessEntry.date == day
+        ))
+        if entry is None:
+            archived = await _archived_entries(db, user_id, day, day)
+            entry = archived[0] if archived else None
+        return entry_to_dict(entry) if entry else None
+
+async def get_entries_page(after_date=None, limit=100, user_id='default_user'):
+    """Get one page of wellness entries using keyset pagination on date
+
+    Returns (entries, next_cursor), like db_storage.get_entries_page().
+    """
+    stmt = select(WellnessEntry).where(WellnessEntry.user_id == user_id)
+    if after_date is not None:
+        stmt = stmt.where(WellnessEntry.date > to_date(after_date))
+
+    async with async_session() as db:
+        # Fetch one extra row to learn whether another page exists
+        entries = (await db.scalars(stmt.order_by(WellnessEntry.date).limit(limit + 1))).all()
+        start_date = to_date(after_date) + timedelta(days=1) if after_date is not None else None
+        entries = merge_entries(entries, await _archived_entries(db, user_id, start_date, limit=limit + 1),
+                                 limit + 1)
+
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = entries[-1].date.isoformat()
+
+    return [entry_to_dict(entry) for entry in entries], next_cursor
+
+async def count_entries(user_id='default_user'):
+    """Count wellness entries for a user"""
+    async with async_session() as db:
+        count = await db.scalar(
+            select(func.count()).select_from(WellnessEntry).where(WellnessEntry.user_id == user_id)
+        )
+        if reaches_archive(user_id):
+            dates = await asyncio.to_thread(archived_dates, user_id)
+            count += len(dates - await _shadowed_dates(db, user_id))
+        return count
+
+async def _query_entry_frame(columns, start_date=None, end_date=None, limit=None, user_id='default_user'):
+    async with async_session() as db:
+        rows = (await db.execute(entry_frame_select(columns, start_date, end_date, limit, user_id))).all()
+    return rows_to_frame(columns, rows, limit)
+
+_frame_load_locks = {}  # user_id -> asyncio.Lock held while loading that user's frame
+
+async def _cached_user_frame(user_id):
+    """Return the user's full history frame, loading it once on a miss"""
+    version = await get_data_version(user_id)
+    frame = cached_entry_frame(user_id, version)
+    if frame is not None:
+        return frame
+
+    # Concurrent requests wait for one load instead of each querying
+    async with _frame_load_locks.setdefault(user_id, asyncio.Lock()):
+        frame = cached_entry_frame(user_id, version)
+        if frame is None:
+            frame = await _query_entry_frame(CACHED_FRAME_COLUMNS, user_id=user_id)
+            store_entry_frame(user_id, version, frame)
+        return frame
+
+async def load_entry_frame(columns=None, start_date=None, end_date=None, limit=None, user_id='default_user'):
+    """Load wellness entries as a pandas DataFrame (async db_storage.load_entry_frame)
+
+    Shares the sync layer's per-user frame cache, keyed on the persisted
+    data version like the sync layer.
+    """
+    columns = frame_columns(columns)
+    if ENTRY_CACHE_MAX_BYTES <= 0:
+        frame = await _query_entry_frame(columns, start_date, end_date, limit, user_id)
+        live_dates = None
+    else:
+        live = await _cached_user_frame(user_id)
+        frame = slice_entry_frame(live, columns, start_date, end_date, limit)
+        live_dates = live['date']
+
+    if reaches_archive(user_id):
+        frame = await asyncio.to_thread(with_archived_frame, frame, columns, user_id, start_date, end_date,
+                                        limit, live_dates)
+    return frame
+
+async def entry_stats(window=7, user_id='default_user'):
+    """Average STATS_COLUMNS over the last `window` entries (async db_storage.entry_stats)"""
+    async with async_session() as db:
+        entries, oldest, *averages, total = (await db.execute(entry_stats_select(window, user_id))).one()
+        if reaches_archive(user_id):
+            dates = await asyncio.to_thread(archived_dates, user_id)
+            total += len(dates - await _shadowed_dates(db, user_id))
+
+    if not reaches_archive(user_id, oldest if entries >= window else None):
+        return stats_result(entries, averages, total)
+
+    columns = frame_columns(STATS_COLUMNS)
+    frame = await _query_entry_frame(columns, limit=window, user_id=user_id)
+    frame = await asyncio.to_thread(with_archived_frame, frame, columns, user_id, None, None, window)
+    return frame_stats(frame, total)
+
+async def get_data_version(user_id='default_user'):
+    """Return the user's data version (async db_storage.get_data_version)"""
+    async with async_session() as db:
+        return await db.scalar(data_version_select(user_id)) or 0
+
+# ==================== Profile ====================
+
+async def get_user_profile(user_id='default_user'):
+    """Get user profile, creating the default one on first use"""
+    async with async_session() as db:
+        profile = await db.scalar(select(UserProfile).where(UserProfile.user_id == user_id))
+
+        if not profile:
+            profile = UserProfile(
+                user_id=user_id,
+                average_cycle_length=28,
+                preferences={}
+            )
+            db.add(profile)
+            await db.commit()
+            await db.refresh(profile)
+
+        return {
+            'user_id': profile.user_id,
+            'average_cycle_length': profile.average_cycle_length,
+            'last_period_start': profile.last_period_start,
+            'preferences': profile.preferences or {}
+        }
+
+async def update_user_profile(profile_data, user_id='default_user'):
+    """Update user profile"""
+    async with async_session() as db:
+        try:
+            profile = await db.scalar(select(UserProfile).where(UserProfile.user_id == user_id))
+
+            if not profile:
+                profile = UserProfile(user_id=user_id)
+                db.add(profile)
+
+            for key, value in profile_data.items():
+                if hasattr(profile, key):
+                    setattr(profile, key, value)
+
+            profile.last_updated = datetime.utcnow()
+            await db.run_sync(bump_data_version, user_id)
+            await db.commit()
+
+            return True
+
+        except Exception as e:
+            await db.rollback()
+            raise e
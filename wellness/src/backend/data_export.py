@@ -3,6 +3,7 @@ import json
 import streamlit as st
 from datetime import datetime
 import io
+from symptoms import count_symptoms_in_masks
 
 def export_to_csv(data):
     """Export wellness data to CSV format"""
@@ -36,50 +37,78 @@ def export_to_json(data):
     
     return json.dumps(export_data, indent=2)
 
-def create_summary_report(data):
-    """Create a text summary report of wellness data"""
+def _overall_totals(df):
+    """Whole-history totals in the shape of rollups.rollup_totals()"""
+    totals = {
+        'entry_count': len(df),
+        'first_date': df['date'].min(),
+        'last_date': df['date'].max(),
+    }
+    for column in ['sleep_hours', 'sleep_quality', 'average_stress', 'exercise_minutes', 'water_intake']:
+        totals[f'{column}_mean'] = df[column].mean()
+    if 'wellness_score' in df.columns:
+        totals['wellness_score_mean'] = df['wellness_score'].mean()
+        totals['wellness_score_max'] = df['wellness_score'].max()
+        totals['wellness_score_min'] = df['wellness_score'].min()
+    if 'on_period' in df.columns:
+        totals['period_days'] = df['on_period'].sum()
+    return totals
+
+def create_summary_report(data, totals=None, symptom_bits=None):
+    """Create a text summary report of wellness data
+    
+    Overall statistics come from `totals` when given (see
+    rollups.rollup_totals()), otherwise they are computed from the entries.
+    With `symptom_bits` ({name: bit}) and a symptom_mask column, symptoms
+    are counted from the masks instead of the symptoms dicts.
+    """
     if not data or 'entries' not in data or len(data['entries']) == 0:
         return "No data available for summary report."
     
     df = pd.DataFrame(data['entries'])
+    if totals is None:
+        totals = _overall_totals(df)
     
     report = []
     report.append("=" * 60)
     report.append("WOMEN'S WELLNESS TRACKER - DATA SUMMARY")
     report.append("=" * 60)
     report.append(f"\nExport Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    report.append(f"Total Entries: {len(df)}")
-    report.append(f"Date Range: {df['date'].min()} to {df['date'].max()}")
+    report.append(f"Total Entries: {totals['entry_count']}")
+    report.append(f"Date Range: {totals['first_date']} to {totals['last_date']}")
     
     # Overall statistics
     report.append("\n" + "-" * 60)
     report.append("OVERALL STATISTICS")
     report.append("-" * 60)
     
-    if 'wellness_score' in df.columns:
-        report.append(f"Average Wellness Score: {df['wellness_score'].mean():.1f}/100")
-        report.append(f"Highest Wellness Score: {df['wellness_score'].max():.1f}")
-        report.append(f"Lowest Wellness Score: {df['wellness_score'].min():.1f}")
+    if 'wellness_score_mean' in totals:
+        report.append(f"Average Wellness Score: {totals['wellness_score_mean']:.1f}/100")
+        report.append(f"Highest Wellness Score: {totals['wellness_score_max']:.1f}")
+        report.append(f"Lowest Wellness Score: {totals['wellness_score_min']:.1f}")
     
-    report.append(f"\nAverage Sleep Duration: {df['sleep_hours'].mean():.1f} hours")
-    report.append(f"Average Sleep Quality: {df['sleep_quality'].mean():.1f}/10")
-    report.append(f"Average Stress Level: {df['average_stress'].mean():.1f}/10")
-    report.append(f"Average Exercise: {df['exercise_minutes'].mean():.0f} minutes/day")
-    report.append(f"Average Water Intake: {df['water_intake'].mean():.0f} ml/day")
+    report.append(f"\nAverage Sleep Duration: {totals['sleep_hours_mean']:.1f} hours")
+    report.append(f"Average Sleep Quality: {totals['sleep_quality_mean']:.1f}/10")
+    report.append(f"Average Stress Level: {totals['average_stress_mean']:.1f}/10")
+    report.append(f"Average Exercise: {totals['exercise_minutes_mean']:.0f} minutes/day")
+    report.append(f"Average Water Intake: {totals['water_intake_mean']:.0f} ml/day")
     
     # Menstrual cycle statistics
-    if 'on_period' in df.columns:
-        period_days = df['on_period'].sum()
+    if 'period_days' in totals:
+        period_days = totals['period_days']
         report.append(f"\nTotal Period Days Tracked: {period_days}")
         
         # Count most common symptoms
-        all_symptoms = {}
-        for _, entry in df.iterrows():
-            symptoms = entry.get('symptoms', {})
-            if isinstance(symptoms, dict):
-                for symptom, value in symptoms.items():
-                    if value:
-                        all_symptoms[symptom] = all_symptoms.get(symptom, 0) + 1
+        if symptom_bits is not None and 'symptom_mask' in df.columns:
+            all_symptoms = count_symptoms_in_masks(df['symptom_mask'], symptom_bits, df.get('symptoms'))
+        else:
+            all_symptoms = {}
+            for _, entry in df.iterrows():
+                symptoms = entry.get('symptoms', {})
+                if isinstance(symptoms, dict):
+                    for symptom, value in symptoms.items():
+                        if value:
+                            all_symptoms[symptom] = all_symptoms.get(symptom, 0) + 1
         
         if all_symptoms:
             report.append("\nMost Common Period Symptoms:")
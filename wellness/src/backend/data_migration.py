@@ -1,11 +1,227 @@
+import argparse
+import codecs
+import heapq
 import json
 import os
+import time
 from datetime import datetime
 from database import init_db, get_db, close_db, WellnessEntry, UserProfile
-from sqlalchemy import text
+from sqlalchemy import insert, select, text
+from archive import archived_dates
+from db_storage import to_date, bump_data_version, invalidate_entry_cache, archived_entries
+from rollups import refresh_rollups
+from symptoms import apply_symptom_masks
 
-def migrate_json_to_db(json_file='wellness_data.json'):
-    """Migrate data from JSON file to PostgreSQL database"""
+# Entries inserted per transaction, and checkpointed after each commit
+MIGRATION_CHUNK_SIZE = 5000
+
+# Bytes read from the JSON file at a time
+READ_SIZE = 1 << 20
+
+class _JSONReader:
+    """Incremental reader over a UTF-8 JSON file that tracks byte offsets"""
+    
+    def __init__(self, f, offset):
+        self.f = f
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.mark = 0           # buffer position whose byte offset is known
+        self.mark_offset = offset
+        self.eof = False
+    
+    def fill(self):
+        """Read more of the file; False once it is exhausted"""
+        if self.eof:
+            return False
+        data = self.f.read(READ_SIZE)
+        self.eof = not data
+        # Drop the text before the mark, which is never looked at again
+        self.buffer = self.buffer[self.mark:] + self.decoder.decode(data, final=self.eof)
+        self.pos -= self.mark
+        self.mark = 0
+        return not self.eof
+    
+    def peek(self):
+        """Return the next non-whitespace character (None at end of file)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return None
+    
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' at byte {self.offset()}, found {found!r}")
+        self.pos += 1
+    
+    def value(self):
+        """Decode the next JSON value, reading more of the file as needed"""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next read
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+    
+    def offset(self):
+        """Byte offset of the current position"""
+        self.mark_offset += len(self.buffer[self.mark:self.pos].encode('utf-8'))
+        self.mark = self.pos
+        return self.mark_offset
+
+_DECODER = json.JSONDecoder()
+
+def iter_json_entries(json_file, offset=0):
+    """Yield (entry, offset) for each object in the file's "entries" array
+    
+    Parses the file incrementally, so memory use does not grow with its
+    size. offset is the byte position just past the entry (and its comma);
+    pass it back to resume with the following entry. A file that is a bare
+    array of entries is also accepted.
+    """
+    with open(json_file, 'rb') as f:
+        f.seek(offset)
+        reader = _JSONReader(f, offset)
+        
+        if not offset:
+            if reader.peek() == '{':
+                reader.expect('{')
+                while True:
+                    if reader.peek() == '}':
+                        return
+                    key = reader.value()
+                    reader.expect(':')
+                    if key == 'entries':
+                        break
+                    reader.value()
+                    if reader.peek() == ',':
+                        reader.expect(',')
+            reader.expect('[')
+        
+        while reader.peek() != ']':
+            if reader.peek() is None:
+                raise ValueError(f"Unexpected end of {json_file} inside the entries array")
+            entry = reader.value()
+            if reader.peek() == ',':
+                reader.expect(',')
+            yield entry, reader.offset()
+
+def _legacy_entry_row(entry, user_id):
+    """Map a legacy JSON entry to wellness_entries column values"""
+    return {
+        'user_id': user_id,
+        'date': to_date(entry['date']),
+        'timestamp': datetime.fromisoformat(entry['timestamp']) if 'timestamp' in entry else datetime.utcnow(),
+        'breakfast': entry.get('breakfast', ''),
+        'lunch': entry.get('lunch', ''),
+        'dinner': entry.get('dinner', ''),
+        'snacks': entry.get('snacks', ''),
+        'morning_meal': entry.get('morning_meal', ''),
+        'afternoon_meal': entry.get('afternoon_meal', ''),
+        'night_meal': entry.get('night_meal', ''),
+        'stress_morning': entry.get('morning_stress', entry.get('stress_morning', 0)),
+        'stress_afternoon': entry.get('afternoon_stress', entry.get('stress_afternoon', 0)),
+        'stress_night': entry.get('night_stress', entry.get('stress_night', 0)),
+        'average_stress': entry.get('average_stress', 0),
+        'exercise_minutes': entry.get('exercise_minutes', 0),
+        'water_intake': entry.get('water_intake', 0),
+        'sleep_hours': entry.get('sleep_hours', 0),
+        'sleep_quality': entry.get('sleep_quality', 7),
+        'on_period': entry.get('on_period', False),
+        'period_day': entry.get('period_day', 0),
+        'cycle_phase': entry.get('cycle_phase', ''),
+        'symptoms': entry.get('symptoms', {}),
+        'notes': entry.get('notes', ''),
+        'additional_notes': entry.get('additional_notes', ''),
+        'wellness_score': entry.get('wellness_score', 0),
+        'sentiment_score': entry.get('sentiment_score', 0),
+        'predicted_energy': entry.get('predicted_energy', 0)
+    }
+
+def _insert_new_entries(rows, user_id):
+    """Insert the rows whose dates are not stored yet; returns the number inserted
+    
+    Existing dates (live or archived) are found with one IN query per
+    chunk, and the rest go in one multi-row INSERT in a single transaction.
+    Within the chunk the first entry for a date wins.
+    """
+    new_rows = {}
+    for row in rows:
+        new_rows.setdefault(row['date'], row)
+    
+    # New symptoms are registered on their own connection, before the chunk's transaction
+    apply_symptom_masks(list(new_rows.values()))
+    db = get_db(user_id)
+    
+    try:
+        existing = set(db.scalars(
+            select(WellnessEntry.date).where(
+                WellnessEntry.user_id == user_id,
+                WellnessEntry.date.in_(list(new_rows))
+            )
+        ))
+        existing |= archived_dates(user_id) & new_rows.keys()
+        for date in existing:
+            del new_rows[date]
+        
+        if new_rows:
+            db.execute(insert(WellnessEntry), list(new_rows.values()))
+            refresh_rollups(db, user_id, new_rows)
+            bump_data_version(db, user_id)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        close_db(db)
+    
+    if new_rows:
+        invalidate_entry_cache(user_id)
+    return len(new_rows)
+
+def _file_identity(json_file):
+    stat = os.stat(json_file)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def _load_checkpoint(checkpoint_file, json_file):
+    """Return the saved progress for json_file, or None to start from the beginning"""
+    if not os.path.exists(checkpoint_file):
+        return None
+    with open(checkpoint_file, 'r') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('file') != _file_identity(json_file):
+        print(f"{json_file} changed since {checkpoint_file} was written. Starting over...")
+        return None
+    return checkpoint
+
+def _save_checkpoint(checkpoint_file, checkpoint):
+    temp_file = f'{checkpoint_file}.tmp'
+    with open(temp_file, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_file, checkpoint_file)
+
+def migrate_json_to_db(json_file='wellness_data.json', chunk_size=MIGRATION_CHUNK_SIZE, restart=False,
+                       user_id='default_user'):
+    """Migrate data from a JSON export to the database
+    
+    Streams the file and commits every chunk_size entries, recording the
+    file position in <json_file>.checkpoint after each commit. A rerun
+    resumes after the last committed chunk (restart=True ignores it).
+    Entries for dates already in the database are skipped. Returns
+    {'read': entries read, 'migrated': entries inserted}, or None when
+    json_file does not exist.
+    """
     
     print("Initializing database...")
     init_db()
@@ -14,67 +230,57 @@ def migrate_json_to_db(json_file='wellness_data.json'):
         print(f"No {json_file} found. Starting with empty database.")
         return
     
-    print(f"Loading data from {json_file}...")
-    with open(json_file, 'r') as f:
-        data = json.load(f)
+    checkpoint_file = f'{json_file}.checkpoint'
+    checkpoint = None if restart else _load_checkpoint(checkpoint_file, json_file)
+    if checkpoint:
+        print(f"Resuming after {checkpoint['read']} entries (byte {checkpoint['offset']})...")
+    else:
+        checkpoint = {'file': _file_identity(json_file), 'offset': 0, 'read': 0, 'migrated': 0}
     
-    db = get_db()
+    print(f"Streaming entries from {json_file}...")
+    started = time.perf_counter()
+    read_now = 0
+    chunk = []
+    offset = checkpoint['offset']
     
-    try:
-        entries = data.get('entries', [])
-        print(f"Found {len(entries)} entries to migrate...")
-        
-        migrated = 0
-        for entry in entries:
-            existing = db.query(WellnessEntry).filter(
-                WellnessEntry.date == entry['date'],
-                WellnessEntry.user_id == 'default_user'
-            ).first()
-            
-            if existing:
-                print(f"Entry for {entry['date']} already exists. Skipping...")
-                continue
-            
-            db_entry = WellnessEntry(
-                user_id='default_user',
-                date=entry['date'],
-                timestamp=datetime.fromisoformat(entry['timestamp']) if 'timestamp' in entry else datetime.utcnow(),
-                breakfast=entry.get('breakfast', ''),
-                lunch=entry.get('lunch', ''),
-                dinner=entry.get('dinner', ''),
-                snacks=entry.get('snacks', ''),
-                morning_meal=entry.get('morning_meal', ''),
-                afternoon_meal=entry.get('afternoon_meal', ''),
-                night_meal=entry.get('night_meal', ''),
-                stress_morning=entry.get('morning_stress', entry.get('stress_morning', 0)),
-                stress_afternoon=entry.get('afternoon_stress', entry.get('stress_afternoon', 0)),
-                stress_night=entry.get('night_stress', entry.get('stress_night', 0)),
-                average_stress=entry.get('average_stress', 0),
-                exercise_minutes=entry.get('exercise_minutes', 0),
-                water_intake=entry.get('water_intake', 0),
-                sleep_hours=entry.get('sleep_hours', 0),
-                sleep_quality=entry.get('sleep_quality', 7),
-                on_period=entry.get('on_period', False),
-                period_day=entry.get('period_day', 0),
-                cycle_phase=entry.get('cycle_phase', ''),
-                symptoms=entry.get('symptoms', {}),
-                notes=entry.get('notes', ''),
-                additional_notes=entry.get('additional_notes', ''),
-                wellness_score=entry.get('wellness_score', 0),
-                sentiment_score=entry.get('sentiment_score', 0),
-                predicted_energy=entry.get('predicted_energy', 0)
-            )
-            
-            db.add(db_entry)
-            migrated += 1
-        
-        db.commit()
-        print(f"Successfully migrated {migrated} entries to database!")
+    def commit_chunk():
+        nonlocal read_now
+        checkpoint['migrated'] += _insert_new_entries(chunk, user_id)
+        checkpoint['read'] += len(chunk)
+        checkpoint['offset'] = offset
+        _save_checkpoint(checkpoint_file, checkpoint)
         
-        user_profile = db.query(UserProfile).filter(UserProfile.user_id == 'default_user').first()
+        read_now += len(chunk)
+        rate = read_now / max(time.perf_counter() - started, 1e-9)
+        print(f"  {checkpoint['read']} entries read, {checkpoint['migrated']} migrated ({rate:,.0f} rows/s)")
+        chunk.clear()
+    
+    try:
+        for entry, offset in iter_json_entries(json_file, checkpoint['offset']):
+            chunk.append(_legacy_entry_row(entry, user_id))
+            if len(chunk) >= chunk_size:
+                commit_chunk()
+        if chunk:
+            commit_chunk()
+    except Exception as e:
+        print(f"Error during migration: {e}")
+        print(f"Progress is saved in {checkpoint_file}; rerun to resume.")
+        raise
+    
+    print(f"Successfully migrated {checkpoint['migrated']} entries to database!")
+    skipped = checkpoint['read'] - checkpoint['migrated']
+    if skipped:
+        print(f"Skipped {skipped} entries whose dates already exist.")
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    
+    db = get_db(user_id)
+    
+    try:
+        user_profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
         if not user_profile:
             user_profile = UserProfile(
-                user_id='default_user',
+                user_id=user_id,
                 average_cycle_length=28,
                 preferences={}
             )
@@ -90,52 +296,76 @@ def migrate_json_to_db(json_file='wellness_data.json'):
         close_db(db)
     
     print("Migration complete!")
+    return {'read': checkpoint['read'], 'migrated': checkpoint['migrated']}
+
+def _export_entry(entry):
+    return {
+        'date': entry.date.isoformat(),
+        'timestamp': entry.timestamp.isoformat() if entry.timestamp else entry.date.isoformat(),
+        'breakfast': entry.breakfast,
+        'lunch': entry.lunch,
+        'dinner': entry.dinner,
+        'snacks': entry.snacks,
+        'stress_morning': entry.stress_morning,
+        'stress_afternoon': entry.stress_afternoon,
+        'stress_night': entry.stress_night,
+        'average_stress': entry.average_stress,
+        'exercise_minutes': entry.exercise_minutes,
+        'water_intake': entry.water_intake,
+        'sleep_hours': entry.sleep_hours,
+        'sleep_quality': entry.sleep_quality,
+        'on_period': entry.on_period,
+        'period_day': entry.period_day,
+        'cycle_phase': entry.cycle_phase,
+        'symptoms': entry.symptoms,
+        'notes': entry.notes,
+        'wellness_score': entry.wellness_score,
+        'sentiment_score': entry.sentiment_score,
+        'predicted_energy': entry.predicted_energy
+    }
 
-def export_db_to_json(json_file='wellness_data_backup.json'):
-    """Export database to JSON file (backup)"""
+def export_db_to_json(json_file='wellness_data_backup.json', user_id='default_user'):
+    """Export a user's entries to a JSON file (backup)
     
-    db = get_db()
+    Entries are streamed from the database and written one per line, so
+    memory use does not grow with the user's history. The file has the
+    {"entries": [...]} layout migrate_json_to_db() reads, and replaces
+    json_file only once complete. Returns the number of entries exported.
+    """
+    
+    db = get_db(user_id)
+    exported = 0
     
     try:
-        entries = db.query(WellnessEntry).filter(WellnessEntry.user_id == 'default_user').order_by(WellnessEntry.date).all()
-        
-        data = {
-            'entries': [
-                {
-                    'date': entry.date,
-                    'timestamp': entry.timestamp.isoformat(),
-                    'breakfast': entry.breakfast,
-                    'lunch': entry.lunch,
-                    'dinner': entry.dinner,
-                    'snacks': entry.snacks,
-                    'stress_morning': entry.stress_morning,
-                    'stress_afternoon': entry.stress_afternoon,
-                    'stress_night': entry.stress_night,
-                    'average_stress': entry.average_stress,
-                    'exercise_minutes': entry.exercise_minutes,
-                    'water_intake': entry.water_intake,
-                    'sleep_hours': entry.sleep_hours,
-                    'sleep_quality': entry.sleep_quality,
-                    'on_period': entry.on_period,
-                    'period_day': entry.period_day,
-                    'cycle_phase': entry.cycle_phase,
-                    'symptoms': entry.symptoms,
-                    'notes': entry.notes,
-                    'wellness_score': entry.wellness_score,
-                    'sentiment_score': entry.sentiment_score,
-                    'predicted_energy': entry.predicted_energy
-                }
-                for entry in entries
-            ]
-        }
+        archived = archived_entries(db, user_id)
+        live = db.scalars(
+            select(WellnessEntry).where(WellnessEntry.user_id == user_id)
+            .order_by(WellnessEntry.date).execution_options(yield_per=1000)
+        )
         
-        with open(json_file, 'w') as f:
-            json.dump(data, f, indent=2)
+        temp_file = f'{json_file}.tmp'
+        with open(temp_file, 'w') as f:
+            f.write('{"entries": [\n')
+            for entry in heapq.merge(live, archived, key=lambda entry: entry.date):
+                if exported:
+                    f.write(',\n')
+                f.write(json.dumps(_export_entry(entry)))
+                exported += 1
+            f.write('\n]}\n')
+        os.replace(temp_file, json_file)
         
-        print(f"Exported {len(entries)} entries to {json_file}")
+        print(f"Exported {exported} entries to {json_file}")
+        return exported
         
     finally:
         close_db(db)
 
 if __name__ == "__main__":
-    migrate_json_to_db()
+    parser = argparse.ArgumentParser(description="Migrate a JSON export into the database")
+    parser.add_argument('json_file', nargs='?', default='wellness_data.json')
+    parser.add_argument('--chunk-size', type=int, default=MIGRATION_CHUNK_SIZE,
+                        help="Entries per transaction and checkpoint (default: %(default)s)")
+    parser.add_argument('--restart', action='store_true', help="Ignore a saved checkpoint and start over")
+    args = parser.parse_args()
+    
+    migrate_json_to_db(args.json_file, args.chunk_size, args.restart)
@@ -1,27 +1,140 @@
+import hashlib
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, JSON, Text
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from sqlalchemy import (create_engine, event, Column, Integer, BigInteger, String, Float, Boolean, Date, DateTime,
+                        JSON, Text, Index)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 
+# Get the project root directory (2 levels up from this file)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 # Use SQLite for local development, PostgreSQL if DATABASE_URL is provided
 DATABASE_URL = os.getenv('DATABASE_URL')
 if not DATABASE_URL:
-    # Get the project root directory (2 levels up from this file)
-    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     db_path = os.path.join(project_root, 'wellness.db')
     DATABASE_URL = f'sqlite:///{db_path}'
 
-engine = create_engine(DATABASE_URL, echo=False)
+def _env_flag(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+# SQLite performance profile, chosen with WELLNESS_SQLITE_PROFILE:
+#   tuned   - WAL journal (readers no longer block behind the writer),
+#             synchronous=NORMAL (fsync at checkpoints rather than every
+#             commit; durable against application crashes, a power loss may
+#             drop the last commits), memory-mapped I/O, a larger page cache
+#             and a busy timeout instead of immediate "database is locked"
+#   default - SQLite's own settings (rollback journal, full fsync per commit)
+# Sizes are overridable with SQLITE_MMAP_SIZE (bytes), SQLITE_CACHE_SIZE
+# (KiB), SQLITE_BUSY_TIMEOUT (ms) and SQLITE_STATEMENT_CACHE (statements).
+SQLITE_PROFILE = os.getenv('WELLNESS_SQLITE_PROFILE', 'tuned').strip().lower()
+
+def sqlite_pragmas(profile=None):
+    """Return the (pragma, value) pairs applied to each new SQLite connection"""
+    profile = profile or SQLITE_PROFILE
+    if profile == 'default':
+        return []
+    if profile != 'tuned':
+        raise ValueError(f"Unknown WELLNESS_SQLITE_PROFILE '{profile}' (expected 'tuned' or 'default')")
+    
+    return [
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))),
+        ('mmap_size', int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))),
+        # Negative values are KiB rather than pages
+        ('cache_size', -int(os.getenv('SQLITE_CACHE_SIZE', 64 * 1024))),
+        ('temp_store', 'MEMORY'),
+    ]
+
+def configure_sqlite_engine(sqlite_engine, profile=None):
+    """Apply a SQLite profile's pragmas to every connection the engine opens"""
+    pragmas = sqlite_pragmas(profile)
+    if not pragmas:
+        return
+    
+    @event.listens_for(sqlite_engine, 'connect')
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, value in pragmas:
+                cursor.execute(f"PRAGMA {pragma}={value}")
+        finally:
+            cursor.close()
+
+def engine_options(database_url):
+    """Build create_engine() keyword arguments from the DB_POOL_* environment variables
+
+    DB_POOL_SIZE        connections kept open per process (default 5)
+    DB_MAX_OVERFLOW     extra connections allowed under burst load (default 10)
+    DB_POOL_TIMEOUT     seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE     seconds before a connection is replaced (default 1800)
+    DB_POOL_PRE_PING    test connections before use (default true)
+
+    Sizing options only apply to server databases; SQLite keeps SQLAlchemy's
+    default file-based pool.
+    """
+    options = {
+        'echo': False,
+        'pool_pre_ping': _env_flag('DB_POOL_PRE_PING', True),
+    }
+    if database_url.startswith('sqlite'):
+        if SQLITE_PROFILE != 'default':
+            # sqlite3 keeps this many prepared statements per connection
+            options['connect_args'] = {
+                'cached_statements': int(os.getenv('SQLITE_STATEMENT_CACHE', 256)),
+            }
+    else:
+        options.update(
+            pool_size=int(os.getenv('DB_POOL_SIZE', 5)),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 10)),
+            pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', 30)),
+            pool_recycle=int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        )
+    return options
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+if engine.dialect.name == 'sqlite':
+    configure_sqlite_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Sessions shared by every get_db() call within one web request, one per
+# database the request touches (None outside a request)
+_request_sessions = ContextVar('request_sessions', default=None)
 Base = declarative_base()
 
+# Storage backend, chosen with WELLNESS_STORAGE:
+#   single  - every user lives in DATABASE_URL (default)
+#   sharded - each user_id hashes to one of SHARD_COUNT SQLite files in
+#             SHARD_DIR, so writes for different users do not wait on one
+#             database lock. DATABASE_URL still holds the shared tables
+#             (symptom dictionary, schema migration state).
+# Use shard_tool.py to move data into shards or change SHARD_COUNT.
+STORAGE_BACKEND = os.getenv('WELLNESS_STORAGE', 'single').strip().lower()
+SHARD_DIR = os.getenv('SHARD_DIR', os.path.join(project_root, 'shards'))
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', 16))
+# Shard engines kept open at once; the least recently used is disposed
+SHARD_ENGINE_CACHE = int(os.getenv('SHARD_ENGINE_CACHE', 32))
+
+if STORAGE_BACKEND not in ('single', 'sharded'):
+    raise ValueError(f"Unknown WELLNESS_STORAGE '{STORAGE_BACKEND}' (expected 'single' or 'sharded')")
+
+_shard_engines = OrderedDict()  # shard index -> engine, least recently used first
+_shard_lock = threading.Lock()
+
 class WellnessEntry(Base):
     __tablename__ = 'wellness_entries'
+    __table_args__ = (
+        # One entry per user per day; also the conflict target for upserts
+        Index('ux_wellness_entries_user_date', 'user_id', 'date', unique=True),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(String, default='default_user')
-    date = Column(String, nullable=False)
+    date = Column(Date, nullable=False)  # Existing databases: run schema_migration.py
     timestamp = Column(DateTime, default=datetime.utcnow)
     
     breakfast = Column(String)
@@ -50,6 +163,7 @@ class WellnessEntry(Base):
     cycle_phase = Column(String)
     
     symptoms = Column(JSON)
+    symptom_mask = Column(BigInteger, default=0)  # Bits from the symptoms table, set on write
     
     notes = Column(Text)
     
@@ -57,6 +171,64 @@ class WellnessEntry(Base):
     sentiment_score = Column(Float)
     predicted_energy = Column(Float)
 
+class Symptom(Base):
+    """Symptom dictionary: each symptom name owns one bit of symptom_mask"""
+    __tablename__ = 'symptoms'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, unique=True, nullable=False)
+    bit = Column(Integer, unique=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class WellnessRollup(Base):
+    """Per-user weekly/monthly running totals, kept current by db_storage writes
+    
+    Each metric has a non-null count, a sum and a sum of squares, so means
+    and standard deviations come from one row per period (see rollups.py).
+    """
+    __tablename__ = 'wellness_rollups'
+    __table_args__ = (
+        Index('ux_wellness_rollups_user_period', 'user_id', 'period_type', 'period_start', unique=True),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, nullable=False)
+    period_type = Column(String, nullable=False)  # 'week' (starts Monday) or 'month'
+    period_start = Column(Date, nullable=False)
+    
+    entry_count = Column(Integer, default=0)
+    first_date = Column(Date)
+    last_date = Column(Date)
+    period_days = Column(Integer, default=0)  # entries with on_period set
+    
+    average_stress_count = Column(Integer, default=0)
+    average_stress_sum = Column(Float, default=0)
+    average_stress_sumsq = Column(Float, default=0)
+    
+    sleep_hours_count = Column(Integer, default=0)
+    sleep_hours_sum = Column(Float, default=0)
+    sleep_hours_sumsq = Column(Float, default=0)
+    
+    sleep_quality_count = Column(Integer, default=0)
+    sleep_quality_sum = Column(Float, default=0)
+    sleep_quality_sumsq = Column(Float, default=0)
+    
+    exercise_minutes_count = Column(Integer, default=0)
+    exercise_minutes_sum = Column(Float, default=0)
+    exercise_minutes_sumsq = Column(Float, default=0)
+    
+    water_intake_count = Column(Integer, default=0)
+    water_intake_sum = Column(Float, default=0)
+    water_intake_sumsq = Column(Float, default=0)
+    
+    wellness_score_count = Column(Integer, default=0)
+    wellness_score_sum = Column(Float, default=0)
+    wellness_score_sumsq = Column(Float, default=0)
+    wellness_score_min = Column(Float)
+    wellness_score_max = Column(Float)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class UserProfile(Base):
     __tablename__ = 'user_profiles'
     
@@ -70,18 +242,134 @@ class UserProfile(Base):
     
     preferences = Column(JSON)
 
+class UserDataVersion(Base):
+    """Per-user data version, bumped in the same transaction as every write
+    
+    The API derives ETags from it, so a conditional GET is answered with
+    one primary key lookup (see db_storage.get_data_version).
+    """
+    __tablename__ = 'user_data_versions'
+    
+    user_id = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+# Per-user tables, stored in each shard when sharding is enabled
+SHARD_TABLES = ['wellness_entries', 'wellness_rollups', 'user_profiles', 'user_data_versions']
+
+def _create_tables(bind, table_names=None):
+    tables = [Base.metadata.tables[name] for name in table_names] if table_names else None
+    Base.metadata.create_all(bind=bind, tables=tables)
+    
+    # create_all() skips indexes on tables that already exist, so make sure
+    # databases created before the unique (user_id, date) index get it too
+    for index in WellnessEntry.__table__.indexes:
+        try:
+            index.create(bind=bind, checkfirst=True)
+        except Exception as e:
+            print(f"Warning: Could not create index {index.name}: {e}")
+
 def init_db():
     """Initialize database tables"""
-    Base.metadata.create_all(bind=engine)
+    _create_tables(engine)
 
-def get_db():
-    """Get database session"""
-    db = SessionLocal()
-    try:
-        return db
-    finally:
-        pass
+def shard_for_user(user_id, shard_count=None):
+    """Return the shard index for user_id (a stable hash, same in every process)"""
+    digest = hashlib.blake2b(str(user_id).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % (shard_count or SHARD_COUNT)
+
+def shard_path(index, shard_count=None, shard_dir=None):
+    """Return the SQLite file for a shard; the name includes the shard count"""
+    shard_count = shard_count or SHARD_COUNT
+    return os.path.join(shard_dir or SHARD_DIR, f'wellness_{shard_count}_{index:04d}.db')
+
+def create_shard_engine(path):
+    """Create an engine for a shard file, creating the file and tables if needed"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    url = f'sqlite:///{path}'
+    shard = create_engine(url, **engine_options(url))
+    configure_sqlite_engine(shard)
+    _create_tables(shard, SHARD_TABLES)
+    return shard
+
+def shard_engine(index):
+    """Return the engine for a shard, opening it lazily (LRU of open engines)"""
+    with _shard_lock:
+        shard = _shard_engines.get(index)
+        if shard is not None:
+            _shard_engines.move_to_end(index)
+            return shard
+        
+        shard = create_shard_engine(shard_path(index))
+        _shard_engines[index] = shard
+        while len(_shard_engines) > SHARD_ENGINE_CACHE:
+            # Sessions still using an evicted engine keep working; its
+            # connections close as they are returned
+            _, evicted = _shard_engines.popitem(last=False)
+            evicted.dispose()
+        return shard
+
+def get_engine(user_id=None):
+    """Return the engine holding user_id's data (the main engine when unsharded)"""
+    if STORAGE_BACKEND == 'sharded' and user_id is not None:
+        return shard_engine(shard_for_user(user_id))
+    return engine
+
+def user_engines():
+    """Return every engine that holds per-user tables (existing shards when sharded)"""
+    if STORAGE_BACKEND != 'sharded':
+        return [engine]
+    return [shard_engine(index) for index in range(SHARD_COUNT) if os.path.exists(shard_path(index))]
+
+def reset_engines_in_child():
+    """Drop pooled connections inherited from a parent process
+    
+    Call first thing in a worker process (e.g. a ProcessPoolExecutor
+    initializer) so the worker opens its own connections instead of sharing
+    the parent's sockets and file handles.
+    """
+    engine.dispose(close=False)
+    with _shard_lock:
+        for shard in _shard_engines.values():
+            shard.dispose(close=False)
+
+def get_db(user_id=None):
+    """Get database session for user_id's database
+    
+    Inside a web request the same session is returned for every call that
+    targets the same database.
+    """
+    bind = get_engine(user_id)
+    sessions = _request_sessions.get()
+    if sessions is None:
+        return SessionLocal(bind=bind)
+    
+    db = sessions.get(bind)
+    if db is None:
+        db = sessions[bind] = SessionLocal(bind=bind)
+    return db
 
 def close_db(db):
-    """Close database session"""
-    db.close()
+    """Close database session (request sessions stay open until the request ends)"""
+    sessions = _request_sessions.get()
+    if sessions is None or all(db is not session for session in sessions.values()):
+        db.close()
+
+def begin_request_session():
+    """Share sessions between get_db() calls until end_request_session()"""
+    _request_sessions.set({})
+
+def end_request_session(exception=None):
+    """Close the current request's sessions, rolling back if the request failed"""
+    sessions = _request_sessions.get()
+    if sessions is None:
+        return
+    
+    try:
+        for db in sessions.values():
+            try:
+                if exception is not None:
+                    db.rollback()
+            finally:
+                db.close()
+    finally:
+        _request_sessions.set(None)
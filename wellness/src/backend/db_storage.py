@@ -1,73 +1,177 @@
-from database import get_db, close_db, WellnessEntry, UserProfile
-from datetime import datetime
-from sqlalchemy import desc
+from database import get_db, close_db, WellnessEntry, UserProfile, UserDataVersion
+from archive import (ARCHIVE_COLUMNS, add_tombstone, remove_tombstone, archived_dates, archived_through, reaches_archive,
+                     read_archived, shadowed_dates)
+from rollups import refresh_rollups
+from symptoms import apply_symptom_masks
+from collections import OrderedDict
+from datetime import date as date_type, datetime, timedelta
+import os
+import threading
+import numpy as np
+import pandas as pd
+from sqlalchemy import desc, func, select, BigInteger, Boolean, Date, DateTime, Float, Integer, JSON
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# Column metadata never changes at runtime, so resolve it once at import
+# instead of inspecting the mapper on every save
+ENTRY_COLUMNS = frozenset(column.key for column in WellnessEntry.__table__.columns)
+
+# Fields that identify a row; an upsert never overwrites them
+_ENTRY_KEY_FIELDS = frozenset({'id', 'user_id', 'date'})
+
+# Fields computed on write, never taken from entry data
+_DERIVED_FIELDS = frozenset({'id', 'symptom_mask'})
+
+# Dialects with native INSERT ... ON CONFLICT support
+_UPSERT_INSERTS = {
+    'sqlite': sqlite_insert,
+    'postgresql': postgresql_insert,
+}
+
+def to_date(value):
+    """Coerce a date, datetime or 'YYYY-MM-DD' string to a date (None passes through)"""
+    if value is None or type(value) is date_type:
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return date_type.fromisoformat(str(value).strip()[:10])
+
+def prepare_entry_row(entry_data, user_id):
+    """Reduce entry data to table columns ready to be written"""
+    row = {
+        key: value for key, value in entry_data.items()
+        if key in ENTRY_COLUMNS and key not in _DERIVED_FIELDS
+    }
+    
+    # Convert timestamp string to datetime object if present
+    if isinstance(row.get('timestamp'), str):
+        try:
+            row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+        except (ValueError, TypeError):
+            # If parsing fails, use current time
+            row['timestamp'] = datetime.utcnow()
+    
+    if 'date' in row:
+        row['date'] = to_date(row['date'])
+    row['user_id'] = user_id
+    return row
+
+def build_entry_upsert(dialect_name, rows):
+    """Build a dialect specific INSERT ... ON CONFLICT DO UPDATE statement
+    
+    Returns None when the dialect has no native upsert.
+    """
+    insert = _UPSERT_INSERTS.get(dialect_name)
+    if insert is None:
+        return None
+    
+    stmt = insert(WellnessEntry).values(rows)
+    update_columns = {
+        key: stmt.excluded[key] for key in rows[0] if key not in _ENTRY_KEY_FIELDS
+    }
+    if not update_columns:
+        # Still touch the row so RETURNING yields it on conflict
+        update_columns = {'date': stmt.excluded.date}
+    
+    return stmt.on_conflict_do_update(
+        index_elements=[WellnessEntry.user_id, WellnessEntry.date],
+        set_=update_columns
+    )
+
+def upsert_entry_fallback(db, row):
+    """Select-then-write upsert for dialects without ON CONFLICT support"""
+    existing = db.query(WellnessEntry).filter(
+        WellnessEntry.date == row['date'],
+        WellnessEntry.user_id == row['user_id']
+    ).with_for_update().first()
+    
+    if existing is None:
+        existing = WellnessEntry(**row)
+        db.add(existing)
+    else:
+        for key, value in row.items():
+            if key not in _ENTRY_KEY_FIELDS:
+                setattr(existing, key, value)
+    
+    db.flush()
+    return existing
+
+# ==================== Data Versions ====================
+
+def _build_version_bump(dialect_name, user_id):
+    """Build an INSERT ... ON CONFLICT statement adding 1 to the user's data version
+    
+    Returns None when the dialect has no native upsert.
+    """
+    insert = _UPSERT_INSERTS.get(dialect_name)
+    if insert is None:
+        return None
+    
+    return insert(UserDataVersion).values(user_id=user_id, version=1).on_conflict_do_update(
+        index_elements=[UserDataVersion.user_id],
+        set_={'version': UserDataVersion.version + 1}
+    )
+
+def bump_data_version(db, user_id):
+    """Advance the user's data version inside the caller's write transaction"""
+    stmt = _build_version_bump(db.get_bind().dialect.name, user_id)
+    if stmt is not None:
+        db.execute(stmt)
+        return
+    
+    row = db.query(UserDataVersion).filter(UserDataVersion.user_id == user_id).with_for_update().first()
+    if row is None:
+        db.add(UserDataVersion(user_id=user_id, version=1))
+    else:
+        row.version += 1
+    db.flush()
+
+def data_version_select(user_id):
+    return select(UserDataVersion.version).where(UserDataVersion.user_id == user_id)
+
+def get_data_version(user_id='default_user'):
+    """Return the user's data version: it increases with every write (0 before the first)"""
+    db = get_db(user_id)
+    
+    try:
+        return db.scalar(data_version_select(user_id)) or 0
+    finally:
+        close_db(db)
 
 def save_wellness_entry(entry_data, user_id='default_user'):
-    """Save a wellness entry to the database"""
-    db = get_db()
+    """Save a wellness entry to the database
+    
+    Inserts or updates the (user_id, date) row with a single atomic upsert
+    statement, so concurrent saves for the same day cannot create duplicates.
+    The week and month rollups are refreshed in the same transaction.
+    """
+    if 'date' not in entry_data:
+        raise ValueError("Entry data must include a date")
+    
+    row = prepare_entry_row(entry_data, user_id)
+    apply_symptom_masks([row])
+    db = get_db(user_id)
     
     try:
-        # Convert timestamp string to datetime object if present
-        if 'timestamp' in entry_data and isinstance(entry_data['timestamp'], str):
-            try:
-                entry_data['timestamp'] = datetime.fromisoformat(entry_data['timestamp'])
-            except (ValueError, TypeError):
-                # If parsing fails, use current time
-                entry_data['timestamp'] = datetime.utcnow()
-        
-        existing = db.query(WellnessEntry).filter(
-            WellnessEntry.date == entry_data['date'],
-            WellnessEntry.user_id == user_id
-        ).first()
-        
-        if existing:
-            # Get valid column names from the model
-            from sqlalchemy import inspect as sql_inspect
-            mapper = sql_inspect(WellnessEntry)
-            valid_columns = {col.key for col in mapper.columns}
-            
-            # Fields to skip (internal/metadata fields)
-            skip_fields = {'user_id', 'id'}
-            
-            updated_fields = []
-            for key, value in entry_data.items():
-                # Skip internal fields
-                if key in skip_fields:
-                    continue
-                
-                # Skip if not a valid database column
-                if key not in valid_columns:
-                    continue
-                    
-                # Convert timestamp if needed
-                if key == 'timestamp' and isinstance(value, str):
-                    try:
-                        value = datetime.fromisoformat(value)
-                    except (ValueError, TypeError):
-                        value = datetime.utcnow()
-                
-                # Update the field
-                try:
-                    old_value = getattr(existing, key, None)
-                    setattr(existing, key, value)
-                    if old_value != value:
-                        updated_fields.append(key)
-                except Exception as e:
-                    print(f"Warning: Could not update {key}: {e}")
-                    continue
-            
-            db.commit()
-            db.refresh(existing)
-            return existing
+        stmt = build_entry_upsert(db.get_bind().dialect.name, [row])
+        if stmt is not None:
+            saved = db.scalars(
+                stmt.returning(WellnessEntry),
+                execution_options={'populate_existing': True}
+            ).one()
         else:
-            db_entry = WellnessEntry(
-                user_id=user_id,
-                **entry_data
-            )
-            db.add(db_entry)
-            db.commit()
-            db.refresh(db_entry)
-            return db_entry
+            saved = upsert_entry_fallback(db, row)
+        
+        refresh_rollups(db, user_id, [row['date']])
+        bump_data_version(db, user_id)
+        
+        # RETURNING already loaded every column; detach the instance so the
+        # commit does not expire it and force a refresh round trip
+        db.expunge(saved)
+        db.commit()
+        invalidate_entry_cache(user_id)
+        return saved
             
     except Exception as e:
         db.rollback()
@@ -75,129 +179,674 @@ def save_wellness_entry(entry_data, user_id='default_user'):
     finally:
         close_db(db)
 
+# Rows per multi-row upsert; keeps bound parameters well under SQLite's limit
+BATCH_CHUNK_SIZE = 500
+
+_NUMERIC_ENTRY_COLUMNS = frozenset(
+    column.key for column in WellnessEntry.__table__.columns
+    if isinstance(column.type, (Integer, Float)) and column.key not in _DERIVED_FIELDS
+)
+
+def _validate_entry_data(entry_data):
+    """Return an error message if the entry cannot be stored, otherwise None"""
+    if isinstance(entry_data, Exception):
+        return str(entry_data)
+    if not isinstance(entry_data, dict):
+        return "Entry must be an object"
+    
+    date = entry_data.get('date')
+    if not date:
+        return "Entry must include a date"
+    try:
+        to_date(date)
+    except ValueError:
+        return f"Invalid date '{date}', expected YYYY-MM-DD"
+    
+    for key in _NUMERIC_ENTRY_COLUMNS.intersection(entry_data):
+        value = entry_data[key]
+        if value is None:
+            continue
+        try:
+            float(value)
+        except (ValueError, TypeError):
+            return f"Field '{key}' must be numeric"
+    
+    return None
+
+def _batch_result(index, date, status, error=None):
+    result = {'index': index, 'date': date, 'status': status}
+    if error:
+        result['error'] = error
+    return result
+
+def _write_entry_chunk(chunk, user_id):
+    """Upsert one chunk of (index, row) pairs inside a single transaction"""
+    results = []
+    
+    # A single upsert statement cannot touch the same row twice, so the
+    # last entry for a date wins and earlier ones are reported as rejected
+    latest = {}
+    for index, row in chunk:
+        previous = latest.get(row['date'])
+        if previous is not None:
+            results.append(_batch_result(
+                previous[0], row['date'].isoformat(), 'rejected',
+                f"Superseded by entry {index} for the same date"
+            ))
+        latest[row['date']] = (index, row)
+    
+    db = get_db(user_id)
+    
+    try:
+        apply_symptom_masks([row for _, row in latest.values()])
+        
+        existing_dates = set(db.scalars(
+            select(WellnessEntry.date).where(
+                WellnessEntry.user_id == user_id,
+                WellnessEntry.date.in_(list(latest))
+            )
+        ))
+        
+        # Multi-row VALUES needs the same columns in every row
+        groups = {}
+        for _, row in latest.values():
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+        
+        dialect_name = db.get_bind().dialect.name
+        for rows in groups.values():
+            stmt = build_entry_upsert(dialect_name, rows)
+            if stmt is not None:
+                db.execute(stmt)
+            else:
+                for row in rows:
+                    upsert_entry_fallback(db, row)
+        
+        refresh_rollups(db, user_id, latest)
+        bump_data_version(db, user_id)
+        db.commit()
+        invalidate_entry_cache(user_id)
+        
+        for date, (index, _) in latest.items():
+            status = 'updated' if date in existing_dates else 'inserted'
+            results.append(_batch_result(index, date.isoformat(), status))
+    except Exception as e:
+        db.rollback()
+        results.extend(
+            _batch_result(index, date.isoformat(), 'rejected', str(e))
+            for date, (index, _) in latest.items()
+        )
+    finally:
+        close_db(db)
+    
+    return results
+
+def save_wellness_entries_batch(entries, user_id='default_user', chunk_size=BATCH_CHUNK_SIZE):
+    """Save many wellness entries using chunked multi-row upserts
+    
+    `entries` may be any iterable, including a generator over a request
+    stream; it is consumed lazily one chunk at a time. Exception items are
+    recorded as rejected so streaming parsers can report bad input.
+    
+    Returns one result per entry, in input order, with a status of
+    'inserted', 'updated' or 'rejected' (plus an 'error' when rejected).
+    """
+    results = []
+    chunk = []
+    
+    for index, entry_data in enumerate(entries):
+        error = _validate_entry_data(entry_data)
+        if error:
+            date = entry_data.get('date') if isinstance(entry_data, dict) else None
+            results.append(_batch_result(index, date, 'rejected', error))
+            continue
+        
+        chunk.append((index, prepare_entry_row(entry_data, user_id)))
+        if len(chunk) >= chunk_size:
+            results.extend(_write_entry_chunk(chunk, user_id))
+            chunk = []
+    
+    if chunk:
+        results.extend(_write_entry_chunk(chunk, user_id))
+    
+    results.sort(key=lambda result: result['index'])
+    return results
+
+def entry_to_dict(entry):
+    """Convert a WellnessEntry row into the API's entry dictionary"""
+    return {
+        'date': entry.date.isoformat(),
+        'timestamp': entry.timestamp.isoformat() if entry.timestamp else entry.date.isoformat(),
+        'breakfast': entry.breakfast or '',
+        'lunch': entry.lunch or '',
+        'dinner': entry.dinner or '',
+        'snacks': entry.snacks or '',
+        'morning_meal': entry.morning_meal or '',
+        'afternoon_meal': entry.afternoon_meal or '',
+        'night_meal': entry.night_meal or '',
+        'stress_morning': entry.stress_morning,
+        'stress_afternoon': entry.stress_afternoon,
+        'stress_night': entry.stress_night,
+        # Also include frontend field names for compatibility
+        'morning_stress': entry.stress_morning,
+        'afternoon_stress': entry.stress_afternoon,
+        'night_stress': entry.stress_night,
+        'average_stress': entry.average_stress,
+        'exercise_minutes': entry.exercise_minutes,
+        'water_intake': entry.water_intake,
+        'sleep_hours': entry.sleep_hours,
+        'sleep_quality': entry.sleep_quality,
+        'on_period': entry.on_period,
+        'period_day': entry.period_day,
+        'cycle_phase': entry.cycle_phase or '',
+        'symptoms': entry.symptoms or {},
+        'notes': entry.notes or '',
+        'additional_notes': entry.additional_notes or '',
+        'wellness_score': entry.wellness_score,
+        'sentiment_score': entry.sentiment_score,
+        'predicted_energy': entry.predicted_energy
+    }
+
+# ==================== Archived Entries ====================
+
+def read_archived_entries(user_id, skip_dates, start_date=None, end_date=None, limit=None, newest_first=False):
+    """Read archived rows as transient WellnessEntry objects, oldest first"""
+    rows = read_archived(user_id, ARCHIVE_COLUMNS, start_date, end_date, limit, newest_first, skip_dates)
+    return [WellnessEntry(user_id=user_id, **dict(zip(ARCHIVE_COLUMNS, row))) for row in rows]
+
+def archived_entries(db, user_id, start_date=None, end_date=None, limit=None, newest_first=False):
+    """Archived entries in a date range that no live row shadows
+    
+    Empty, without touching the archive, unless the range reaches below the
+    user's archive horizon (see archive.py).
+    """
+    if not reaches_archive(user_id, start_date):
+        return []
+    return read_archived_entries(user_id, shadowed_dates(db, user_id), start_date, end_date, limit, newest_first)
+
+def merge_entries(entries, archived, limit=None, newest_first=False):
+    """Merge live and archived entries (never the same date), oldest first"""
+    if not archived:
+        return entries
+    merged = sorted(list(entries) + archived, key=lambda entry: entry.date)
+    if limit is not None:
+        merged = merged[-limit:] if newest_first else merged[:limit]
+    return merged
+
+def _optional_date(value):
+    return to_date(value) if value is not None else None
+
 def get_all_entries(user_id='default_user'):
     """Get all wellness entries for a user"""
-    db = get_db()
+    db = get_db(user_id)
     
     try:
         entries = db.query(WellnessEntry).filter(
             WellnessEntry.user_id == user_id
         ).order_by(WellnessEntry.date).all()
+        entries = merge_entries(entries, archived_entries(db, user_id))
         
-        result = []
-        for entry in entries:
-            entry_dict = {
-                'date': entry.date,
-                'timestamp': entry.timestamp.isoformat() if entry.timestamp else entry.date,
-                'breakfast': entry.breakfast or '',
-                'lunch': entry.lunch or '',
-                'dinner': entry.dinner or '',
-                'snacks': entry.snacks or '',
-                'morning_meal': entry.morning_meal or '',
-                'afternoon_meal': entry.afternoon_meal or '',
-                'night_meal': entry.night_meal or '',
-                'stress_morning': entry.stress_morning,
-                'stress_afternoon': entry.stress_afternoon,
-                'stress_night': entry.stress_night,
-                # Also include frontend field names for compatibility
-                'morning_stress': entry.stress_morning,
-                'afternoon_stress': entry.stress_afternoon,
-                'night_stress': entry.stress_night,
-                'average_stress': entry.average_stress,
-                'exercise_minutes': entry.exercise_minutes,
-                'water_intake': entry.water_intake,
-                'sleep_hours': entry.sleep_hours,
-                'sleep_quality': entry.sleep_quality,
-                'on_period': entry.on_period,
-                'period_day': entry.period_day,
-                'cycle_phase': entry.cycle_phase or '',
-                'symptoms': entry.symptoms or {},
-                'notes': entry.notes or '',
-                'additional_notes': entry.additional_notes or '',
-                'wellness_score': entry.wellness_score,
-                'sentiment_score': entry.sentiment_score,
-                'predicted_energy': entry.predicted_energy
-            }
-            result.append(entry_dict)
-        return result
+        return [entry_to_dict(entry) for entry in entries]
         
     finally:
         close_db(db)
 
 def get_recent_entries(user_id='default_user', limit=30):
     """Get recent wellness entries"""
-    db = get_db()
+    db = get_db(user_id)
     
     try:
         entries = db.query(WellnessEntry).filter(
             WellnessEntry.user_id == user_id
         ).order_by(desc(WellnessEntry.date)).limit(limit).all()
         
-        result = []
-        for entry in reversed(entries):
-            entry_dict = {
-                'date': entry.date,
-                'timestamp': entry.timestamp.isoformat() if entry.timestamp else entry.date,
-                'breakfast': entry.breakfast or '',
-                'lunch': entry.lunch or '',
-                'dinner': entry.dinner or '',
-                'snacks': entry.snacks or '',
-                'morning_meal': entry.morning_meal or '',
-                'afternoon_meal': entry.afternoon_meal or '',
-                'night_meal': entry.night_meal or '',
-                'stress_morning': entry.stress_morning,
-                'stress_afternoon': entry.stress_afternoon,
-                'stress_night': entry.stress_night,
-                # Also include frontend field names for compatibility
-                'morning_stress': entry.stress_morning,
-                'afternoon_stress': entry.stress_afternoon,
-                'night_stress': entry.stress_night,
-                'average_stress': entry.average_stress,
-                'exercise_minutes': entry.exercise_minutes,
-                'water_intake': entry.water_intake,
-                'sleep_hours': entry.sleep_hours,
-                'sleep_quality': entry.sleep_quality,
-                'on_period': entry.on_period,
-                'period_day': entry.period_day,
-                'cycle_phase': entry.cycle_phase or '',
-                'symptoms': entry.symptoms or {},
-                'notes': entry.notes or '',
-                'additional_notes': entry.additional_notes or '',
-                'wellness_score': entry.wellness_score,
-                'sentiment_score': entry.sentiment_score,
-                'predicted_energy': entry.predicted_energy
-            }
-            result.append(entry_dict)
-        return result
+        # Archived rows can only displace live ones older than the oldest kept
+        start_date = entries[-1].date if len(entries) == limit else None
+        archived = archived_entries(db, user_id, start_date, limit=limit, newest_first=True)
+        entries = merge_entries(entries[::-1], archived, limit, newest_first=True)
+        
+        return [entry_to_dict(entry) for entry in entries]
+        
+    finally:
+        close_db(db)
+
+def get_entry(date, user_id='default_user'):
+    """Get a single wellness entry by date, or None if there is none"""
+    db = get_db(user_id)
+    
+    try:
+        day = to_date(date)
+        entry = db.query(WellnessEntry).filter(
+            WellnessEntry.user_id == user_id,
+            WellnessEntry.date == day
+        ).first()
+        if entry is None:
+            archived = archived_entries(db, user_id, day, day)
+            entry = archived[0] if archived else None
+        
+        return entry_to_dict(entry) if entry else None
+        
+    finally:
+        close_db(db)
+
+def get_entries_between(start_date=None, end_date=None, user_id='default_user'):
+    """Get wellness entries with start_date <= date <= end_date, oldest first
+    
+    Either bound may be None to leave that side of the range open.
+    """
+    db = get_db(user_id)
+    
+    try:
+        query = db.query(WellnessEntry).filter(WellnessEntry.user_id == user_id)
+        if start_date is not None:
+            query = query.filter(WellnessEntry.date >= to_date(start_date))
+        if end_date is not None:
+            query = query.filter(WellnessEntry.date <= to_date(end_date))
+        
+        entries = query.order_by(WellnessEntry.date).all()
+        entries = merge_entries(entries, archived_entries(
+            db, user_id, _optional_date(start_date), _optional_date(end_date)
+        ))
+        return [entry_to_dict(entry) for entry in entries]
+        
+    finally:
+        close_db(db)
+
+def get_entries_page(after_date=None, limit=100, user_id='default_user'):
+    """Get one page of wellness entries using keyset pagination on date
+    
+    Returns (entries, next_cursor). Pass next_cursor back as after_date to
+    fetch the following page; it is None once the last page is reached.
+    """
+    db = get_db(user_id)
+    
+    try:
+        query = db.query(WellnessEntry).filter(WellnessEntry.user_id == user_id)
+        if after_date is not None:
+            query = query.filter(WellnessEntry.date > to_date(after_date))
+        
+        # Fetch one extra row to learn whether another page exists
+        entries = query.order_by(WellnessEntry.date).limit(limit + 1).all()
+        start_date = to_date(after_date) + timedelta(days=1) if after_date is not None else None
+        entries = merge_entries(entries, archived_entries(db, user_id, start_date, limit=limit + 1), limit + 1)
+        
+        next_cursor = None
+        if len(entries) > limit:
+            entries = entries[:limit]
+            next_cursor = entries[-1].date.isoformat()
+        
+        return [entry_to_dict(entry) for entry in entries], next_cursor
+        
+    finally:
+        close_db(db)
+
+def count_entries(user_id='default_user'):
+    """Count wellness entries for a user"""
+    db = get_db(user_id)
+    
+    try:
+        count = db.scalar(
+            select(func.count()).select_from(WellnessEntry).where(
+                WellnessEntry.user_id == user_id
+            )
+        )
+        if reaches_archive(user_id):
+            count += len(archived_dates(user_id) - shadowed_dates(db, user_id))
+        return count
+        
+    finally:
+        close_db(db)
+
+# Columns returned by load_entry_frame() when none are requested;
+# symptom_mask is internal and must be asked for explicitly
+FRAME_COLUMNS = tuple(
+    column.key for column in WellnessEntry.__table__.columns
+    if column.key not in ('id', 'user_id', 'symptom_mask')
+)
+
+def _column_to_array(column, values):
+    """Build a typed NumPy array for one column of fetched values"""
+    if isinstance(column.type, BigInteger):
+        # Bitmasks stay exact int64 (NULL as 0) so bitwise_and works on them
+        return np.array([value or 0 for value in values], dtype=np.int64)
+    if isinstance(column.type, (Integer, Float)):
+        # NULLs become NaN
+        return np.array(values, dtype=np.float64)
+    if isinstance(column.type, Boolean):
+        return np.array(values, dtype=bool)
+    if isinstance(column.type, Date):
+        # Keep dates as ISO strings, the format every caller already expects
+        array = np.empty(len(values), dtype=object)
+        array[:] = [value.isoformat() if value else '' for value in values]
+        return array
+    if isinstance(column.type, DateTime):
+        return pd.to_datetime(pd.Series(values, dtype=object)).to_numpy()
+    
+    array = np.empty(len(values), dtype=object)
+    if isinstance(column.type, JSON):
+        array[:] = [value or {} for value in values]
+    else:
+        array[:] = [value or '' for value in values]
+    return array
+
+def frame_columns(columns):
+    columns = list(columns or FRAME_COLUMNS)
+    if 'date' not in columns:
+        columns.insert(0, 'date')
+    unknown = set(columns) - ENTRY_COLUMNS
+    if unknown:
+        raise ValueError(f"Unknown entry columns: {sorted(unknown)}")
+    return columns
+
+def entry_frame_select(columns, start_date=None, end_date=None, limit=None, user_id='default_user'):
+    """Build the Core select behind load_entry_frame()"""
+    table = WellnessEntry.__table__
+    stmt = select(*(table.c[name] for name in columns)).where(table.c.user_id == user_id)
+    if start_date is not None:
+        stmt = stmt.where(table.c.date >= to_date(start_date))
+    if end_date is not None:
+        stmt = stmt.where(table.c.date <= to_date(end_date))
+    
+    if limit is not None:
+        return stmt.order_by(table.c.date.desc()).limit(limit)
+    return stmt.order_by(table.c.date)
+
+def rows_to_frame(columns, rows, limit=None):
+    """Build a typed DataFrame from rows fetched by entry_frame_select()"""
+    table = WellnessEntry.__table__
+    if limit is not None:
+        rows = rows[::-1]
+    
+    # Transpose row tuples into per-column sequences
+    column_values = list(zip(*rows)) if rows else [()] * len(columns)
+    return pd.DataFrame({
+        name: _column_to_array(table.c[name], values)
+        for name, values in zip(columns, column_values)
+    })
+
+def _query_entry_frame(columns, start_date=None, end_date=None, limit=None, user_id='default_user'):
+    """Load an entry frame straight from the database, bypassing the cache"""
+    db = get_db(user_id)
+    
+    try:
+        rows = db.execute(entry_frame_select(columns, start_date, end_date, limit, user_id)).all()
+    finally:
+        close_db(db)
+    
+    return rows_to_frame(columns, rows, limit)
+
+# ==================== Entry Frame Cache ====================
+
+# Upper bound on the memory held by cached frames (0 disables the cache).
+# Frames are kept per process but keyed on the persisted data version, so
+# writes from other processes (workers, migrations, restores) are seen.
+ENTRY_CACHE_MAX_BYTES = int(os.getenv('ENTRY_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Every column a caller may request, so one cached frame serves them all
+CACHED_FRAME_COLUMNS = list(FRAME_COLUMNS) + ['symptom_mask']
+
+_cache_lock = threading.Lock()
+_frame_cache = OrderedDict()  # user_id -> (data version, frame, nbytes), least recently used first
+_user_load_locks = {}         # user_id -> lock held while loading that user's frame
+_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0, 'bytes': 0}
+
+def invalidate_entry_cache(user_id='default_user'):
+    """Drop a user's cached frame early; call after committing a write
+    
+    A write that bumped the data version makes the frame unreachable anyway;
+    this frees its memory at once.
+    """
+    with _cache_lock:
+        cached = _frame_cache.pop(user_id, None)
+        if cached is not None:
+            _cache_stats['bytes'] -= cached[2]
+            _cache_stats['invalidations'] += 1
+
+def clear_entry_cache():
+    """Drop every cached frame (counters are kept)"""
+    with _cache_lock:
+        _frame_cache.clear()
+        _cache_stats['bytes'] = 0
+
+def entry_cache_stats():
+    """Return cache counters: hits, misses, evictions, invalidations, bytes, users, max_bytes"""
+    with _cache_lock:
+        stats = dict(_cache_stats)
+        stats['users'] = len(_frame_cache)
+    stats['max_bytes'] = ENTRY_CACHE_MAX_BYTES
+    return stats
+
+def cached_entry_frame(user_id, version):
+    """Return the user's cached CACHED_FRAME_COLUMNS frame for data version, or None
+    
+    A hit marks the frame recently used and is counted; a caller that gets
+    None loads the frame and passes it to store_entry_frame().
+    """
+    with _cache_lock:
+        cached = _frame_cache.get(user_id)
+        if cached is None or cached[0] != version:
+            return None
+        _frame_cache.move_to_end(user_id)
+        _cache_stats['hits'] += 1
+        return cached[1]
+
+def store_entry_frame(user_id, version, frame):
+    """Cache a frame loaded on a miss after reading data version `version`
+    
+    The version is read before the rows, so a write committed while the
+    frame was loading leaves it under an outdated version, never a newer one.
+    """
+    nbytes = int(frame.memory_usage(deep=True).sum())
+    with _cache_lock:
+        _cache_stats['misses'] += 1
+        previous = _frame_cache.get(user_id)
+        if nbytes > ENTRY_CACHE_MAX_BYTES or (previous is not None and previous[0] > version):
+            return
+        previous = _frame_cache.pop(user_id, None)
+        if previous is not None:
+            _cache_stats['bytes'] -= previous[2]
+        
+        while _frame_cache and _cache_stats['bytes'] + nbytes > ENTRY_CACHE_MAX_BYTES:
+            _, (_, _, evicted_bytes) = _frame_cache.popitem(last=False)
+            _cache_stats['bytes'] -= evicted_bytes
+            _cache_stats['evictions'] += 1
+        
+        _frame_cache[user_id] = (version, frame, nbytes)
+        _cache_stats['bytes'] += nbytes
+
+def _cached_user_frame(user_id):
+    """Return the user's full history frame, loading it once on a miss"""
+    version = get_data_version(user_id)
+    frame = cached_entry_frame(user_id, version)
+    if frame is not None:
+        return frame
+    
+    with _cache_lock:
+        load_lock = _user_load_locks.setdefault(user_id, threading.Lock())
+    
+    # Parallel dashboard requests wait for one load instead of each querying
+    with load_lock:
+        frame = cached_entry_frame(user_id, version)
+        if frame is None:
+            frame = _query_entry_frame(CACHED_FRAME_COLUMNS, user_id=user_id)
+            store_entry_frame(user_id, version, frame)
+        return frame
+
+def load_entry_frame(columns=None, start_date=None, end_date=None, limit=None, user_id='default_user'):
+    """Load wellness entries as a pandas DataFrame straight from SQL
+    
+    Selects only the requested columns (default: FRAME_COLUMNS) with a Core
+    query and builds one typed array per column, skipping ORM objects and
+    per-row dicts. Numeric columns are float64 with NaN for missing values.
+    
+    start_date/end_date bound the date range (inclusive); limit keeps only
+    the most recent N entries. Rows are always ordered oldest first.
+    
+    The user's live history is cached (see ENTRY_CACHE_MAX_BYTES) until the
+    next write, and each call is sliced from it; callers get their own frame.
+    Archived entries are read in only when the range reaches the archive.
+    """
+    columns = frame_columns(columns)
+    if ENTRY_CACHE_MAX_BYTES <= 0:
+        frame = _query_entry_frame(columns, start_date, end_date, limit, user_id)
+        return with_archived_frame(frame, columns, user_id, start_date, end_date, limit)
+    
+    live = _cached_user_frame(user_id)
+    frame = slice_entry_frame(live, columns, start_date, end_date, limit)
+    return with_archived_frame(frame, columns, user_id, start_date, end_date, limit, live['date'])
+
+def slice_entry_frame(frame, columns, start_date=None, end_date=None, limit=None):
+    """Select a load_entry_frame() result out of a cached full-history frame"""
+    if start_date is not None:
+        frame = frame[frame['date'] >= to_date(start_date).isoformat()]
+    if end_date is not None:
+        frame = frame[frame['date'] <= to_date(end_date).isoformat()]
+    if limit is not None:
+        frame = frame.tail(limit)
+    return frame[columns].reset_index(drop=True)
+
+def with_archived_frame(frame, columns, user_id, start_date=None, end_date=None, limit=None, live_dates=None):
+    """Merge archived rows into a live load_entry_frame() result if its range reaches them
+    
+    live_dates holds the ISO date of every live row when already loaded;
+    otherwise the live rows that shadow archived ones are queried.
+    """
+    start_date = _optional_date(start_date)
+    if limit is not None and len(frame) >= limit:
+        # Only archived rows newer than the oldest kept row could displace it
+        start_date = to_date(frame['date'].iloc[0])
+    if not reaches_archive(user_id, start_date):
+        return frame
+    
+    if live_dates is None:
+        db = get_db(user_id)
         
+        try:
+            skip_dates = shadowed_dates(db, user_id)
+        finally:
+            close_db(db)
+    else:
+        through = archived_through(user_id).isoformat()
+        skip_dates = {to_date(day) for day in live_dates[live_dates < through]}
+    
+    rows = read_archived(user_id, columns, start_date, _optional_date(end_date), limit,
+                         limit is not None, skip_dates)
+    if not rows:
+        return frame
+    
+    merged = rows_to_frame(columns, rows)
+    if not frame.empty:
+        merged = pd.concat([frame, merged], ignore_index=True).sort_values('date', kind='stable')
+    if limit is not None:
+        merged = merged.tail(limit)
+    return merged.reset_index(drop=True)
+
+# ==================== Dashboard Statistics ====================
+
+# Columns averaged by entry_stats()
+STATS_COLUMNS = ('wellness_score', 'sleep_hours', 'exercise_minutes', 'average_stress')
+
+def entry_stats_select(window, user_id):
+    """Aggregate the last `window` entries and count all of them in one query
+    
+    The window is a LIMIT subquery over the (user_id, date) index, so the
+    database reads only `window` rows plus the index for the count.
+    """
+    table = WellnessEntry.__table__
+    recent = select(table.c.date, *(table.c[name] for name in STATS_COLUMNS)).where(
+        table.c.user_id == user_id
+    ).order_by(table.c.date.desc()).limit(window).subquery()
+    total = select(func.count()).select_from(table).where(table.c.user_id == user_id).scalar_subquery()
+    
+    return select(
+        func.count(),
+        func.min(recent.c.date),
+        *(func.avg(recent.c[name]) for name in STATS_COLUMNS),
+        total
+    ).select_from(recent)
+
+def stats_result(entries, averages, total):
+    return {
+        'entries': entries,
+        'averages': {
+            name: None if value is None or value != value else float(value)
+            for name, value in zip(STATS_COLUMNS, averages)
+        },
+        'total_entries': total
+    }
+
+def frame_stats(frame, total):
+    """entry_stats() result for a window loaded as a frame"""
+    return stats_result(len(frame), [frame[name].mean() for name in STATS_COLUMNS], total)
+
+def entry_stats(window=7, user_id='default_user'):
+    """Average STATS_COLUMNS over the user's last `window` entries
+    
+    Returns {'entries': rows in the window, 'averages': {column: mean or None},
+    'total_entries': count of all entries}. Averages skip missing values.
+    When the window reaches archived entries, it is merged in memory instead
+    (at most `window` rows).
+    """
+    db = get_db(user_id)
+    
+    try:
+        entries, oldest, *averages, total = db.execute(entry_stats_select(window, user_id)).one()
+        if reaches_archive(user_id):
+            total += len(archived_dates(user_id) - shadowed_dates(db, user_id))
     finally:
         close_db(db)
+    
+    # A full window only needs archived rows newer than its oldest entry
+    if not reaches_archive(user_id, oldest if entries >= window else None):
+        return stats_result(entries, averages, total)
+    
+    columns = frame_columns(STATS_COLUMNS)
+    frame = _query_entry_frame(columns, limit=window, user_id=user_id)
+    return frame_stats(with_archived_frame(frame, columns, user_id, limit=window), total)
 
 def delete_entry(date, user_id='default_user'):
-    """Delete a wellness entry by date"""
-    db = get_db()
+    """Delete a wellness entry by date and refresh its rollups
+    
+    An archived copy of the entry is hidden with a tombstone in the
+    user's archive manifest. The tombstone is written first (the rollups
+    must not count the archived copy) and removed again if the
+    transaction fails.
+    """
+    db = get_db(user_id)
+    day = None
+    archived = committed = False
     
     try:
+        day = to_date(date)
         entry = db.query(WellnessEntry).filter(
-            WellnessEntry.date == date,
+            WellnessEntry.date == day,
             WellnessEntry.user_id == user_id
         ).first()
         
         if entry:
             db.delete(entry)
+            db.flush()
+        archived = reaches_archive(user_id, day) and add_tombstone(user_id, day)
+        
+        if entry or archived:
+            refresh_rollups(db, user_id, [day])
+            bump_data_version(db, user_id)
             db.commit()
+            committed = True
+            invalidate_entry_cache(user_id)
             return True
         return False
         
     except Exception as e:
         db.rollback()
+        if archived and not committed:
+            remove_tombstone(user_id, day)
         raise e
     finally:
         close_db(db)
 
 def get_user_profile(user_id='default_user'):
     """Get user profile"""
-    db = get_db()
+    db = get_db(user_id)
     
     try:
         profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
@@ -224,7 +873,7 @@ def get_user_profile(user_id='default_user'):
 
 def update_user_profile(profile_data, user_id='default_user'):
     """Update user profile"""
-    db = get_db()
+    db = get_db(user_id)
     
     try:
         profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
@@ -238,6 +887,7 @@ def update_user_profile(profile_data, user_id='default_user'):
                 setattr(profile, key, value)
         
         profile.last_updated = datetime.utcnow()
+        bump_data_version(db, user_id)
         db.commit()
         
         return True
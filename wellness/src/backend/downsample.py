@@ -0,0 +1,108 @@
+"""
+Largest-Triangle-Three-Buckets (LTTB) downsampling for chart series
+
+Long histories are reduced to at most max_points rows before they are sent
+to the browser. The first and last rows are always kept. The rows in
+between are split into equal buckets, and each bucket keeps the row that
+forms the largest triangle with the row kept before it and the average of
+the next bucket, which keeps the visible peaks and troughs.
+
+Charts that share an x axis are downsampled together: the triangle areas
+of every series (each scaled to its own range) are summed, so all series
+keep the same rows. Results are cached per user, data version and request.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Downsampled payloads kept in memory (per process); 0 disables the cache
+DOWNSAMPLE_CACHE_SIZE = int(os.getenv('DOWNSAMPLE_CACHE_SIZE', 256))
+
+# Fewer points cannot keep both ends and a bucket in between
+MIN_POINTS = 3
+
+def lttb_indices(x, series, max_points):
+    """Return the sorted row indices LTTB keeps out of len(x) rows
+
+    x is an increasing 1-D array; series is an array of shape (len(x), k).
+    Missing values count as 0. Every row is kept when there are at most
+    max_points of them.
+    """
+    n = len(x)
+    max_points = max(int(max_points), MIN_POINTS)
+    if n <= max_points:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(series, dtype=np.float64).reshape(n, -1))
+
+    # Scale x and every series to [0, 1] so no series dominates the areas
+    x = (x - x[0]) / ((x[-1] - x[0]) or 1)
+    low = y.min(axis=0)
+    span = y.max(axis=0) - low
+    span[span == 0] = 1
+    y = (y - low) / span
+
+    # max_points - 2 buckets over the interior rows 1 .. n-2, and the
+    # average of each one (the third triangle point for the bucket before)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    counts = np.diff(edges)
+    x_next = np.add.reduceat(x, edges[:-1])
+    y_next = np.add.reduceat(y, edges[:-1], axis=0)
+    # reduceat's last bucket runs to the end of the array; trim it
+    x_next[-1] -= x[-1]
+    y_next[-1] -= y[-1]
+    x_next = np.append(x_next[1:] / counts[1:], x[-1])
+    y_next = np.vstack([y_next[1:] / counts[1:, None], y[-1:]])
+
+    keep = np.empty(max_points, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    # Each bucket depends on the row kept in the previous one, so buckets
+    # are walked in order; the areas within a bucket are computed at once
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        area = np.abs(
+            (x[a] - x_next[bucket]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end, None]) * (y_next[bucket] - y[a])
+        ).sum(axis=1)
+        a = start + int(area.argmax())
+        keep[bucket + 1] = a
+    return keep
+
+def date_axis(dates):
+    """Day numbers for an array of 'YYYY-MM-DD' strings, as an LTTB x axis"""
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+# ==================== Cache ====================
+
+_cache_lock = threading.Lock()
+_cache = OrderedDict()  # key -> payload, least recently used first
+
+def cached_payload(key, build):
+    """Return build(), cached under key
+
+    The key must include the user's persisted data version
+    (db_storage.get_data_version), read before build() runs, so a write from
+    any process makes the old payloads unreachable; they age out of the LRU.
+    """
+    if DOWNSAMPLE_CACHE_SIZE <= 0:
+        return build()
+
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    payload = build()
+    with _cache_lock:
+        _cache[key] = payload
+        while len(_cache) > DOWNSAMPLE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return payload
+
+def clear_downsample_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,114 @@
+"""
+Background model training for the API process
+
+Saving an entry only queues a retrain with request(); a worker thread does
+the training. Each user's request waits TRAIN_DEBOUNCE_SECONDS, and another
+save within that time restarts the wait, so a burst of saves triggers one
+retrain. The worker then trains on the user's full history.
+WellnessPredictor publishes a new model bundle (see model_registry) only
+once it is fully trained, so predictions keep using the previous bundle
+until the swap.
+"""
+
+import os
+import threading
+import time
+import traceback
+from datetime import datetime
+
+# Quiet period after a user's last save before their models are retrained
+TRAIN_DEBOUNCE_SECONDS = float(os.getenv('TRAIN_DEBOUNCE_SECONDS', 5))
+
+# Entries each model needs before it can be trained
+XGB_MIN_ENTRIES = 10
+LSTM_MIN_ENTRIES = 7
+
+class BackgroundTrainer:
+    """Debounced training queue served by one daemon thread"""
+
+    def __init__(self, predictor, load_entries, debounce=TRAIN_DEBOUNCE_SECONDS):
+        self.predictor = predictor
+        self.load_entries = load_entries  # user_id -> list of entry dicts
+        self.debounce = debounce
+        self._condition = threading.Condition()
+        self._due = {}   # user_id -> monotonic time its training may start
+        self._jobs = {}  # user_id -> job state reported by status()
+        self._thread = None
+
+    def request(self, user_id='default_user', delay=None):
+        """Queue a retrain of user_id's models; returns immediately"""
+        with self._condition:
+            self._due[user_id] = time.monotonic() + (self.debounce if delay is None else delay)
+            job = self._jobs.setdefault(user_id, {
+                'state': 'queued', 'requests': 0, 'runs': 0, 'entries': None,
+                'started_at': None, 'finished_at': None, 'seconds': None, 'trained': None, 'error': None
+            })
+            job['requests'] += 1
+            if job['state'] != 'running':
+                job['state'] = 'queued'
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='model-trainer', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def status(self):
+        """Return {'worker_alive', 'queued', 'jobs': {user_id: job state}}"""
+        with self._condition:
+            return {
+                'worker_alive': self._thread is not None and self._thread.is_alive(),
+                'queued': len(self._due),
+                'jobs': {user_id: dict(job) for user_id, job in self._jobs.items()},
+            }
+
+    def _next_user(self):
+        """Block until some user's debounce period has passed, then claim that user"""
+        with self._condition:
+            while True:
+                if not self._due:
+                    self._condition.wait()
+                    continue
+                user_id, due = min(self._due.items(), key=lambda item: item[1])
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+
+                del self._due[user_id]
+                job = self._jobs[user_id]
+                job['state'] = 'running'
+                job['started_at'] = datetime.utcnow().isoformat()
+                job['error'] = None
+                return user_id
+
+    def _train(self, user_id):
+        """Train every model the user has enough entries for; returns ({model: trained}, entries)"""
+        entries = self.load_entries(user_id)
+        trained = {}
+        if len(entries) >= XGB_MIN_ENTRIES:
+            trained['xgboost'] = bool(self.predictor.train_xgboost_model(entries, user_id=user_id))
+        if len(entries) >= LSTM_MIN_ENTRIES:
+            trained['lstm'] = self.predictor.train_lstm_model(entries, user_id=user_id) is not None
+        return trained, len(entries)
+
+    def _run(self):
+        while True:
+            user_id = self._next_user()
+            started = time.perf_counter()
+            try:
+                trained, entries = self._train(user_id)
+                error = None
+            except Exception as e:
+                print(f"Background training failed for {user_id}: {e}")
+                print(traceback.format_exc())
+                trained, entries, error = None, None, str(e)
+
+            with self._condition:
+                job = self._jobs[user_id]
+                job.update({
+                    'runs': job['runs'] + 1, 'entries': entries, 'trained': trained, 'error': error,
+                    'finished_at': datetime.utcnow().isoformat(),
+                    'seconds': round(time.perf_counter() - started, 3),
+                })
+                # Saves made during training queued another run
+                job['state'] = 'queued' if user_id in self._due else ('failed' if error else 'idle')
@@ -0,0 +1,134 @@
+"""
+Migrate or back up many users in parallel across a process pool
+
+Usage (from src/backend):
+    python parallel_migration.py migrate exports/             # one <user_id>.json per user
+    python parallel_migration.py backup backups/ --all        # every user with data
+    python parallel_migration.py backup backups/ --users alice bob --workers 4
+
+Each user is handled by one worker process with its own database engine,
+using migrate_json_to_db() / export_db_to_json() from data_migration. User
+IDs are URL-quoted in file names. Per-user migrations keep their own
+checkpoint files, so rerunning after an interruption resumes each user.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from urllib.parse import quote, unquote
+from sqlalchemy import select
+from database import init_db, reset_engines_in_child, user_engines, WellnessEntry
+from archive import archived_users
+from data_migration import migrate_json_to_db, export_db_to_json, MIGRATION_CHUNK_SIZE
+
+def _run_user_task(task, user_id, path, chunk_size=MIGRATION_CHUNK_SIZE, restart=False):
+    """Migrate or back up one user in a worker; returns a summary dict"""
+    started = time.perf_counter()
+    output = io.StringIO()
+    result = {'user_id': user_id, 'status': 'ok', 'rows': 0, 'error': None}
+
+    try:
+        # Per-entry progress from many workers would interleave; keep it per user
+        with contextlib.redirect_stdout(output):
+            if task == 'migrate':
+                counts = migrate_json_to_db(path, chunk_size, restart, user_id=user_id)
+                result['rows'] = counts['migrated'] if counts else 0
+            else:
+                result['rows'] = export_db_to_json(path, user_id=user_id)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = f"{e}\n{traceback.format_exc()}"
+
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+def user_files(directory):
+    """Return (user_id, path) for every <user_id>.json legacy file in directory"""
+    return [
+        (unquote(name[:-len('.json')]), os.path.join(directory, name))
+        for name in sorted(os.listdir(directory)) if name.endswith('.json')
+    ]
+
+def all_user_ids():
+    """Return every user with live or archived entries"""
+    entries = WellnessEntry.__table__
+    user_ids = set(archived_users())
+    for bind in user_engines():
+        with bind.connect() as conn:
+            user_ids.update(conn.scalars(select(entries.c.user_id).distinct()))
+    return sorted(user_ids)
+
+def run_parallel(task, jobs, workers=None, chunk_size=MIGRATION_CHUNK_SIZE, restart=False):
+    """Run one task per (user_id, path) job across a process pool
+
+    Returns the per-user summaries in completion order.
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=reset_engines_in_child) as pool:
+        futures = [
+            pool.submit(_run_user_task, task, user_id, path, chunk_size, restart)
+            for user_id, path in jobs
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"  {result['user_id']}: {result['status']}, {result['rows']} rows in {result['seconds']:.2f}s")
+            results.append(result)
+    return results
+
+def print_summary(results, elapsed, workers):
+    """Print per-user timings (slowest first) and the totals"""
+    print(f"\n{'User':<30} {'Status':<8} {'Rows':>10} {'Seconds':>9}")
+    for result in sorted(results, key=lambda result: result['seconds'], reverse=True):
+        print(f"{result['user_id']:<30} {result['status']:<8} {result['rows']:>10} {result['seconds']:>9.2f}")
+
+    rows = sum(result['rows'] for result in results)
+    busy = sum(result['seconds'] for result in results)
+    print(f"\n{len(results)} users, {rows} rows in {elapsed:.1f}s "
+          f"({busy:.1f}s of work across {workers} workers, {rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+    for result in results:
+        if result['error']:
+            print(f"\n{result['user_id']} failed: {result['error']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate or back up users in parallel")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Worker processes (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = commands.add_parser('migrate', help="Import a directory of <user_id>.json legacy files")
+    migrate_parser.add_argument('directory')
+    migrate_parser.add_argument('--chunk-size', type=int, default=MIGRATION_CHUNK_SIZE,
+                                help="Entries per transaction and checkpoint (default: %(default)s)")
+    migrate_parser.add_argument('--restart', action='store_true', help="Ignore saved checkpoints and start over")
+
+    backup_parser = commands.add_parser('backup', help="Export users to <user_id>.json files")
+    backup_parser.add_argument('directory')
+    users = backup_parser.add_mutually_exclusive_group(required=True)
+    users.add_argument('--all', action='store_true', help="Back up every user with entries")
+    users.add_argument('--users', nargs='+', help="User IDs to back up")
+    args = parser.parse_args()
+
+    # Create tables once here, not concurrently in every worker
+    init_db()
+
+    if args.command == 'migrate':
+        jobs = user_files(args.directory)
+        options = {'chunk_size': args.chunk_size, 'restart': args.restart}
+    else:
+        os.makedirs(args.directory, exist_ok=True)
+        user_ids = all_user_ids() if args.all else args.users
+        jobs = [(user_id, os.path.join(args.directory, f"{quote(user_id, safe='')}.json")) for user_id in user_ids]
+        options = {}
+
+    print(f"{args.command.capitalize()} {len(jobs)} users with {args.workers} workers...")
+    started = time.perf_counter()
+    results = run_parallel(args.command, jobs, args.workers, **options)
+    print_summary(results, time.perf_counter() - started, args.workers)
+
+    if any(result['status'] != 'ok' for result in results):
+        raise SystemExit(1)
@@ -0,0 +1,345 @@
+"""
+Per-user weekly and monthly rollups of wellness entries
+
+Each wellness_rollups row holds a period's entry count, period-day count and,
+for every metric, the non-null count, sum and sum of squares. db_storage
+refreshes the periods a write touches inside the same transaction, so
+period statistics are read from one row per period instead of being
+recomputed over every entry.
+
+Usage (from src/backend):
+    python rollups.py                      # rebuild rollups for every user
+    python rollups.py --user default_user  # rebuild one user's rollups
+"""
+
+import argparse
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, case, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import get_db, close_db, get_engine, init_db, user_engines, SessionLocal, WellnessEntry, WellnessRollup
+from archive import archived_dates, archived_users, reaches_archive, read_archived, shadowed_dates
+
+# Metrics with count/sum/sum-of-squares columns on WellnessRollup
+ROLLUP_METRICS = ('average_stress', 'sleep_hours', 'sleep_quality',
+                  'exercise_minutes', 'water_intake', 'wellness_score')
+
+PERIOD_TYPES = ('week', 'month')
+
+_PERIOD_KEY_FIELDS = ('user_id', 'period_type', 'period_start')
+
+_UPSERT_INSERTS = {
+    'sqlite': sqlite_insert,
+    'postgresql': postgresql_insert,
+}
+
+def period_start(day, period_type):
+    """Return the first day of the week (Monday) or month containing day"""
+    if period_type == 'week':
+        return day - timedelta(days=day.weekday())
+    if period_type == 'month':
+        return day.replace(day=1)
+    raise ValueError(f"Unknown period type '{period_type}'")
+
+def _period_end(start, period_type):
+    """Return the first day after the period beginning at start"""
+    if period_type == 'week':
+        return start + timedelta(days=7)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def affected_periods(dates):
+    """Return the sorted (period_type, period_start) pairs covering dates"""
+    return sorted({
+        (period_type, period_start(day, period_type))
+        for day in dates for period_type in PERIOD_TYPES
+    })
+
+def _aggregate_select():
+    entries = WellnessEntry.__table__
+    columns = [
+        func.count().label('entry_count'),
+        func.min(entries.c.date).label('first_date'),
+        func.max(entries.c.date).label('last_date'),
+        func.sum(case((entries.c.on_period, 1), else_=0)).label('period_days'),
+        func.min(entries.c.wellness_score).label('wellness_score_min'),
+        func.max(entries.c.wellness_score).label('wellness_score_max'),
+    ]
+    for metric in ROLLUP_METRICS:
+        column = entries.c[metric]
+        columns += [
+            func.count(column).label(f'{metric}_count'),
+            func.sum(column).label(f'{metric}_sum'),
+            func.sum(column * column).label(f'{metric}_sumsq'),
+        ]
+    return select(*columns)
+
+_AGGREGATE = _aggregate_select()
+
+# Statements run once per period, built once so refreshing many periods
+# (bulk imports, rebuilds) does not recompile them each time
+_PERIOD_AGGREGATE = _AGGREGATE.where(
+    WellnessEntry.__table__.c.user_id == bindparam('user_id'),
+    WellnessEntry.__table__.c.date >= bindparam('start'),
+    WellnessEntry.__table__.c.date < bindparam('end')
+)
+_UPDATE_ROLLUP = update(WellnessRollup.__table__).where(WellnessRollup.__table__.c.id == bindparam('rollup_id'))
+_CLAIM_ROLLUP = {
+    name: insert(WellnessRollup.__table__).on_conflict_do_update(
+        index_elements=list(_PERIOD_KEY_FIELDS),
+        set_={'updated_at': func.now()}
+    ).returning(WellnessRollup.__table__.c.id)
+    for name, insert in _UPSERT_INSERTS.items()
+}
+
+def _archived_totals(db, user_id, start, end):
+    """Aggregate a period's archived entries that no live row shadows, like _AGGREGATE"""
+    rows = read_archived(user_id, ('date', 'on_period') + ROLLUP_METRICS, start, end - timedelta(days=1),
+                         skip_dates=shadowed_dates(db, user_id))
+    if not rows:
+        return None
+
+    frame = pd.DataFrame(rows, columns=('date', 'on_period') + ROLLUP_METRICS)
+    scores = frame['wellness_score'].dropna()
+    totals = {
+        'entry_count': len(frame),
+        'first_date': frame['date'].min(),
+        'last_date': frame['date'].max(),
+        'period_days': int(frame['on_period'].fillna(False).astype(bool).sum()),
+        'wellness_score_min': float(scores.min()) if len(scores) else None,
+        'wellness_score_max': float(scores.max()) if len(scores) else None,
+    }
+    for metric in ROLLUP_METRICS:
+        values = frame[metric].dropna().to_numpy(dtype=np.float64)
+        totals[f'{metric}_count'] = len(values)
+        totals[f'{metric}_sum'] = float(values.sum())
+        totals[f'{metric}_sumsq'] = float((values * values).sum())
+    return totals
+
+def _combine_totals(totals, archived):
+    """Combine live and archived period totals (NULL means no values)"""
+    combined = {}
+    for name, value in totals.items():
+        other = archived[name]
+        if value is None or other is None:
+            combined[name] = other if value is None else value
+        elif name == 'first_date' or name.endswith('_min'):
+            combined[name] = min(value, other)
+        elif name == 'last_date' or name.endswith('_max'):
+            combined[name] = max(value, other)
+        else:
+            combined[name] = value + other
+    return combined
+
+def _claim_rollup(db, key):
+    """Insert or lock the rollup row for key and return its id
+
+    Holding the row lock until commit serializes concurrent writers to the
+    same period, so each one aggregates the entries the previous committed.
+    """
+    rollups = WellnessRollup.__table__
+    claim = _CLAIM_ROLLUP.get(db.get_bind().dialect.name)
+    if claim is not None:
+        return db.scalar(claim, key)
+
+    rollup_id = db.scalar(
+        select(rollups.c.id).where(*(rollups.c[field] == key[field] for field in _PERIOD_KEY_FIELDS))
+        .with_for_update()
+    )
+    if rollup_id is None:
+        rollup_id = db.execute(rollups.insert().values(**key)).inserted_primary_key[0]
+    return rollup_id
+
+def refresh_rollups(db, user_id, dates):
+    """Recompute the week and month rollups containing dates
+
+    Runs inside the caller's transaction; commit it to publish the entry
+    writes and their rollups together. Each affected period is aggregated
+    with one indexed range query over that period's entries, plus its
+    archived entries when the period reaches the user's archive. Returns
+    the number of periods refreshed.
+    """
+    rollups = WellnessRollup.__table__
+
+    periods = affected_periods(dates)
+    for period_type, start in periods:
+        key = {'user_id': user_id, 'period_type': period_type, 'period_start': start}
+        rollup_id = _claim_rollup(db, key)
+
+        end = _period_end(start, period_type)
+        totals = db.execute(_PERIOD_AGGREGATE, {'user_id': user_id, 'start': start, 'end': end}).mappings().one()
+        if reaches_archive(user_id, start):
+            archived = _archived_totals(db, user_id, start, end)
+            if archived is not None:
+                totals = _combine_totals(totals, archived)
+
+        if not totals['entry_count']:
+            db.execute(delete(rollups).where(rollups.c.id == rollup_id))
+            continue
+
+        values = dict(totals)
+        for metric in ROLLUP_METRICS:
+            # SUM() is NULL when a metric has no values in the period
+            values[f'{metric}_sum'] = float(values[f'{metric}_sum'] or 0)
+            values[f'{metric}_sumsq'] = float(values[f'{metric}_sumsq'] or 0)
+        db.execute(_UPDATE_ROLLUP, {'rollup_id': rollup_id, **values})
+
+    return len(periods)
+
+def _rebuild_rollups_in(db, user_id=None):
+    rollups = WellnessRollup.__table__
+    entries = WellnessEntry.__table__
+
+    try:
+        if user_id is None:
+            user_ids = set(db.scalars(select(entries.c.user_id).distinct()))
+            # Users whose entries are all archived, if they live in this database
+            bind_url = db.get_bind().url
+            user_ids.update(uid for uid in archived_users() if get_engine(uid).url == bind_url)
+            db.execute(delete(rollups))
+        else:
+            user_ids = [user_id]
+            db.execute(delete(rollups).where(rollups.c.user_id == user_id))
+
+        refreshed = 0
+        for uid in sorted(user_ids):
+            dates = set(db.scalars(select(entries.c.date).where(entries.c.user_id == uid)))
+            refreshed += refresh_rollups(db, uid, dates | archived_dates(uid))
+
+        db.commit()
+        return refreshed
+
+    except Exception as e:
+        db.rollback()
+        raise e
+    finally:
+        close_db(db)
+
+def rebuild_rollups(user_id=None):
+    """Recompute rollups from wellness_entries for one user, or for all users
+
+    Use after writing entries outside db_storage (imports, schema
+    migrations, manual edits). Returns the number of periods refreshed.
+    """
+    if user_id is not None:
+        return _rebuild_rollups_in(get_db(user_id), user_id)
+    # Every database holding entries (each shard when sharded)
+    return sum(_rebuild_rollups_in(SessionLocal(bind=bind)) for bind in user_engines())
+
+def rollups_need_rebuild():
+    """True when entries exist but no rollups have been built yet"""
+    for bind in user_engines():
+        with bind.connect() as conn:
+            has_entries = conn.scalar(select(WellnessEntry.id).limit(1)) is not None
+            has_rollups = conn.scalar(select(WellnessRollup.id).limit(1)) is not None
+        if has_entries and not has_rollups:
+            return True
+    return False
+
+# ==================== Reading Rollups ====================
+
+def _safe_divide(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), np.nan)
+
+def _add_metric_stats(frame):
+    """Derive <metric>_mean and <metric>_std (sample, like pandas) columns"""
+    for metric in ROLLUP_METRICS:
+        count = frame[f'{metric}_count'].to_numpy(dtype=np.float64)
+        total = frame[f'{metric}_sum'].to_numpy(dtype=np.float64)
+        sumsq = frame[f'{metric}_sumsq'].to_numpy(dtype=np.float64)
+
+        frame[f'{metric}_mean'] = _safe_divide(total, count)
+        variance = _safe_divide(sumsq - total * _safe_divide(total, count), count - 1)
+        # Rounding can leave tiny negative variances for constant values
+        frame[f'{metric}_std'] = np.sqrt(np.clip(variance, 0, None))
+    return frame
+
+def load_rollup_frame(period_type='month', user_id='default_user'):
+    """Load a user's rollups as a DataFrame, oldest period first
+
+    Includes the stored totals plus derived <metric>_mean and <metric>_std
+    columns; period_start, first_date and last_date are ISO strings.
+    """
+    if period_type not in PERIOD_TYPES:
+        raise ValueError(f"Unknown period type '{period_type}'")
+
+    rollups = WellnessRollup.__table__
+    columns = [column for column in rollups.columns
+               if column.key not in ('id', 'user_id', 'period_type', 'updated_at')]
+    db = get_db(user_id)
+
+    try:
+        rows = db.execute(
+            select(*columns)
+            .where(rollups.c.user_id == user_id, rollups.c.period_type == period_type)
+            .order_by(rollups.c.period_start)
+        ).all()
+    finally:
+        close_db(db)
+
+    frame = pd.DataFrame(rows, columns=[column.key for column in columns])
+    for name in ('period_start', 'first_date', 'last_date'):
+        frame[name] = frame[name].map(lambda value: value.isoformat() if value else None)
+    for column in columns:
+        if column.key not in ('period_start', 'first_date', 'last_date'):
+            frame[column.key] = frame[column.key].astype(np.float64)
+    return _add_metric_stats(frame)
+
+def monthly_aggregates(user_id='default_user'):
+    """Monthly statistics with the columns of calculate_monthly_aggregates()
+
+    Read from the month rollups, so the cost grows with the number of
+    months rather than entries. 'month' is a 'YYYY-MM' string.
+    """
+    frame = load_rollup_frame('month', user_id)
+    month = frame['period_start'].str[:7]
+    return pd.DataFrame({
+        'month': month,
+        'wellness_score_mean': frame['wellness_score_mean'],
+        'wellness_score_std': frame['wellness_score_std'],
+        'wellness_score_min': frame['wellness_score_min'],
+        'wellness_score_max': frame['wellness_score_max'],
+        'average_stress_mean': frame['average_stress_mean'],
+        'sleep_hours_mean': frame['sleep_hours_mean'],
+        'sleep_quality_mean': frame['sleep_quality_mean'],
+        'exercise_minutes_mean': frame['exercise_minutes_mean'],
+        'exercise_minutes_sum': frame['exercise_minutes_sum'],
+        'water_intake_mean': frame['water_intake_mean'],
+        'on_period_sum': frame['period_days'].astype(int),
+        'month_str': month,
+    })
+
+def rollup_totals(user_id='default_user'):
+    """Whole-history totals for a user, summed from the month rollups
+
+    Returns a dict with entry_count, first_date, last_date, period_days,
+    wellness_score_min/max and <metric>_mean for each rollup metric, or
+    None when the user has no rollups.
+    """
+    frame = load_rollup_frame('month', user_id)
+    if frame.empty:
+        return None
+
+    totals = {
+        'entry_count': int(frame['entry_count'].sum()),
+        'first_date': frame['first_date'].iloc[0],
+        'last_date': frame['last_date'].iloc[-1],
+        'period_days': int(frame['period_days'].sum()),
+        'wellness_score_min': float(frame['wellness_score_min'].min()),
+        'wellness_score_max': float(frame['wellness_score_max'].max()),
+    }
+    for metric in ROLLUP_METRICS:
+        count = frame[f'{metric}_count'].sum()
+        totals[f'{metric}_mean'] = float(frame[f'{metric}_sum'].sum() / count) if count else float('nan')
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild wellness rollup tables from entries")
+    parser.add_argument('--user', help="Only rebuild this user's rollups")
+    args = parser.parse_args()
+
+    init_db()
+    refreshed = rebuild_rollups(args.user)
+    print(f"Rebuilt {refreshed} rollup periods.")
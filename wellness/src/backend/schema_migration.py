@@ -0,0 +1,426 @@
+"""
+Versioned, resumable schema migrations for the wellness database
+
+Each migration runs in small committed chunks and records its progress in
+the schema_migrations table, so it can run against a live multi-million row
+table without holding a long exclusive lock, and an interrupted run picks up
+where it stopped when started again.
+
+Usage (from src/backend):
+    python schema_migration.py                  # apply pending migrations
+    python schema_migration.py --status         # show migration state
+    python schema_migration.py --chunk-size 5000
+"""
+
+import argparse
+import json
+from datetime import datetime
+from sqlalchemy import (Table, Column, Integer, String, DateTime, MetaData, Date,
+                        inspect, select, text)
+from database import engine, init_db
+
+DEFAULT_CHUNK_SIZE = 10000
+
+ENTRY_INDEX_NAME = 'ux_wellness_entries_user_date'
+
+migration_metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', migration_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String, nullable=False),
+    Column('status', String, nullable=False),  # 'running' or 'done'
+    Column('phase', String),
+    Column('last_id', Integer, default=0),
+    Column('updated_at', DateTime, default=datetime.utcnow, onupdate=datetime.utcnow),
+)
+
+# ==================== Progress Tracking ====================
+
+def _get_state(conn, version):
+    return conn.execute(
+        select(schema_migrations).where(schema_migrations.c.version == version)
+    ).mappings().first()
+
+def _set_state(conn, version, name, status, phase=None, last_id=0):
+    values = {'name': name, 'status': status, 'phase': phase, 'last_id': last_id,
+              'updated_at': datetime.utcnow()}
+    updated = conn.execute(
+        schema_migrations.update().where(schema_migrations.c.version == version).values(**values)
+    )
+    if updated.rowcount == 0:
+        conn.execute(schema_migrations.insert().values(version=version, **values))
+
+def _entry_index_exists():
+    return any(
+        index['name'] == ENTRY_INDEX_NAME
+        for index in inspect(engine).get_indexes('wellness_entries')
+    )
+
+def _entry_columns():
+    return {column['name']: column for column in inspect(engine).get_columns('wellness_entries')}
+
+def _max_entry_id():
+    with engine.connect() as conn:
+        return conn.scalar(text("SELECT MAX(id) FROM wellness_entries")) or 0
+
+def _run_chunked(version, name, phase, statement, start_id, chunk_size):
+    """Run an id-range UPDATE/DELETE chunk by chunk, committing progress with each chunk
+
+    statement is a SQL text with :lower/:upper, or a callable(conn, lower,
+    upper) for chunks that need Python between reading and writing.
+    """
+    max_id = _max_entry_id()
+    last_id = start_id
+
+    while last_id < max_id:
+        upper = min(last_id + chunk_size, max_id)
+        with engine.begin() as conn:
+            if callable(statement):
+                statement(conn, last_id, upper)
+            else:
+                conn.execute(statement, {'lower': last_id, 'upper': upper})
+            _set_state(conn, version, name, 'running', phase, upper)
+        last_id = upper
+        print(f"  {phase}: processed ids up to {last_id}/{max_id}")
+
+def _run_phases(version, name, phases, state):
+    """Run (phase_name, callable) pairs, skipping phases an earlier run finished"""
+    phase_names = [phase_name for phase_name, _ in phases]
+    start = phase_names.index(state['phase']) if state and state['phase'] in phase_names else 0
+
+    for phase_name, run_phase in phases[start:]:
+        resume_id = state['last_id'] if state and state['phase'] == phase_name else 0
+        with engine.begin() as conn:
+            _set_state(conn, version, name, 'running', phase_name, resume_id)
+        run_phase(resume_id)
+        state = None
+
+# ==================== Migration 1: normalized, unique entry dates ====================
+
+# Per-user lookups while deduplicating; dropped once the composite index exists
+HELPER_INDEX_NAME = 'ix_wellness_entries_user_id_tmp'
+
+# Rows migration 1 takes out of wellness_entries are kept here, with the reason
+QUARANTINE_TABLE = 'wellness_entries_quarantine'
+
+# PostgreSQL: 'YYYY-MM-DD' when value is a real calendar day, else NULL (a
+# plain CAST would abort the migration on strings like '2024-13-45')
+_PG_DAY_FUNCTION = 'wellness_migration_day'
+_PG_DAY_FUNCTION_SQL = f"""
+    CREATE OR REPLACE FUNCTION {_PG_DAY_FUNCTION}(value text) RETURNS text AS $$
+    BEGIN
+        IF value ~ '^[0-9]{{4}}-[0-9]{{2}}-[0-9]{{2}}$' THEN
+            RETURN to_char(CAST(value AS date), 'YYYY-MM-DD');
+        END IF;
+        RETURN NULL;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql IMMUTABLE
+"""
+
+def _normalized_date_sql(alias):
+    """SQL for an entry's 'YYYY-MM-DD' day, or NULL when it cannot be recovered
+
+    Legacy rows may carry padded strings, full timestamps or an empty date;
+    blank or invalid dates fall back to the day of the row's timestamp.
+    """
+    if engine.dialect.name == 'postgresql':
+        return (f"COALESCE({_PG_DAY_FUNCTION}(substr(trim({alias}.date), 1, 10)), "
+                f"to_char({alias}.timestamp, 'YYYY-MM-DD'))")
+    return f"COALESCE(date(substr(trim({alias}.date), 1, 10)), date({alias}.timestamp))"
+
+def _entry_dates_are_current():
+    # Tables created from the current models declare a DATE column and have
+    # the unique index; legacy string columns always need one pass
+    return isinstance(_entry_columns()['date']['type'], Date) and _entry_index_exists()
+
+def _migrate_entry_dates_unique(version, name, chunk_size, state):
+    """Repair, deduplicate and uniquely index legacy string dates
+
+    Rows with no recoverable day, and all but the oldest of duplicate
+    (user_id, day) rows (the row the old select-then-update save path would
+    have been updating), are moved to QUARANTINE_TABLE with the reason;
+    nothing is deleted outright. The remaining dates are rewritten as
+    'YYYY-MM-DD' before the composite (user_id, date) index is built.
+    """
+    if engine.dialect.name == 'postgresql':
+        with engine.begin() as conn:
+            conn.execute(text(_PG_DAY_FUNCTION_SQL))
+
+    entry_day = _normalized_date_sql('wellness_entries')
+    older_day = _normalized_date_sql('older')
+
+    quarantined = f"""
+        wellness_entries.id > :lower AND wellness_entries.id <= :upper
+          AND ({entry_day} IS NULL OR EXISTS (
+              SELECT 1 FROM wellness_entries AS older
+              WHERE older.user_id = wellness_entries.user_id
+                AND older.id < wellness_entries.id
+                AND {older_day} = {entry_day}
+          ))
+    """
+    quarantine = text(f"""
+        INSERT INTO {QUARANTINE_TABLE}
+        SELECT wellness_entries.*,
+               CASE WHEN {entry_day} IS NULL THEN 'no_date' ELSE 'duplicate' END,
+               CURRENT_TIMESTAMP
+        FROM wellness_entries WHERE {quarantined}
+    """)
+    remove = text(f"DELETE FROM wellness_entries WHERE {quarantined}")
+
+    def quarantine_chunk(conn, lower, upper):
+        # Copy and delete in the chunk's transaction, so a row is never lost
+        conn.execute(quarantine, {'lower': lower, 'upper': upper})
+        conn.execute(remove, {'lower': lower, 'upper': upper})
+
+    normalize = text(f"""
+        UPDATE wellness_entries SET date = {entry_day}
+        WHERE id > :lower AND id <= :upper AND date != {entry_day}
+    """)
+
+    def add_helper_index(resume_id):
+        _create_index_online('wellness_entries', HELPER_INDEX_NAME, 'user_id', unique=False)
+
+    def remove_duplicates(resume_id):
+        with engine.begin() as conn:
+            if not inspect(conn).has_table(QUARANTINE_TABLE):
+                # Same columns as wellness_entries, plus why and when
+                conn.execute(text(f"""
+                    CREATE TABLE {QUARANTINE_TABLE} AS
+                    SELECT wellness_entries.*, CAST(NULL AS VARCHAR(16)) AS quarantine_reason,
+                           CAST(NULL AS TIMESTAMP) AS quarantined_at
+                    FROM wellness_entries WHERE 1 = 0
+                """))
+        _run_chunked(version, name, 'dedupe', quarantine_chunk, resume_id, chunk_size)
+
+        with engine.connect() as conn:
+            count = conn.scalar(text(f"SELECT COUNT(*) FROM {QUARANTINE_TABLE}"))
+        if count:
+            print(f"  {count} entries without a recoverable date or duplicating an older entry "
+                  f"were moved to {QUARANTINE_TABLE} (see quarantine_reason)")
+
+    def normalize_dates(resume_id):
+        _run_chunked(version, name, 'normalize', normalize, resume_id, chunk_size)
+
+    def create_index(resume_id):
+        _create_index_online('wellness_entries', ENTRY_INDEX_NAME, 'user_id, date')
+        _drop_index_online(HELPER_INDEX_NAME)
+        if engine.dialect.name == 'postgresql':
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP FUNCTION IF EXISTS {_PG_DAY_FUNCTION}(text)"))
+
+    _run_phases(version, name, [
+        ('helper_index', add_helper_index),
+        ('dedupe', remove_duplicates),
+        ('normalize', normalize_dates),
+        ('index', create_index),
+    ], state)
+
+def _create_index_online(table_name, index_name, columns, unique=True):
+    """Create an index without blocking writes where the database allows it
+
+    On PostgreSQL, an INVALID index left by a failed concurrent build (for
+    example on a duplicate key) is dropped and built again, so IF NOT EXISTS
+    never mistakes it for a finished one.
+    """
+    kind = 'UNIQUE INDEX' if unique else 'INDEX'
+    if engine.dialect.name == 'postgresql':
+        # CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            valid = conn.scalar(text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+            ), {'name': index_name})
+            if valid is False:
+                print(f"  Rebuilding invalid index {index_name}")
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+            conn.execute(text(
+                f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {index_name} ON {table_name} ({columns})"
+            ))
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE {kind} IF NOT EXISTS {index_name} ON {table_name} ({columns})"))
+
+def _drop_index_online(index_name):
+    if engine.dialect.name == 'postgresql':
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+
+# ==================== Migration 2: date column to DATE ====================
+
+def _date_column_is_current():
+    column_type = _entry_columns()['date']['type']
+    if engine.dialect.name == 'sqlite':
+        # SQLite has no native DATE storage: SQLAlchemy's Date type stores
+        # ISO 'YYYY-MM-DD' text, which migration 1 already guarantees
+        return True
+    return isinstance(column_type, Date)
+
+def _migrate_entry_dates(version, name, chunk_size, state):
+    """Convert wellness_entries.date from a string to a DATE column
+
+    A DATE column is added next to the old one and backfilled in chunks,
+    its unique index is built concurrently, and a short swap transaction
+    then catches up recent writes and renames it into place.
+    """
+    backfill_sql = """
+        UPDATE wellness_entries SET date_new = CAST(date AS DATE)
+        WHERE {condition} AND date_new IS NULL
+    """
+
+    def add_column(resume_id):
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE wellness_entries ADD COLUMN IF NOT EXISTS date_new DATE"))
+
+    def backfill(resume_id):
+        _run_chunked(version, name, 'backfill',
+                     text(backfill_sql.format(condition="id > :lower AND id <= :upper")),
+                     resume_id, chunk_size)
+
+    def build_index(resume_id):
+        _create_index_online('wellness_entries', f'{ENTRY_INDEX_NAME}_new', 'user_id, date_new')
+
+    def swap(resume_id):
+        # Dropping a column is metadata-only, so the exclusive lock is brief
+        with engine.begin() as conn:
+            conn.execute(text("LOCK TABLE wellness_entries IN ACCESS EXCLUSIVE MODE"))
+            conn.execute(text(backfill_sql.format(condition="TRUE")))
+            conn.execute(text(f"DROP INDEX IF EXISTS {ENTRY_INDEX_NAME}"))
+            conn.execute(text("ALTER TABLE wellness_entries DROP COLUMN date"))
+            conn.execute(text("ALTER TABLE wellness_entries RENAME COLUMN date_new TO date"))
+            conn.execute(text(f"ALTER INDEX {ENTRY_INDEX_NAME}_new RENAME TO {ENTRY_INDEX_NAME}"))
+
+    _run_phases(version, name, [
+        ('add_column', add_column),
+        ('backfill', backfill),
+        ('index', build_index),
+        ('swap', swap),
+    ], state)
+
+# ==================== Migration 3: symptom bitmask ====================
+
+def _symptom_mask_is_current():
+    # Tables created from the current models have the column, and every
+    # entry written through db_storage gets its mask on write
+    return 'symptom_mask' in _entry_columns()
+
+def _migrate_symptom_mask(version, name, chunk_size, state):
+    """Add wellness_entries.symptom_mask and backfill it from the symptoms JSON
+
+    Symptom names are registered (and committed) before each chunk's
+    update transaction, on their own connection.
+    """
+    from symptoms import resolve_symptom_bits, symptom_mask
+
+    def add_column(resume_id):
+        if 'symptom_mask' not in _entry_columns():
+            with engine.begin() as conn:
+                conn.execute(text("ALTER TABLE wellness_entries ADD COLUMN symptom_mask BIGINT DEFAULT 0"))
+
+    def backfill_chunk(conn, lower, upper):
+        rows = conn.execute(
+            text("SELECT id, symptoms FROM wellness_entries WHERE id > :lower AND id <= :upper"),
+            {'lower': lower, 'upper': upper}
+        ).all()
+        symptom_rows = [(entry_id, json.loads(symptoms) if isinstance(symptoms, str) else symptoms)
+                        for entry_id, symptoms in rows]
+        names = {symptom for _, symptoms in symptom_rows if isinstance(symptoms, dict)
+                 for symptom, present in symptoms.items() if present}
+        bits = resolve_symptom_bits(names)
+        updates = [{'entry_id': entry_id, 'mask': symptom_mask(symptoms, bits)}
+                   for entry_id, symptoms in symptom_rows]
+        if updates:
+            conn.execute(text("UPDATE wellness_entries SET symptom_mask = :mask WHERE id = :entry_id"), updates)
+
+    def backfill(resume_id):
+        _run_chunked(version, name, 'backfill', backfill_chunk, resume_id, chunk_size)
+
+    _run_phases(version, name, [
+        ('add_column', add_column),
+        ('backfill', backfill),
+    ], state)
+
+# ==================== Runner ====================
+
+# (version, name, is_current, migrate) in the order they must be applied.
+# is_current() recognizes databases created from the current models, which
+# need no migration.
+MIGRATIONS = [
+    (1, 'wellness_entries_dates_unique', _entry_dates_are_current, _migrate_entry_dates_unique),
+    (2, 'wellness_entries_date_type', _date_column_is_current, _migrate_entry_dates),
+    (3, 'wellness_entries_symptom_mask', _symptom_mask_is_current, _migrate_symptom_mask),
+]
+
+def migration_status():
+    """Return a list of {version, name, status, phase, last_id} dicts"""
+    migration_metadata.create_all(bind=engine)
+
+    statuses = []
+    with engine.connect() as conn:
+        for version, name, is_current, _ in MIGRATIONS:
+            state = _get_state(conn, version)
+            if state:
+                statuses.append({'version': version, 'name': name, 'status': state['status'],
+                                 'phase': state['phase'], 'last_id': state['last_id']})
+            else:
+                statuses.append({'version': version, 'name': name,
+                                 'status': 'current' if is_current() else 'pending',
+                                 'phase': None, 'last_id': 0})
+    return statuses
+
+def run_migrations(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Apply every pending migration, resuming any that were interrupted
+
+    Returns the names of the migrations applied by this run.
+    """
+    migration_metadata.create_all(bind=engine)
+    applied = []
+
+    for version, name, is_current, migrate in MIGRATIONS:
+        with engine.connect() as conn:
+            state = _get_state(conn, version)
+
+        if state and state['status'] == 'done':
+            continue
+        if not state and is_current():
+            with engine.begin() as conn:
+                _set_state(conn, version, name, 'done')
+            continue
+
+        print(f"Applying migration {version}: {name}" + (" (resuming)" if state else ""))
+        migrate(version, name, chunk_size, state)
+
+        with engine.begin() as conn:
+            _set_state(conn, version, name, 'done')
+        applied.append(name)
+        print(f"Migration {version} complete.")
+    return applied
+
+def pending_migrations():
+    """Return the names of migrations that have not been applied yet"""
+    return [status['name'] for status in migration_status()
+            if status['status'] not in ('done', 'current')]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply wellness database schema migrations")
+    parser.add_argument('--status', action='store_true', help="Show migration state and exit")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Rows per committed chunk (default: %(default)s)")
+    args = parser.parse_args()
+
+    init_db()
+    if args.status:
+        for status in migration_status():
+            print(f"{status['version']:>3}  {status['name']:<40} {status['status']}"
+                  + (f" (phase {status['phase']}, id {status['last_id']})" if status['status'] == 'running' else ""))
+    else:
+        if run_migrations(chunk_size=args.chunk_size):
+            # Migrated rows may have moved or changed date
+            from rollups import rebuild_rollups
+            print(f"Rebuilt {rebuild_rollups()} rollup periods.")
+        print("Schema is up to date.")
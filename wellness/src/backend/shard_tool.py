@@ -0,0 +1,133 @@
+"""
+Move per-user wellness data into shards, or between shard counts
+
+Usage (from src/backend):
+    python shard_tool.py status                   # users and entries per shard
+    python shard_tool.py rebalance --from-single  # split DATABASE_URL into SHARD_COUNT shards
+    python shard_tool.py rebalance --from-count 8 # reshard 8 shard files into SHARD_COUNT
+
+Sources are only read. Shard files carry the shard count in their name, so a
+rebalance writes a new set of files next to the old ones; switch
+WELLNESS_STORAGE / SHARD_COUNT to the new layout, then delete the old files.
+Each user is copied in one transaction, and rows that already exist in the
+target are skipped, so an interrupted rebalance can simply be run again.
+"""
+
+import argparse
+import os
+from sqlalchemy import distinct, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import (engine, init_db, create_shard_engine, shard_for_user, shard_path,
+                      SHARD_COUNT, WellnessEntry, WellnessRollup, UserProfile, UserDataVersion)
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# Per-user tables and the unique keys used to skip rows copied earlier
+COPY_TABLES = [
+    (WellnessEntry.__table__, ['user_id', 'date']),
+    (WellnessRollup.__table__, ['user_id', 'period_type', 'period_start']),
+    (UserProfile.__table__, ['user_id']),
+    (UserDataVersion.__table__, ['user_id']),
+]
+
+def _existing_shards(shard_count):
+    """Return (index, engine) for each shard file of a layout that exists"""
+    return [
+        (index, create_shard_engine(shard_path(index, shard_count)))
+        for index in range(shard_count) if os.path.exists(shard_path(index, shard_count))
+    ]
+
+def _user_ids(source):
+    entries = WellnessEntry.__table__
+    profiles = UserProfile.__table__
+    with source.connect() as conn:
+        return sorted(set(conn.scalars(select(entries.c.user_id).distinct()))
+                      | set(conn.scalars(select(profiles.c.user_id))))
+
+def copy_user(source, target, user_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Copy one user's rows from source to target; returns {table: rows read}"""
+    copied = {}
+    with source.connect() as src, target.begin() as dst:
+        for table, key in COPY_TABLES:
+            columns = [column for column in table.columns if column.key != 'id']
+            result = src.execution_options(yield_per=chunk_size).execute(
+                select(*columns).where(table.c.user_id == user_id)
+            )
+            insert = sqlite_insert(table).on_conflict_do_nothing(index_elements=key)
+            copied[table.name] = 0
+            for rows in result.partitions():
+                dst.execute(insert, [row._asdict() for row in rows])
+                copied[table.name] += len(rows)
+    return copied
+
+def rebalance(from_single=False, from_count=None, to_count=SHARD_COUNT, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Copy every user from the source layout into to_count shards"""
+    if from_single:
+        sources = [engine]
+    else:
+        if from_count == to_count:
+            raise ValueError("Source and target shard counts are the same")
+        sources = [source for _, source in _existing_shards(from_count)]
+
+    targets = {}
+    users = 0
+    for source in sources:
+        for user_id in _user_ids(source):
+            index = shard_for_user(user_id, to_count)
+            if index not in targets:
+                targets[index] = create_shard_engine(shard_path(index, to_count))
+            copied = copy_user(source, targets[index], user_id, chunk_size)
+            users += 1
+            print(f"  {user_id} -> shard {index}: {copied['wellness_entries']} entries")
+        source.dispose()
+
+    for target in targets.values():
+        target.dispose()
+    return users
+
+def shard_status(shard_count=SHARD_COUNT):
+    """Return [{shard, path, users, entries, bytes}] for the existing shard files"""
+    entries = WellnessEntry.__table__
+    statuses = []
+    for index, shard in _existing_shards(shard_count):
+        with shard.connect() as conn:
+            users = conn.scalar(select(func.count(distinct(entries.c.user_id))))
+            total = conn.scalar(select(func.count()).select_from(entries))
+        shard.dispose()
+        path = shard_path(index, shard_count)
+        statuses.append({'shard': index, 'path': path, 'users': users, 'entries': total,
+                         'bytes': os.path.getsize(path)})
+    return statuses
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage per-user SQLite shards")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    status_parser = commands.add_parser('status', help="Show users and entries per shard")
+    status_parser.add_argument('--count', type=int, default=SHARD_COUNT,
+                               help="Shard layout to inspect (default: %(default)s)")
+
+    rebalance_parser = commands.add_parser('rebalance', help="Copy users into a new shard layout")
+    source = rebalance_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--from-single', action='store_true', help="Read from the DATABASE_URL database")
+    source.add_argument('--from-count', type=int, help="Read from the shard files of this layout")
+    rebalance_parser.add_argument('--to-count', type=int, default=SHARD_COUNT,
+                                  help="Number of target shards (default: %(default)s)")
+    rebalance_parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                                  help="Rows per insert batch (default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        for status in shard_status(args.count):
+            print(f"{status['shard']:>5}  {status['users']:>6} users  {status['entries']:>9} entries  "
+                  f"{status['bytes'] / 1024 / 1024:8.1f} MiB  {status['path']}")
+    else:
+        if args.from_single:
+            from schema_migration import pending_migrations
+            init_db()
+            pending = pending_migrations()
+            if pending:
+                parser.error(f"Apply pending schema migrations first: {pending}")
+        users = rebalance(args.from_single, args.from_count, args.to_count, args.chunk_size)
+        print(f"Copied {users} users into {args.to_count} shards. "
+              f"Set SHARD_COUNT={args.to_count} and WELLNESS_STORAGE=sharded to use them.")
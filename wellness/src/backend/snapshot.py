@@ -0,0 +1,379 @@
+"""
+Online snapshots of the wellness databases, and restore
+
+SQLite databases (the main file and, when sharded, every shard) are copied
+page by page with SQLite's online backup API while the API keeps serving,
+then gzip-compressed. PostgreSQL tables are streamed with COPY ... TO STDOUT
+(CSV) inside one read-only REPEATABLE READ transaction, so every table comes
+from the same point in time. manifest.json records the SHA-256 and size of
+every file, which verify and restore check before touching the database.
+
+Restore loads SQLite files back through the backup API after an integrity
+check. PostgreSQL tables are truncated and reloaded with COPY FROM STDIN in
+one transaction, with secondary indexes dropped during the load and rebuilt
+afterwards. Archived entries (archive.py) live in plain files under
+ARCHIVE_DIR; back that directory up alongside the snapshots.
+
+Usage (from src/backend):
+    python snapshot.py create [--name NAME] [--level 6]
+    python snapshot.py list
+    python snapshot.py verify snapshots/NAME
+    python snapshot.py restore snapshots/NAME
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy import delete, insert, inspect, select
+from database import (project_root, engine, init_db, get_engine, user_engines, create_shard_engine, SHARD_DIR, Base,
+                      STORAGE_BACKEND, WellnessEntry, UserProfile, UserDataVersion)
+from schema_migration import schema_migrations
+
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', os.path.join(project_root, 'snapshots'))
+
+DEFAULT_COMPRESS_LEVEL = 6
+
+MANIFEST_NAME = 'manifest.json'
+
+_COPY_BUFFER = 1 << 20
+
+class _HashingWriter:
+    """File wrapper that hashes and counts the bytes written through it"""
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+def _compress_to(path, write_raw, level):
+    """Write gzip output produced by write_raw(stream) to path; returns its manifest record"""
+    with open(path, 'wb') as f:
+        hashing = _HashingWriter(f)
+        with gzip.GzipFile(fileobj=hashing, mode='wb', compresslevel=level, mtime=0) as stream:
+            write_raw(stream)
+        f.flush()
+        os.fsync(f.fileno())
+    return {'sha256': hashing.sha256.hexdigest(), 'bytes': hashing.size}
+
+def _file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_COPY_BUFFER), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def _sqlite_path(bind):
+    return bind.url.database
+
+def _snapshot_file_name(bind):
+    """Name of a database's file inside the snapshot: main.db.gz or shards/<shard>.gz"""
+    if bind is engine:
+        return 'main.db.gz'
+    return f"shards/{os.path.basename(_sqlite_path(bind))}.gz"
+
+# ==================== SQLite ====================
+
+def _snapshot_sqlite(bind, path, level):
+    """Copy one SQLite database with the online backup API, then compress it"""
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(path)) as temp_dir:
+        copy_path = os.path.join(temp_dir, 'copy.db')
+        source = bind.raw_connection()
+        try:
+            target = sqlite3.connect(copy_path)
+            try:
+                # One step: with WAL the copy reads a consistent snapshot
+                # while writers carry on
+                source.driver_connection.backup(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+
+        def write_raw(stream):
+            with open(copy_path, 'rb') as f:
+                shutil.copyfileobj(f, stream, _COPY_BUFFER)
+
+        record = _compress_to(path, write_raw, level)
+        record['raw_bytes'] = os.path.getsize(copy_path)
+    return record
+
+def _restore_sqlite(path, bind):
+    """Decompress a snapshot file, check it, and copy it into bind's database"""
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(_sqlite_path(bind)) or None) as temp_dir:
+        copy_path = os.path.join(temp_dir, 'restore.db')
+        with gzip.open(path, 'rb') as stream, open(copy_path, 'wb') as f:
+            shutil.copyfileobj(stream, f, _COPY_BUFFER)
+
+        source = sqlite3.connect(copy_path)
+        try:
+            result = source.execute('PRAGMA integrity_check').fetchone()[0]
+            if result != 'ok':
+                raise ValueError(f"{path} failed the integrity check: {result}")
+
+            target = bind.raw_connection()
+            try:
+                source.backup(target.driver_connection)
+                # Refresh planner statistics for the restored indexes
+                target.driver_connection.execute('ANALYZE')
+                target.driver_connection.commit()
+            finally:
+                target.close()
+        finally:
+            source.close()
+
+# ==================== PostgreSQL ====================
+
+def _snapshot_tables(bind):
+    """Tables to copy, in dependency order, that exist in the database"""
+    existing = set(inspect(bind).get_table_names())
+    tables = [table.name for table in Base.metadata.sorted_tables] + [schema_migrations.name]
+    return [name for name in tables if name in existing]
+
+def _snapshot_postgresql(bind, snapshot_path, level):
+    """COPY every table to a compressed CSV file from one consistent snapshot"""
+    files = {}
+    raw = bind.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute('BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        for table in _snapshot_tables(bind):
+            name = f'{table}.csv.gz'
+
+            def write_raw(stream, table=table):
+                cursor.copy_expert(f'COPY "{table}" TO STDOUT WITH (FORMAT csv, HEADER)', stream)
+
+            files[name] = _compress_to(os.path.join(snapshot_path, name), write_raw, level)
+            files[name]['table'] = table
+        cursor.execute('COMMIT')
+    finally:
+        raw.close()
+    return files
+
+def _secondary_indexes(cursor, table):
+    """Return (name, definition) for indexes not backing a constraint"""
+    cursor.execute("""
+        SELECT i.indexname, i.indexdef FROM pg_indexes i
+        WHERE i.schemaname = current_schema() AND i.tablename = %s
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)
+    """, (table,))
+    return cursor.fetchall()
+
+def _restore_postgresql(snapshot_path, files, bind):
+    """Reload every table in one transaction, rebuilding secondary indexes after the load"""
+    raw = bind.raw_connection()
+    try:
+        cursor = raw.cursor()
+        tables = [record['table'] for record in files.values()]
+        quoted = ', '.join(f'"{table}"' for table in tables)
+        cursor.execute(f'TRUNCATE {quoted} RESTART IDENTITY')
+
+        indexes = []
+        for table in tables:
+            for name, definition in _secondary_indexes(cursor, table):
+                indexes.append(definition)
+                cursor.execute(f'DROP INDEX "{name}"')
+
+        for name, record in files.items():
+            with gzip.open(os.path.join(snapshot_path, name), 'rb') as stream:
+                cursor.copy_expert(f'COPY "{record["table"]}" FROM STDIN WITH (FORMAT csv, HEADER)', stream)
+
+        for definition in indexes:
+            cursor.execute(definition)
+
+        # Continue id sequences after the restored rows
+        for table in tables:
+            if 'id' not in {column['name'] for column in inspect(bind).get_columns(table)}:
+                continue
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (f'"{table}"',))
+            sequence = cursor.fetchone()[0]
+            if sequence:
+                cursor.execute(f'SELECT setval(%s, COALESCE((SELECT MAX(id) FROM "{table}"), 0) + 1, false)',
+                               (sequence,))
+        raw.commit()
+
+        cursor.execute('ANALYZE')
+        raw.commit()
+    except Exception as e:
+        raw.rollback()
+        raise e
+    finally:
+        raw.close()
+
+# ==================== Data Versions ====================
+
+def _data_versions():
+    """Return {user_id: data version} for every user with entries, a profile or a version"""
+    versions_table = UserDataVersion.__table__
+    versions = {}
+    for bind in user_engines():
+        # Snapshots taken before data versions existed lack the table
+        versions_table.create(bind, checkfirst=True)
+        with bind.connect() as conn:
+            for user_id, version in conn.execute(select(versions_table.c.user_id, versions_table.c.version)):
+                versions[user_id] = max(version, versions.get(user_id, 0))
+            for column in (WellnessEntry.__table__.c.user_id, UserProfile.__table__.c.user_id):
+                for user_id in conn.scalars(select(column).distinct()):
+                    versions.setdefault(user_id, 0)
+    return versions
+
+def _advance_data_versions(previous):
+    """Move every user's data version past both the replaced and the restored one
+
+    API ETags are derived from the version, so an ETag issued before the
+    restore never matches restored data.
+    """
+    versions_table = UserDataVersion.__table__
+    restored = _data_versions()
+    rows = {}
+    for user_id in set(previous) | set(restored):
+        version = max(previous.get(user_id, 0), restored.get(user_id, 0)) + 1
+        rows.setdefault(get_engine(user_id).url, []).append({'user_id': user_id, 'version': version})
+
+    for bind in user_engines():
+        with bind.begin() as conn:
+            conn.execute(delete(versions_table))
+            if rows.get(bind.url):
+                conn.execute(insert(versions_table), rows[bind.url])
+
+# ==================== Snapshots ====================
+
+def create_snapshot(name=None, snapshot_dir=None, level=DEFAULT_COMPRESS_LEVEL):
+    """Snapshot every wellness database; returns the snapshot directory"""
+    name = name or datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    snapshot_path = os.path.join(snapshot_dir or SNAPSHOT_DIR, name)
+    os.makedirs(snapshot_path)
+
+    started = time.perf_counter()
+    dialect = engine.dialect.name
+    if dialect == 'sqlite':
+        binds = [engine] + [bind for bind in user_engines() if bind is not engine]
+        files = {}
+        for bind in binds:
+            file_name = _snapshot_file_name(bind)
+            os.makedirs(os.path.dirname(os.path.join(snapshot_path, file_name)), exist_ok=True)
+            files[file_name] = _snapshot_sqlite(bind, os.path.join(snapshot_path, file_name), level)
+    elif dialect == 'postgresql':
+        files = _snapshot_postgresql(engine, snapshot_path, level)
+    else:
+        raise ValueError(f"Snapshots are not supported for '{dialect}' databases")
+
+    manifest = {
+        'name': name,
+        'created_at': datetime.utcnow().isoformat(),
+        'dialect': dialect,
+        'storage': STORAGE_BACKEND,
+        'seconds': round(time.perf_counter() - started, 3),
+        'files': files,
+    }
+    with open(os.path.join(snapshot_path, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return snapshot_path
+
+def load_snapshot_manifest(snapshot_path):
+    with open(os.path.join(snapshot_path, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+def verify_snapshot(snapshot_path):
+    """Check every file against the manifest; returns the manifest or raises ValueError"""
+    manifest = load_snapshot_manifest(snapshot_path)
+    for name, record in manifest['files'].items():
+        path = os.path.join(snapshot_path, name)
+        if not os.path.exists(path):
+            raise ValueError(f"Snapshot file {name} is missing")
+        if os.path.getsize(path) != record['bytes'] or _file_sha256(path) != record['sha256']:
+            raise ValueError(f"Snapshot file {name} does not match its checksum")
+    return manifest
+
+def restore_snapshot(snapshot_path):
+    """Replace the current databases' contents with a verified snapshot"""
+    manifest = verify_snapshot(snapshot_path)
+    if manifest['dialect'] != engine.dialect.name:
+        raise ValueError(f"Snapshot is from {manifest['dialect']}, the database is {engine.dialect.name}")
+
+    init_db()
+    previous_versions = _data_versions()
+    if manifest['dialect'] == 'sqlite':
+        for name in manifest['files']:
+            if name == 'main.db.gz':
+                bind = engine
+            else:
+                # Shards are restored under SHARD_DIR by file name
+                bind = create_shard_engine(os.path.join(SHARD_DIR, os.path.basename(name)[:-len('.gz')]))
+            _restore_sqlite(os.path.join(snapshot_path, name), bind)
+            if bind is not engine:
+                bind.dispose()
+    else:
+        _restore_postgresql(snapshot_path, manifest['files'], engine)
+    _advance_data_versions(previous_versions)
+
+    # In-process caches describe the replaced data
+    from db_storage import clear_entry_cache
+    from symptoms import clear_symptom_cache
+    clear_entry_cache()
+    clear_symptom_cache()
+    return manifest
+
+def list_snapshots(snapshot_dir=None):
+    """Return the manifests of the snapshots in snapshot_dir, oldest first"""
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+    if not os.path.isdir(snapshot_dir):
+        return []
+    manifests = []
+    for name in sorted(os.listdir(snapshot_dir)):
+        if os.path.exists(os.path.join(snapshot_dir, name, MANIFEST_NAME)):
+            manifests.append(load_snapshot_manifest(os.path.join(snapshot_dir, name)))
+    return manifests
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot and restore the wellness databases")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    create_parser = commands.add_parser('create', help="Take a snapshot while the API keeps running")
+    create_parser.add_argument('--name', help="Snapshot name (default: UTC timestamp)")
+    create_parser.add_argument('--dir', default=SNAPSHOT_DIR, help="Snapshot directory (default: %(default)s)")
+    create_parser.add_argument('--level', type=int, default=DEFAULT_COMPRESS_LEVEL,
+                               help="gzip compression level 1-9 (default: %(default)s)")
+
+    list_parser = commands.add_parser('list', help="List snapshots")
+    list_parser.add_argument('--dir', default=SNAPSHOT_DIR)
+
+    verify_parser = commands.add_parser('verify', help="Check a snapshot's checksums")
+    verify_parser.add_argument('path')
+
+    restore_parser = commands.add_parser('restore', help="Replace the database contents with a snapshot")
+    restore_parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        init_db()
+        path = create_snapshot(args.name, args.dir, args.level)
+        manifest = load_snapshot_manifest(path)
+        size = sum(record['bytes'] for record in manifest['files'].values())
+        print(f"Snapshot {path}: {len(manifest['files'])} files, {size / 1024 / 1024:.1f} MiB "
+              f"in {manifest['seconds']:.1f}s")
+    elif args.command == 'list':
+        for manifest in list_snapshots(args.dir):
+            size = sum(record['bytes'] for record in manifest['files'].values())
+            print(f"{manifest['name']}  {manifest['created_at']}  {manifest['dialect']:<10}  "
+                  f"{len(manifest['files'])} files  {size / 1024 / 1024:8.1f} MiB")
+    elif args.command == 'verify':
+        manifest = verify_snapshot(args.path)
+        print(f"Snapshot {manifest['name']} is intact ({len(manifest['files'])} files).")
+    else:
+        started = time.perf_counter()
+        manifest = restore_snapshot(args.path)
+        print(f"Restored snapshot {manifest['name']} in {time.perf_counter() - started:.1f}s.")
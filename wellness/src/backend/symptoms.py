@@ -0,0 +1,229 @@
+"""
+Symptom dictionary and per-entry symptom bitmasks
+
+Every symptom name seen in an entry gets a permanent bit in the symptoms
+table, and wellness_entries.symptom_mask holds the bits of the symptoms that
+were present that day. Symptom counts then come from SQL bit tests (or NumPy
+bitwise_and over a mask column) instead of looping over JSON dicts.
+
+The symptoms JSON stays the source of truth. Once all MAX_SYMPTOMS bits are
+taken, new names get no bit; a row with such a symptom sets UNMAPPED_FLAG
+(the sign bit) and counts read its unmapped names from the JSON.
+"""
+
+import numpy as np
+from sqlalchemy import case, func, literal, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from database import engine, get_db, close_db, Symptom, WellnessEntry
+from archive import reaches_archive, read_archived, shadowed_dates
+
+# symptom_mask is a signed 64-bit integer: bits 0-62 are symptoms and the
+# sign bit marks rows with symptoms that have no bit
+MAX_SYMPTOMS = 63
+UNMAPPED_FLAG = -(1 << MAX_SYMPTOMS)
+
+# name -> bit, as of the symptoms table state _symptom_table_state. Other
+# processes register symptoms and a snapshot restore replaces the table, so
+# the state is re-read before the cached map is used
+_symptom_bits = {}
+
+# Names seen after the dictionary filled up; it never frees a bit, so they
+# stay unmapped until the table is replaced
+_unmapped_symptoms = set()
+
+_symptom_table_state = None
+
+_INSERT_IGNORE = {
+    'sqlite': sqlite_insert,
+    'postgresql': postgresql_insert,
+}
+
+def _table_state(conn):
+    """Changes whenever a symptom is registered or a restore replaces the table"""
+    return tuple(conn.execute(select(func.count(), func.max(Symptom.id), func.max(Symptom.created_at))).one())
+
+def load_symptom_bits():
+    """Return the full {name: bit} symptom dictionary, reloading it if the table changed"""
+    global _symptom_table_state
+    with engine.connect() as conn:
+        # Read before the rows, so a registration in between reloads next time
+        state = _table_state(conn)
+        if state != _symptom_table_state:
+            # Rows past the limit were left by older versions; they are unmapped
+            bits = conn.execute(select(Symptom.name, Symptom.bit).where(Symptom.bit < MAX_SYMPTOMS)).all()
+            clear_symptom_cache()
+            _symptom_bits.update(bits)
+            _symptom_table_state = state
+    return dict(_symptom_bits)
+
+def clear_symptom_cache():
+    """Forget the cached dictionary, e.g. after the symptoms table was replaced"""
+    global _symptom_table_state
+    _symptom_bits.clear()
+    _unmapped_symptoms.clear()
+    _symptom_table_state = None
+
+def _register_symptom(name, attempts=5):
+    """Give name the next free bit, tolerating concurrent registrations
+
+    Returns None when every bit is taken; nothing is inserted then.
+    """
+    symptoms = Symptom.__table__
+    next_bit = select(func.coalesce(func.max(symptoms.c.bit), -1) + 1).scalar_subquery()
+    # The limit is checked in the INSERT itself, so a concurrent registration
+    # cannot push this one past it
+    new_row = select(literal(name), next_bit).where(next_bit < MAX_SYMPTOMS)
+    insert = _INSERT_IGNORE.get(engine.dialect.name)
+
+    for _ in range(attempts):
+        # Committed on its own connection so the bit survives even if the
+        # entry write that needed it rolls back
+        with engine.begin() as conn:
+            if insert is not None:
+                # Losing a race on either the name or the bit is ignored;
+                # the select below tells which happened
+                conn.execute(insert(symptoms).from_select(['name', 'bit'], new_row).on_conflict_do_nothing())
+            else:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(symptoms.insert().from_select(['name', 'bit'], new_row))
+                except IntegrityError:
+                    pass
+            bit = conn.scalar(select(symptoms.c.bit).where(symptoms.c.name == name))
+            full = bit is None and conn.scalar(select(next_bit)) >= MAX_SYMPTOMS
+
+        if bit is not None:
+            return bit if bit < MAX_SYMPTOMS else None
+        if full:
+            return None
+
+    raise RuntimeError(f"Could not register symptom '{name}'")
+
+def resolve_symptom_bits(names):
+    """Return {name: bit} for names, registering any new symptoms
+
+    Names left without a bit (the dictionary is full) are omitted. Call this
+    before the caller's own transaction writes anything, since new symptoms
+    are committed on a separate connection.
+    """
+    load_symptom_bits()
+    missing = set(names) - _symptom_bits.keys() - _unmapped_symptoms
+    if missing:
+        for name in sorted(missing):
+            bit = _register_symptom(name)
+            if bit is None:
+                _unmapped_symptoms.add(name)
+            else:
+                _symptom_bits[name] = bit
+    return {name: _symptom_bits[name] for name in names if name in _symptom_bits}
+
+def symptom_mask(symptoms, bits):
+    """Build the bitmask of the truthy symptoms in a {name: flag} dict
+
+    A symptom missing from bits sets UNMAPPED_FLAG instead of a bit.
+    """
+    mask = 0
+    if isinstance(symptoms, dict):
+        for name, present in symptoms.items():
+            if present:
+                mask |= (1 << bits[name]) if name in bits else UNMAPPED_FLAG
+    return mask
+
+def _count_unmapped(symptom_dicts, bits, counts):
+    """Add the truthy symptoms without a bit in each dict to counts"""
+    for symptoms in symptom_dicts:
+        if isinstance(symptoms, dict):
+            for name, present in symptoms.items():
+                if present and name not in bits:
+                    counts[name] = counts.get(name, 0) + 1
+    return counts
+
+def apply_symptom_masks(rows):
+    """Set symptom_mask on every row dict that carries a symptoms dict
+
+    Rows without a 'symptoms' key are left alone, so partial updates keep
+    their stored mask.
+    """
+    names = set()
+    for row in rows:
+        symptoms = row.get('symptoms')
+        if isinstance(symptoms, dict):
+            names.update(name for name, present in symptoms.items() if present)
+
+    bits = resolve_symptom_bits(names) if names else {}
+    for row in rows:
+        if 'symptoms' in row:
+            row['symptom_mask'] = symptom_mask(row['symptoms'], bits)
+    return rows
+
+def count_symptoms(period_only=False, user_id='default_user'):
+    """Count entries per symptom with one SQL query over symptom_mask
+
+    Returns ({name: count}, total_entries) where total_entries is the number
+    of entries considered (period days when period_only). Symptoms that
+    never occurred are omitted; names are ordered by first registration,
+    followed by any unmapped ones. Archived entries are counted from their
+    masks with NumPy.
+    """
+    mapped = load_symptom_bits()
+    bits = sorted(mapped.items(), key=lambda item: item[1])
+    entries = WellnessEntry.__table__
+
+    stmt = select(func.count(), *(
+        func.sum(case((entries.c.symptom_mask.bitwise_and(1 << bit) != 0, 1), else_=0))
+        for _, bit in bits
+    )).where(entries.c.user_id == user_id)
+    unmapped_stmt = select(entries.c.symptoms).where(entries.c.user_id == user_id, entries.c.symptom_mask < 0)
+    if period_only:
+        stmt = stmt.where(entries.c.on_period)
+        unmapped_stmt = unmapped_stmt.where(entries.c.on_period)
+
+    db = get_db(user_id)
+
+    try:
+        total, *counts = db.execute(stmt).one()
+        unmapped = _count_unmapped(db.scalars(unmapped_stmt), mapped, {})
+        archived = []
+        if reaches_archive(user_id):
+            archived = read_archived(user_id, ['symptom_mask', 'on_period', 'symptoms'],
+                                     skip_dates=shadowed_dates(db, user_id))
+    finally:
+        close_db(db)
+
+    if period_only:
+        archived = [row for row in archived if row[1]]
+    if archived:
+        archived_counts = count_symptoms_in_masks([row[0] or 0 for row in archived], mapped,
+                                                  [row[2] for row in archived])
+        counts = [(count or 0) + archived_counts.get(name, 0) for (name, _), count in zip(bits, counts)]
+        for name, count in archived_counts.items():
+            if name not in mapped:
+                unmapped[name] = unmapped.get(name, 0) + count
+        total += len(archived)
+
+    result = {name: int(count) for (name, _), count in zip(bits, counts) if count}
+    result.update(sorted(unmapped.items()))
+    return result, total
+
+def count_symptoms_in_masks(masks, symptom_bits, symptoms=None):
+    """Count set bits per symptom across an array of masks with NumPy
+
+    For frames loaded with load_entry_frame(['symptom_mask', ...]).
+    `symptoms` (the symptoms dicts, aligned with masks) is read for rows
+    flagged UNMAPPED_FLAG, so symptoms without a bit are counted too.
+    Returns {name: count} for symptoms present at least once.
+    """
+    masks = np.asarray(masks, dtype=np.int64)
+    counts = {}
+    for name, bit in sorted(symptom_bits.items(), key=lambda item: item[1]):
+        count = int(np.count_nonzero(np.bitwise_and(masks, np.int64(1) << bit)))
+        if count:
+            counts[name] = count
+    if symptoms is not None:
+        flagged = np.flatnonzero(masks < 0)
+        if len(flagged):
+            symptoms = list(symptoms)
+            _count_unmapped((symptoms[i] for i in flagged), symptom_bits, counts)
+    return counts
@@ -28,9 +28,14 @@ def calculate_monthly_aggregates(df):
     
     return monthly_stats
 
-def compare_months(df):
-    """Compare metrics between different months"""
-    monthly_data = calculate_monthly_aggregates(df)
+def compare_months(df=None, monthly_data=None):
+    """Compare metrics between different months
+    
+    Pass precomputed monthly_data (e.g. from the month rollups) to skip
+    aggregating df.
+    """
+    if monthly_data is None:
+        monthly_data = calculate_monthly_aggregates(df)
     
     if len(monthly_data) < 2:
         return None
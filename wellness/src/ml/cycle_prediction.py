@@ -111,16 +111,23 @@ def predict_symptom_likelihood(data):
                 if has_it:
                     symptom_counts[symptom] = symptom_counts.get(symptom, 0) + 1
     
+    return symptom_likelihoods(symptom_counts, total_period_days)
+
+def symptom_likelihoods(symptom_counts, total_period_days):
+    """Turn per-symptom period-day counts into likelihood percentages and categories"""
+    if total_period_days == 0:
+        return {}
+    
     # Calculate probabilities
-    symptom_likelihoods = {}
+    likelihoods = {}
     for symptom, count in symptom_counts.items():
         likelihood = (count / total_period_days) * 100
-        symptom_likelihoods[symptom] = {
+        likelihoods[symptom] = {
             'percentage': likelihood,
             'category': 'Very Likely' if likelihood >= 70 else 'Likely' if likelihood >= 40 else 'Possible' if likelihood >= 20 else 'Unlikely'
         }
     
-    return symptom_likelihoods
+    return likelihoods
 
 def display_cycle_forecast(data, ml_predictor):
     """Display cycle prediction and forecast page"""
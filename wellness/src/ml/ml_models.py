@@ -9,25 +9,66 @@ from tensorflow import keras
 from tensorflow.keras import layers
 import pickle
 import os
+import re
+import json
+import hashlib
 import warnings
+from model_registry import ModelRegistry, ModelBundle, XGB_FEATURES, LSTM_FEATURES, LSTM_SEQUENCE_LENGTH
 warnings.filterwarnings('ignore')
 
+# Health status thresholds, highest first (see get_health_status)
+HEALTH_STATUS_LEVELS = ((85, "Excellent"), (70, "Good"), (55, "Fair"), (40, "Needs Attention"))
+HEALTH_STATUS_LOWEST = "Critical - Consult Healthcare Provider"
+
+# Values the scoring functions assume for metrics an entry does not have
+SCORING_DEFAULTS = {'average_stress': 5, 'exercise_minutes': 0, 'water_intake': 0, 'sleep_hours': 0, 'sleep_quality': 5}
+
+def _is_missing(value):
+    """True for None and the missing-value markers pandas uses (NaN, pd.NA, NaT)"""
+    return value is None or (np.ndim(value) == 0 and bool(pd.isna(value)))
+
+def _numeric_column(frame, column, default):
+    """A frame column as float64, with no NaN left in it
+    
+    A missing column is filled with default. Missing cells (None, NaN,
+    pd.NA, NaT) and non-numeric cells become 0, as safe_float() does for
+    an entry that has the key, so no NaN reaches the scoring arithmetic.
+    """
+    if column not in frame.columns:
+        return np.full(len(frame), float(default))
+    values = frame[column]
+    values = values.astype(object).where(values.notna(), None)
+    return pd.to_numeric(values, errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+
+def _symptom_counts(frame):
+    """Number of symptoms marked in each row's symptoms dict (0 when there is none)"""
+    if 'symptoms' not in frame.columns:
+        return np.zeros(len(frame))
+    return np.fromiter((sum(map(bool, s.values())) if isinstance(s, dict) else 0 for s in frame['symptoms']),
+                       dtype=np.float64, count=len(frame))
+
+def entry_frame(entries):
+    """DataFrame of entry dicts for the column-wise scoring functions
+    
+    Keys an entry lacks take their SCORING_DEFAULTS value, as in
+    entry.get(key, default), so each row scores like the dict would.
+    """
+    return pd.DataFrame([{**SCORING_DEFAULTS, **entry} for entry in entries])
+
 class WellnessPredictor:
     """
     Advanced ML models for wellness prediction using:
     - XGBoost for wellness scoring (gradient boosting)
     - LSTM for time-series forecasting
     - TextBlob for NLP-based sentiment analysis (BERT alternative due to dependency constraints)
+    
+    Models are trained per user and served from immutable bundles held by
+    self.registry; users without their own models get the population models.
     """
     
     def __init__(self):
-        self.xgb_model = None
-        self.lstm_model = None
-        self.lstm_scaler = None  # Scaler specifically for LSTM features
         self.scaler = StandardScaler()
         self.feature_scaler = MinMaxScaler()
-        self.is_xgb_trained = False
-        self.is_lstm_trained = False
         # Get the project root directory (2 levels up from this file)
         project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
         self.model_dir = os.path.join(project_root, "ml_models_saved")
@@ -36,79 +77,151 @@ class WellnessPredictor:
         if not os.path.exists(self.model_dir):
             os.makedirs(self.model_dir)
         
-        # Try to load existing models
-        self._load_models()
+        # Per-user bundles are loaded from disk on first use; the population
+        # bundle (the models saved directly in model_dir) is loaded now
+        self.registry = ModelRegistry(loader=self._load_bundle, sizer=self._bundle_nbytes)
+        self.registry.load_population()
+    
+    def _bundle_dir(self, user_id):
+        """Directory holding user_id's saved models (None: the population models)"""
+        if user_id is None:
+            return self.model_dir
+        # Readable names for plain ids; anything else is hashed to stay a safe path
+        if not re.fullmatch(r'[A-Za-z0-9_-]{1,64}', user_id):
+            user_id = hashlib.sha256(user_id.encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.model_dir, 'users', user_id)
+    
+    def _load_bundle(self, user_id):
+        """Load user_id's saved models as one bundle; None if nothing is saved
         
-    def _load_models(self):
-        """Load pre-trained models from disk"""
+        Raises when models are saved but none of them could be loaded, so the
+        registry tries again instead of treating the user as having none.
+        """
+        directory = self._bundle_dir(user_id)
+        if not os.path.isdir(directory):
+            return None
+        
+        saved = [name for name in ('xgb_model.json', 'lstm_model.h5') if os.path.exists(os.path.join(directory, name))]
+        loaded = {}
         try:
-            xgb_path = os.path.join(self.model_dir, 'xgb_model.json')
+            xgb_path = os.path.join(directory, 'xgb_model.json')
             if os.path.exists(xgb_path):
-                self.xgb_model = xgb.XGBRegressor()
-                self.xgb_model.load_model(xgb_path)
-                self.is_xgb_trained = True
+                xgb_model = xgb.XGBRegressor()
+                xgb_model.load_model(xgb_path)
+                loaded['xgb_model'] = xgb_model
         except Exception as e:
             print(f"Could not load XGBoost model: {e}")
         
         try:
-            lstm_path = os.path.join(self.model_dir, 'lstm_model.h5')
-            scaler_path = os.path.join(self.model_dir, 'lstm_scaler.pkl')
+            lstm_path = os.path.join(directory, 'lstm_model.h5')
+            scaler_path = os.path.join(directory, 'lstm_scaler.pkl')
             
             if os.path.exists(lstm_path) and os.path.exists(scaler_path):
-                self.lstm_model = keras.models.load_model(lstm_path)
+                lstm_model = keras.models.load_model(lstm_path)
                 with open(scaler_path, 'rb') as f:
-                    self.lstm_scaler = pickle.load(f)
-                self.is_lstm_trained = True
+                    loaded['lstm_scaler'] = pickle.load(f)
+                loaded['lstm_model'] = lstm_model
         except Exception as e:
             print(f"Could not load LSTM model: {e}")
+            loaded.pop('lstm_scaler', None)
+        
+        if not loaded:
+            if saved:
+                raise RuntimeError(f"Saved models could not be loaded: {', '.join(saved)}")
+            return None
+        
+        # Version and feature spec; models saved before bundles existed have none
+        meta = {}
+        meta_path = os.path.join(directory, 'bundle.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        return ModelBundle(user_id=user_id, version=meta.get('version', 1), published_at=meta.get('published_at'),
+                           xgb_features=meta.get('xgb_features', XGB_FEATURES),
+                           lstm_features=meta.get('lstm_features', LSTM_FEATURES),
+                           sequence_length=meta.get('sequence_length', LSTM_SEQUENCE_LENGTH), **loaded)
     
-    def _save_models(self):
-        """Save trained models to disk"""
+    def _save_models(self, bundle):
+        """Save a published bundle's models to disk
+        
+        Each file is written beside its final path and renamed into place,
+        so a concurrent _load_bundle never reads a half-written model.
+        """
+        directory = self._bundle_dir(bundle.user_id)
+        os.makedirs(directory, exist_ok=True)
+        
         try:
-            if self.xgb_model is not None and self.is_xgb_trained:
-                xgb_path = os.path.join(self.model_dir, 'xgb_model.json')
-                self.xgb_model.save_model(xgb_path)
+            if bundle.has_xgb:
+                xgb_path = os.path.join(directory, 'xgb_model.json')
+                tmp_path = os.path.join(directory, '.xgb_model.tmp.json')
+                bundle.xgb_model.save_model(tmp_path)
+                os.replace(tmp_path, xgb_path)
         except Exception as e:
             print(f"Could not save XGBoost model: {e}")
         
         try:
-            if self.lstm_model is not None and self.is_lstm_trained and self.lstm_scaler is not None:
-                lstm_path = os.path.join(self.model_dir, 'lstm_model.h5')
-                scaler_path = os.path.join(self.model_dir, 'lstm_scaler.pkl')
+            if bundle.has_lstm:
+                lstm_path = os.path.join(directory, 'lstm_model.h5')
+                scaler_path = os.path.join(directory, 'lstm_scaler.pkl')
                 
-                self.lstm_model.save(lstm_path)
-                with open(scaler_path, 'wb') as f:
-                    pickle.dump(self.lstm_scaler, f)
+                tmp_path = os.path.join(directory, '.lstm_model.tmp.h5')
+                bundle.lstm_model.save(tmp_path)
+                os.replace(tmp_path, lstm_path)
+                with open(scaler_path + '.tmp', 'wb') as f:
+                    pickle.dump(bundle.lstm_scaler, f)
+                os.replace(scaler_path + '.tmp', scaler_path)
         except Exception as e:
             print(f"Could not save LSTM model: {e}")
+        
+        try:
+            meta_path = os.path.join(directory, 'bundle.json')
+            with open(meta_path + '.tmp', 'w') as f:
+                json.dump({
+                    'version': bundle.version,
+                    'published_at': bundle.published_at,
+                    'xgb_features': bundle.xgb_features,
+                    'lstm_features': bundle.lstm_features,
+                    'sequence_length': bundle.sequence_length
+                }, f)
+            os.replace(meta_path + '.tmp', meta_path)
+        except Exception as e:
+            print(f"Could not save model bundle metadata: {e}")
+    
+    def _bundle_nbytes(self, bundle):
+        """Approximate memory held by a bundle's model weights (what MODEL_CACHE_MB budgets)"""
+        nbytes = 0
+        try:
+            if bundle.has_xgb:
+                nbytes += len(bundle.xgb_model.get_booster().save_raw())
+            if bundle.has_lstm:
+                nbytes += bundle.lstm_model.count_params() * 4 + len(pickle.dumps(bundle.lstm_scaler))
+        except Exception as e:
+            print(f"Could not size model bundle: {e}")
+        return nbytes
     
     def extract_features(self, entry):
         """Extract numerical features from entry"""
-        features = []
-        
-        # Helper function to safely convert to float
-        def safe_float(value, default=0):
-            try:
-                return float(value) if value is not None else default
-            except (ValueError, TypeError):
-                return default
-        
-        # Basic health metrics (ensure numeric types)
-        features.append(safe_float(entry.get('average_stress', 5)))
-        features.append(safe_float(entry.get('exercise_minutes', 0)))
-        features.append(safe_float(entry.get('water_intake', 0)) / 1000.0)  # Normalize to liters
-        features.append(safe_float(entry.get('sleep_hours', 0)))
-        features.append(safe_float(entry.get('sleep_quality', 5)))
-        
-        # Menstrual symptoms count
-        symptoms = entry.get('symptoms', {})
-        symptom_count = sum(1 for v in symptoms.values() if v)
-        features.append(symptom_count)
-        
-        # Period flag
-        features.append(1 if entry.get('on_period', False) else 0)
-        
-        return np.array(features).reshape(1, -1)
+        return self.extract_feature_matrix(entry_frame([entry]))
+    
+    def extract_feature_matrix(self, frame):
+        """Feature matrix (one row per entry, columns as XGB_FEATURES) for a DataFrame of entries"""
+        n = len(frame)
+        on_period = frame['on_period'] if 'on_period' in frame.columns else [None] * n
+        
+        # The period flag may be any truthy value, so it is tested in Python;
+        # missing cells (NaN, pd.NA) count as False
+        period_flag = np.fromiter((0 if _is_missing(v) or not v else 1 for v in on_period),
+                                  dtype=np.float64, count=n)
+        
+        return np.column_stack([
+            _numeric_column(frame, 'average_stress', 5),
+            _numeric_column(frame, 'exercise_minutes', 0),
+            _numeric_column(frame, 'water_intake', 0) / 1000.0,  # Normalize to liters
+            _numeric_column(frame, 'sleep_hours', 0),
+            _numeric_column(frame, 'sleep_quality', 5),
+            _symptom_counts(frame),
+            period_flag,
+        ]).reshape(n, len(XGB_FEATURES))
     
     def analyze_sentiment(self, text):
         """Analyze sentiment using TextBlob (NLP)"""
@@ -137,43 +250,45 @@ class WellnessPredictor:
         except:
             return 0.0
     
-    def train_xgboost_model(self, historical_data):
+    def analyze_sentiment_batch(self, texts):
+        """Sentiment scores for many notes; each distinct text is analyzed once"""
+        scores = {}
+        result = np.empty(len(texts))
+        for i, text in enumerate(texts):
+            text = text if isinstance(text, str) else ''
+            if text not in scores:
+                scores[text] = self.analyze_sentiment(text)
+            result[i] = scores[text]
+        return result
+    
+    def train_xgboost_model(self, historical_data, user_id='default_user'):
         """
         Train XGBoost (Gradient Boosting) model for wellness score prediction
+        on user_id's history (user_id=None trains the population model)
         """
         if len(historical_data) < 10:
             return False
         
         try:
-            df = pd.DataFrame(historical_data)
-            
-            # Prepare features and targets
-            X = []
-            y = []
-            
-            for _, entry in df.iterrows():
-                features = self.extract_features(entry.to_dict())[0]
-                X.append(features)
-                
-                # Calculate target wellness score using heuristic for training data
-                target_score = self._calculate_heuristic_score(entry.to_dict())
-                y.append(target_score)
+            df = entry_frame(historical_data)
             
-            X = np.array(X)
-            y = np.array(y)
+            # Prepare features and targets (heuristic scores as training labels)
+            X = self.extract_feature_matrix(df)
+            y = self.heuristic_scores(df)
             
             # Train XGBoost model with gradient boosting
-            self.xgb_model = xgb.XGBRegressor(
+            model = xgb.XGBRegressor(
                 n_estimators=100,
                 max_depth=5,
                 learning_rate=0.1,
                 objective='reg:squarederror',
                 random_state=42
             )
+            model.fit(X, y)
             
-            self.xgb_model.fit(X, y)
-            self.is_xgb_trained = True
-            self._save_models()
+            # Publish only the fully trained model; predictions keep using
+            # the previous bundle until here
+            self._save_models(self.registry.publish(user_id, xgb_model=model, xgb_features=XGB_FEATURES))
             
             return True
         except Exception as e:
@@ -185,84 +300,57 @@ class WellnessPredictor:
         Heuristic-based wellness score calculation (used as fallback and for training labels)
         Score range: 0-100
         """
-        # Helper function to safely convert to float
-        def safe_float(value, default=0):
-            try:
-                return float(value) if value is not None else default
-            except (ValueError, TypeError):
-                return default
-        
-        score = 50  # Base score
+        return float(self.heuristic_scores(entry_frame([entry]))[0])
+    
+    def heuristic_scores(self, frame):
+        """
+        Heuristic wellness scores (0-100) for a DataFrame of entries, computed column-wise
+        """
+        score = np.full(len(frame), 50.0)  # Base score
         
         # Sleep factor (20 points)
-        sleep_hours = safe_float(entry.get('sleep_hours', 0))
-        sleep_quality = safe_float(entry.get('sleep_quality', 5))
-        
-        if 7 <= sleep_hours <= 9:
-            sleep_score = 15
-        elif 6 <= sleep_hours < 7 or 9 < sleep_hours <= 10:
-            sleep_score = 10
-        else:
-            sleep_score = 5
-        
-        sleep_score += (safe_float(sleep_quality) / 10) * 5
+        sleep_hours = _numeric_column(frame, 'sleep_hours', 0)
+        sleep_quality = _numeric_column(frame, 'sleep_quality', 5)
+        
+        sleep_score = np.select(
+            [(sleep_hours >= 7) & (sleep_hours <= 9),
+             ((sleep_hours >= 6) & (sleep_hours < 7)) | ((sleep_hours > 9) & (sleep_hours <= 10))],
+            [15.0, 10.0], default=5.0)
+        sleep_score += (sleep_quality / 10) * 5
         score += sleep_score
         
         # Stress factor (-20 points)
-        avg_stress = safe_float(entry.get('average_stress', 5))
-        stress_penalty = ((avg_stress - 1) / 9) * 20
-        score -= stress_penalty
+        avg_stress = _numeric_column(frame, 'average_stress', 5)
+        score -= ((avg_stress - 1) / 9) * 20
         
         # Exercise factor (15 points)
-        exercise_mins = safe_float(entry.get('exercise_minutes', 0))
-        if exercise_mins >= 30:
-            exercise_score = 15
-        elif exercise_mins >= 20:
-            exercise_score = 10
-        elif exercise_mins >= 10:
-            exercise_score = 5
-        else:
-            exercise_score = 0
-        score += exercise_score
+        exercise_mins = _numeric_column(frame, 'exercise_minutes', 0)
+        score += np.select([exercise_mins >= 30, exercise_mins >= 20, exercise_mins >= 10], [15, 10, 5], default=0)
         
         # Hydration factor (10 points)
-        water_intake = safe_float(entry.get('water_intake', 0))
-        if water_intake >= 2000:
-            hydration_score = 10
-        elif water_intake >= 1500:
-            hydration_score = 7
-        elif water_intake >= 1000:
-            hydration_score = 4
-        else:
-            hydration_score = 0
-        score += hydration_score
+        water_intake = _numeric_column(frame, 'water_intake', 0)
+        score += np.select([water_intake >= 2000, water_intake >= 1500, water_intake >= 1000], [10, 7, 4], default=0)
         
         # Period symptoms (-15 points)
-        symptoms = entry.get('symptoms', {})
-        symptom_count = sum(1 for v in symptoms.values() if v)
-        symptom_penalty = min(symptom_count * 2, 15)
-        score -= symptom_penalty
+        score -= np.minimum(_symptom_counts(frame) * 2, 15)
         
         # Sentiment bonus (10 points)
-        sentiment = safe_float(entry.get('sentiment_score', 0))
-        sentiment_bonus = sentiment * 10
-        score += sentiment_bonus
+        score += _numeric_column(frame, 'sentiment_score', 0) * 10
         
-        # Ensure score is between 0 and 100
-        score = max(0, min(100, score))
-        
-        return round(score, 1)
+        # Ensure score is between 0 and 100; rounded like round(score, 1)
+        return np.array([round(value, 1) for value in np.clip(score, 0, 100).tolist()])
     
-    def calculate_wellness_score(self, entry):
+    def calculate_wellness_score(self, entry, bundle=None, user_id='default_user'):
         """
         Calculate wellness score using XGBoost model (if trained) or heuristic fallback
         Score range: 0-100
         """
-        if self.is_xgb_trained and self.xgb_model is not None:
+        bundle = bundle or self.registry.get(user_id)
+        if bundle.has_xgb and bundle.xgb_features == XGB_FEATURES:
             try:
                 # Use trained XGBoost model for prediction
                 features = self.extract_features(entry)
-                predicted_score = self.xgb_model.predict(features)[0]
+                predicted_score = bundle.xgb_model.predict(features)[0]
                 return round(float(predicted_score), 1)
             except Exception as e:
                 print(f"XGBoost prediction error: {e}, falling back to heuristic")
@@ -293,8 +381,13 @@ class WellnessPredictor:
         energy = max(0, min(100, energy))
         return round(energy, 1)
     
-    def predict_wellness(self, entry):
-        """Main prediction function combining all ML approaches"""
+    def predict_wellness(self, entry, bundle=None, user_id='default_user'):
+        """Main prediction function combining all ML approaches
+        
+        Every score comes from one model bundle (user_id's unless given),
+        whose version and scope (user or population) are returned.
+        """
+        bundle = bundle or self.registry.get(user_id)
         
         # Sentiment analysis on notes
         notes = entry.get('additional_notes', '')
@@ -304,7 +397,7 @@ class WellnessPredictor:
         entry['sentiment_score'] = sentiment_score
         
         # Calculate wellness score using XGBoost-style weighted approach
-        wellness_score = self.calculate_wellness_score(entry)
+        wellness_score = self.calculate_wellness_score(entry, bundle)
         
         # Predict energy level
         energy_level = self.predict_energy_level({**entry, 'wellness_score': wellness_score})
@@ -313,26 +406,67 @@ class WellnessPredictor:
             'wellness_score': wellness_score,
             'sentiment_score': sentiment_score,
             'predicted_energy': energy_level,
-            'health_status': self.get_health_status(wellness_score)
+            'health_status': self.get_health_status(wellness_score),
+            'model_version': bundle.version,
+            'model_scope': bundle.scope
         }
     
+    def predict_batch(self, entries, bundle=None, user_id='default_user'):
+        """
+        Score many entries at once: the vectorized equivalent of predict_wellness
+        
+        entries is a list of entry dicts or a DataFrame with one entry per row.
+        Features for every row go to the XGBoost model in a single call, and
+        energy and health status are computed column-wise. Returns a DataFrame
+        (same index as a frame input) with wellness_score, sentiment_score,
+        predicted_energy and health_status; every row uses the same bundle.
+        """
+        bundle = bundle or self.registry.get(user_id)
+        frame = entries if isinstance(entries, pd.DataFrame) else entry_frame(entries)
+        n = len(frame)
+        
+        notes = frame['additional_notes'].to_numpy(dtype=object) if 'additional_notes' in frame.columns else [''] * n
+        sentiment = self.analyze_sentiment_batch(notes)
+        
+        wellness = None
+        if n and bundle.has_xgb and bundle.xgb_features == XGB_FEATURES:
+            try:
+                predicted = bundle.xgb_model.predict(self.extract_feature_matrix(frame))
+                wellness = np.array([round(float(score), 1) for score in predicted])
+            except Exception as e:
+                print(f"XGBoost batch prediction error: {e}, falling back to heuristic")
+        if wellness is None:
+            wellness = self.heuristic_scores(frame.assign(sentiment_score=sentiment))
+        
+        # Same formula as predict_energy_level
+        energy = (wellness * 0.4 +
+                  _numeric_column(frame, 'sleep_quality', 5) * 8 +
+                  (10 - _numeric_column(frame, 'average_stress', 5)) * 4 +
+                  np.minimum(_numeric_column(frame, 'exercise_minutes', 0) / 3, 15))
+        energy = [round(float(value), 1) for value in np.clip(energy, 0, 100)]
+        
+        status = np.select([wellness >= threshold for threshold, _ in HEALTH_STATUS_LEVELS],
+                           [label for _, label in HEALTH_STATUS_LEVELS], default=HEALTH_STATUS_LOWEST)
+        
+        return pd.DataFrame({
+            'wellness_score': wellness,
+            'sentiment_score': sentiment,
+            'predicted_energy': energy,
+            'health_status': status
+        }, index=frame.index)
+    
     def get_health_status(self, score):
         """Get health status category"""
-        if score >= 85:
-            return "Excellent"
-        elif score >= 70:
-            return "Good"
-        elif score >= 55:
-            return "Fair"
-        elif score >= 40:
-            return "Needs Attention"
-        else:
-            return "Critical - Consult Healthcare Provider"
+        for threshold, label in HEALTH_STATUS_LEVELS:
+            if score >= threshold:
+                return label
+        return HEALTH_STATUS_LOWEST
     
-    def train_lstm_model(self, historical_data):
+    def train_lstm_model(self, historical_data, user_id='default_user'):
         """
         Train LSTM model for time-series prediction
         Predicts future wellness scores based on historical patterns
+        (user_id=None trains the population model)
         """
         if len(historical_data) < 7:
             return None
@@ -344,19 +478,12 @@ class WellnessPredictor:
             # Extract features for LSTM
             features = []
             for _, entry in df.iterrows():
-                features.append([
-                    entry.get('average_stress', 5),
-                    entry.get('sleep_hours', 7),
-                    entry.get('sleep_quality', 5),
-                    entry.get('exercise_minutes', 0),
-                    entry.get('water_intake', 0),
-                    entry.get('wellness_score', 50)
-                ])
+                features.append([entry.get(column, default) for column, default in LSTM_FEATURES])
             
             features = np.array(features)
             
             # Create sequences for LSTM
-            sequence_length = 3
+            sequence_length = LSTM_SEQUENCE_LENGTH
             X, y = [], []
             
             for i in range(len(features) - sequence_length):
@@ -370,10 +497,9 @@ class WellnessPredictor:
             y = np.array(y)
             
             # Normalize features and save the scaler for later use
-            from sklearn.preprocessing import MinMaxScaler
-            self.lstm_scaler = MinMaxScaler()
+            scaler = MinMaxScaler()
             X_reshaped = X.reshape(-1, features.shape[1])
-            X_scaled = self.lstm_scaler.fit_transform(X_reshaped)
+            X_scaled = scaler.fit_transform(X_reshaped)
             X_scaled = X_scaled.reshape(X.shape)
             
             # Build LSTM model
@@ -392,41 +518,37 @@ class WellnessPredictor:
             early_stop = keras.callbacks.EarlyStopping(monitor='loss', patience=5, restore_best_weights=True)
             model.fit(X_scaled, y, epochs=50, batch_size=2, verbose=0, callbacks=[early_stop])
             
-            self.lstm_model = model
-            self.is_lstm_trained = True
-            self._save_models()  # This now saves both the model and scaler
+            # Swap the model and its scaler in together
+            bundle = self.registry.publish(user_id, lstm_model=model, lstm_scaler=scaler,
+                                           lstm_features=LSTM_FEATURES, sequence_length=sequence_length)
+            self._save_models(bundle)  # This now saves both the model and scaler
             
             return model
         except Exception as e:
             print(f"LSTM training error: {e}")
             return None
     
-    def predict_next_wellness(self, recent_entries):
+    def predict_next_wellness(self, recent_entries, bundle=None, user_id='default_user'):
         """Predict next day's wellness score using LSTM"""
-        if self.lstm_model is None or self.lstm_scaler is None or len(recent_entries) < 3:
+        bundle = bundle or self.registry.get(user_id)
+        steps = bundle.sequence_length
+        if not bundle.has_lstm or len(recent_entries) < steps:
             return None
         
         try:
-            # Prepare recent data
+            # Prepare recent data with the bundle's own feature spec
             features = []
-            for entry in recent_entries[-3:]:
-                features.append([
-                    entry.get('average_stress', 5),
-                    entry.get('sleep_hours', 7),
-                    entry.get('sleep_quality', 5),
-                    entry.get('exercise_minutes', 0),
-                    entry.get('water_intake', 0),
-                    entry.get('wellness_score', 50)
-                ])
+            for entry in recent_entries[-steps:]:
+                features.append([entry.get(column, default) for column, default in bundle.lstm_features])
             
             features = np.array(features)
             
             # Apply the same scaling used during training
             features_reshaped = features.reshape(-1, features.shape[1])
-            features_scaled = self.lstm_scaler.transform(features_reshaped)
-            features_scaled = features_scaled.reshape(1, 3, 6)
+            features_scaled = bundle.lstm_scaler.transform(features_reshaped)
+            features_scaled = features_scaled.reshape(1, steps, len(bundle.lstm_features))
             
-            prediction = self.lstm_model.predict(features_scaled, verbose=0)
+            prediction = bundle.lstm_model.predict(features_scaled, verbose=0)
             return round(float(prediction[0][0]), 1)
         except Exception as e:
             print(f"LSTM prediction error: {e}")
@@ -0,0 +1,227 @@
+"""
+Versioned, immutable model bundles for concurrent serving
+
+A ModelBundle holds everything a prediction needs: the XGBoost model, the
+LSTM model together with the scaler it was trained with, and the feature
+spec both were built from. Bundles are never modified. Training publishes
+a new bundle and the registry swaps one reference to it, so a reader that
+fetches a bundle once sees one consistent set of models (never a new LSTM
+with an old scaler).
+
+Each user has their own bundle. Bundles are loaded from disk on first use
+and kept in a least-recently-used cache bounded by MODEL_CACHE_MB; an
+evicted bundle is loaded again the next time it is needed. Users without
+a model of their own are served the shared population bundle.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+# Columns extract_features() produces for the XGBoost model, in order
+XGB_FEATURES = ('average_stress', 'exercise_minutes', 'water_liters', 'sleep_hours',
+                'sleep_quality', 'symptom_count', 'on_period')
+
+# Columns of each LSTM time step (with their defaults), and the steps per sequence
+LSTM_FEATURES = (('average_stress', 5), ('sleep_hours', 7), ('sleep_quality', 5),
+                 ('exercise_minutes', 0), ('water_intake', 0), ('wellness_score', 50))
+LSTM_SEQUENCE_LENGTH = 3
+
+# Memory budget for per-user bundles kept loaded (model weights, as
+# estimated by the registry's sizer); the population bundle is not counted
+MODEL_CACHE_MB = float(os.getenv('MODEL_CACHE_MB', 256))
+
+# Returned by ModelRegistry._load when the loader raised
+_LOAD_FAILED = object()
+
+class ModelBundle:
+    """One published set of models; read-only once created
+
+    user_id is None for the shared population bundle.
+    """
+
+    __slots__ = ('user_id', 'version', 'published_at', 'xgb_model', 'lstm_model', 'lstm_scaler',
+                 'xgb_features', 'lstm_features', 'sequence_length')
+
+    def __init__(self, user_id=None, version=0, published_at=None, xgb_model=None, lstm_model=None,
+                 lstm_scaler=None, xgb_features=XGB_FEATURES, lstm_features=LSTM_FEATURES,
+                 sequence_length=LSTM_SEQUENCE_LENGTH):
+        values = dict(user_id=user_id, version=version, published_at=published_at, xgb_model=xgb_model,
+                      lstm_model=lstm_model, lstm_scaler=lstm_scaler, xgb_features=tuple(xgb_features),
+                      lstm_features=tuple(tuple(feature) for feature in lstm_features),
+                      sequence_length=sequence_length)
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ModelBundle is immutable; publish a new one with ModelRegistry.publish()")
+
+    @property
+    def has_xgb(self):
+        return self.xgb_model is not None
+
+    @property
+    def has_lstm(self):
+        # The LSTM is only usable together with the scaler it was trained with
+        return self.lstm_model is not None and self.lstm_scaler is not None
+
+    @property
+    def scope(self):
+        return 'population' if self.user_id is None else 'user'
+
+    def replace(self, **changes):
+        """Return a new bundle with some fields changed"""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return ModelBundle(**values)
+
+class ModelRegistry:
+    """Per-user ModelBundles with lazy loading and a memory-bounded LRU
+
+    loader(user_id) returns the bundle saved for a user (None for the
+    population bundle), or None if there is none, and raises if saved
+    models cannot be loaded; sizer(bundle) estimates its size in bytes.
+    Only a user the loader reported as having nothing saved is remembered
+    as such; after a failed load the next request tries again. The
+    population bundle is read without a lock; a
+    user lookup holds the cache lock only for the LRU bookkeeping, never
+    while a model is loaded from disk.
+    """
+
+    def __init__(self, loader=None, sizer=None, budget_mb=MODEL_CACHE_MB):
+        self.loader = loader or (lambda user_id: None)
+        self.sizer = sizer or (lambda bundle: 0)
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self._population = ModelBundle()
+        self._cache = OrderedDict()  # user_id -> (bundle, bytes), least recently used first
+        self._without_model = set()  # users known to have nothing saved
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+        self._metrics = dict.fromkeys(('hits', 'misses', 'loads', 'load_failures', 'evictions',
+                                       'fallbacks', 'publishes'), 0)
+
+    def population(self):
+        return self._population
+
+    def load_population(self):
+        """Serve the saved population bundle, if there is one"""
+        bundle = self._load(None)
+        if bundle is not None and bundle is not _LOAD_FAILED:
+            self._population = bundle
+        return self._population
+
+    def get(self, user_id='default_user'):
+        """Return the bundle serving user_id: their own, or the population bundle"""
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached is not None:
+                self._cache.move_to_end(user_id)
+                self._metrics['hits'] += 1
+                return cached[0]
+            self._metrics['misses'] += 1
+            if user_id in self._without_model:
+                self._metrics['fallbacks'] += 1
+                return self._population
+
+        bundle = self._load(user_id)
+
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached is not None:
+                # Published (or loaded by another request) while this one loaded
+                return cached[0]
+            if bundle is None or bundle is _LOAD_FAILED:
+                # A failed load may be transient; only "nothing saved" is remembered
+                if bundle is None:
+                    self._without_model.add(user_id)
+                self._metrics['fallbacks'] += 1
+                return self._population
+            self._metrics['loads'] += 1
+            self._insert(user_id, bundle)
+        return bundle
+
+    def publish(self, user_id='default_user', **changes):
+        """Publish a copy of user_id's bundle with changes applied and the next version
+
+        user_id=None publishes the population bundle. lstm_model and
+        lstm_scaler must be published together.
+        """
+        if ('lstm_model' in changes) != ('lstm_scaler' in changes):
+            raise ValueError("lstm_model and lstm_scaler must be published together")
+
+        with self._publish_lock:
+            if user_id is None:
+                base = self._population
+                self._population = bundle = self._next_bundle(base, changes)
+                self._count('publishes')
+                return bundle
+
+            # Build on the saved bundle so publishing one model keeps the other
+            with self._lock:
+                cached = self._cache.get(user_id)
+            saved = None if cached is not None else self._load(user_id)
+            if saved is _LOAD_FAILED:
+                saved = None
+
+            with self._lock:
+                cached = self._cache.get(user_id)
+                base = cached[0] if cached is not None else saved or ModelBundle(user_id=user_id)
+                bundle = self._next_bundle(base, changes)
+                self._without_model.discard(user_id)
+                self._insert(user_id, bundle)
+                self._metrics['publishes'] += 1
+            return bundle
+
+    def evict(self, user_id):
+        """Drop a user's bundle from memory (it is loaded again when needed)"""
+        with self._lock:
+            self._without_model.discard(user_id)
+            cached = self._cache.pop(user_id, None)
+            if cached is not None:
+                self._resident_bytes -= cached[1]
+                self._metrics['evictions'] += 1
+
+    def stats(self):
+        """Cache metrics: counters since startup plus what is resident now"""
+        with self._lock:
+            return {
+                **self._metrics,
+                'resident_users': len(self._cache),
+                'resident_bytes': self._resident_bytes,
+                'budget_bytes': self.budget_bytes,
+                'population_version': self._population.version,
+            }
+
+    def _next_bundle(self, base, changes):
+        return base.replace(version=base.version + 1, published_at=datetime.utcnow().isoformat(), **changes)
+
+    def _load(self, user_id):
+        """loader(user_id), or _LOAD_FAILED if it raised"""
+        try:
+            return self.loader(user_id)
+        except Exception as e:
+            print(f"Could not load models for {user_id}: {e}")
+            self._count('load_failures')
+            return _LOAD_FAILED
+
+    def _count(self, metric):
+        with self._lock:
+            self._metrics[metric] += 1
+
+    def _insert(self, user_id, bundle):
+        """Cache a bundle and evict the least recently used ones over budget (caller holds _lock)"""
+        previous = self._cache.pop(user_id, None)
+        if previous is not None:
+            self._resident_bytes -= previous[1]
+
+        size = self.sizer(bundle)
+        self._cache[user_id] = (bundle, size)
+        self._resident_bytes += size
+
+        # The bundle just inserted always stays, even if it alone is over budget
+        while self._resident_bytes > self.budget_bytes and len(self._cache) > 1:
+            _, (_, evicted_size) = self._cache.popitem(last=False)
+            self._resident_bytes -= evicted_size
+            self._metrics['evictions'] += 1